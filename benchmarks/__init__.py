@@ -0,0 +1 @@
+"""Benchmarks of the cc3dslib steppables against a CompuCell3D stand-in."""
@@ -0,0 +1,271 @@
+"""Lightweight stand-in for the parts of CompuCell3D used by cc3dslib.
+
+The stand-in provides just enough of `cc3d` to run the steppables of cc3dslib
+without a Potts simulation: cells are plain Python objects whose centres of mass
+are moved by a random walk between steps. Call `install` before importing
+cc3dslib, which registers the fake modules in `sys.modules`.
+"""
+
+import sys
+import types
+from dataclasses import dataclass
+
+import numpy as np
+
+
+class CellG:
+    """Stand-in for `cc3d.cpp.CompuCell.CellG`."""
+
+    __slots__ = (
+        "id",
+        "clusterId",
+        "type",
+        "volume",
+        "surface",
+        "xCOM",
+        "yCOM",
+        "zCOM",
+        "lambdaVecX",
+        "lambdaVecY",
+        "lambdaVecZ",
+        "targetVolume",
+        "lambdaVolume",
+        "targetSurface",
+        "lambdaSurface",
+    )
+
+    def __init__(self, cell_id: int, cluster_id: int, cell_type: int):
+        self.id = cell_id
+        self.clusterId = cluster_id
+        self.type = cell_type
+        self.volume = 0
+        self.surface = 0.0
+        self.xCOM = self.yCOM = self.zCOM = 0.0
+        self.lambdaVecX = self.lambdaVecY = self.lambdaVecZ = 0.0
+        self.targetVolume = self.lambdaVolume = 0.0
+        self.targetSurface = self.lambdaSurface = 0.0
+
+
+class ElementCC3D:
+    """Stand-in for `cc3d.core.XMLUtils.ElementCC3D`."""
+
+    def __init__(self, name: str, attributes: dict | None = None, cdata: str = ""):
+        self.name = name
+        self.attributes = attributes or {}
+        self.cdata = cdata
+        self.children: list["ElementCC3D"] = []
+
+    def ElementCC3D(
+        self, name: str, attributes: dict | None = None, cdata: str = ""
+    ) -> "ElementCC3D":
+        child = ElementCC3D(name, attributes, cdata)
+        self.children.append(child)
+        return child
+
+    def add_child(self, child: "ElementCC3D") -> None:
+        self.children.append(child)
+
+
+@dataclass
+class Point3D:
+    x: int
+    y: int
+    z: int
+
+
+class EnergyCalculations:
+    """Stand-in for the flip statistics returned by `get_energy_calculations`."""
+
+    def __init__(self, rng: np.random.Generator, n_attempts: int, n_energies: int):
+        self.function_names = [f"Energy{i}" for i in range(n_energies)]
+        changes = rng.normal(size=(n_attempts, n_energies))
+        self.energy_changes = [tuple(row) for row in changes.tolist()]
+        self.flip_results = (rng.random(n_attempts) < 0.3).tolist()
+
+
+class Simulator:
+    """Stand-in for the CC3D simulator, only keeping track of the current MCS."""
+
+    def __init__(self):
+        self.mcs = 0
+
+    def getStep(self) -> int:
+        return self.mcs
+
+
+class World:
+    """A population of compartmentalised cells performing a random walk.
+
+    Each compartment consists of one cytoplasm cell (type 1) and
+    `cells_per_compartment - 1` nucleus cells (type 2) sharing a cluster ID.
+    """
+
+    def __init__(
+        self,
+        n_cells: int,
+        cells_per_compartment: int = 2,
+        box: tuple[int, int, int] = (1000, 1000, 1),
+        seed: int = 0,
+    ):
+        self.box = box
+        self.rng = np.random.default_rng(seed)
+        self.simulator = Simulator()
+        self.n_attempts = 10 * n_cells
+        self.cells: list[CellG] = []
+        self.energy_calculations: EnergyCalculations | None = None
+
+        n_compartments = max(n_cells // cells_per_compartment, 1)
+        for cluster in range(n_compartments):
+            cluster_id = cluster * cells_per_compartment + 1
+            for k in range(cells_per_compartment):
+                cell = CellG(cluster_id + k, cluster_id, 1 if k == 0 else 2)
+                cell.volume = int(self.rng.integers(10, 100))
+                cell.surface = float(4 * np.sqrt(cell.volume))
+                self.cells.append(cell)
+
+        self.positions = self.rng.random((len(self.cells), 3)) * box
+        self.positions[:, 2] = 0
+        self._write_positions()
+        self._clusters: list[list[CellG]] | None = None
+        self._neighbors: dict[int, list[tuple[CellG | None, float]]] | None = None
+
+    @property
+    def clusters(self) -> list[list[CellG]]:
+        if self._clusters is None:
+            groups: dict[int, list[CellG]] = {}
+            for cell in self.cells:
+                groups.setdefault(cell.clusterId, []).append(cell)
+            self._clusters = list(groups.values())
+        return self._clusters
+
+    @property
+    def neighbors(self) -> dict[int, list[tuple[CellG | None, float]]]:
+        """Return a fixed random contact graph of about six neighbours per cell
+        and a contact with the medium, as `(neighbor, common_area)` per cell ID."""
+        if self._neighbors is None:
+            self._neighbors = {cell.id: [(None, 4.0)] for cell in self.cells}
+            n = len(self.cells)
+            pairs = self.rng.integers(0, n, size=(3 * n, 2))
+            areas = self.rng.integers(1, 10, size=3 * n).astype(float)
+            for (a, b), area in zip(pairs.tolist(), areas.tolist()):
+                if a != b:
+                    cell_a, cell_b = self.cells[a], self.cells[b]
+                    self._neighbors[cell_a.id].append((cell_b, area))
+                    self._neighbors[cell_b.id].append((cell_a, area))
+        return self._neighbors
+
+    def advance(self, scale: float = 0.5) -> None:
+        """Move all cells by a random displacement and advance the MCS."""
+        self.positions[:, :2] += self.rng.normal(scale=scale, size=(len(self.cells), 2))
+        self.positions %= np.maximum(self.box, 1)
+        self._write_positions()
+        if self.energy_calculations is not None:
+            self.energy_calculations = EnergyCalculations(self.rng, self.n_attempts, 3)
+        self.simulator.mcs += 1
+
+    def _write_positions(self) -> None:
+        for cell, (x, y, z) in zip(self.cells, self.positions.tolist()):
+            cell.xCOM, cell.yCOM, cell.zCOM = x, y, z
+
+
+class Potts:
+    """Stand-in for the Potts object, only reporting the last created cell ID."""
+
+    def __init__(self, world: "World"):
+        self.world = world
+
+    def getRecentlyCreatedCellId(self) -> int:
+        return max((cell.id for cell in self.world.cells), default=0)
+
+
+class SteppableBasePy:
+    """Stand-in for `cc3d.core.PySteppables.SteppableBasePy`.
+
+    All steppables share the `World` assigned to `SteppableBasePy.world`.
+    """
+
+    world: World
+
+    def __init__(self, frequency=1):
+        self.frequency = frequency
+
+    def start(self):
+        pass
+
+    def step(self, mcs):
+        pass
+
+    def finish(self):
+        pass
+
+    def on_stop(self):
+        pass
+
+    @property
+    def simulator(self) -> Simulator:
+        return self.world.simulator
+
+    @property
+    def potts(self) -> Potts:
+        return Potts(self.world)
+
+    @property
+    def cell_list(self) -> list[CellG]:
+        return self.world.cells
+
+    @property
+    def clusters(self) -> list[list[CellG]]:
+        return self.world.clusters
+
+    def cell_list_by_type(self, *types: int) -> list[CellG]:
+        return [cell for cell in self.world.cells if cell.type in types]
+
+    def get_box_coordinates(self) -> tuple[Point3D, Point3D]:
+        return Point3D(0, 0, 0), Point3D(*self.world.box)
+
+    def get_energy_calculations(self) -> EnergyCalculations:
+        # generated in `World.advance` from the first request on, such that the
+        # cost of creating the statistics is not part of the timings
+        if self.world.energy_calculations is None:
+            self.world.energy_calculations = EnergyCalculations(
+                self.world.rng, self.world.n_attempts, 3
+            )
+        return self.world.energy_calculations
+
+    def get_cell_neighbor_data_list(self, cell: CellG):
+        return self.world.neighbors[cell.id]
+
+    def invariant_distance_vector(self, a, b) -> np.ndarray:
+        box = np.asarray(self.world.box, dtype=float)
+        delta = np.asarray(a, dtype=float) - np.asarray(b, dtype=float)
+        return delta - np.rint(delta / box) * box
+
+
+def install() -> None:
+    """Register the stand-in modules as `cc3d` in `sys.modules`."""
+    cc3d = types.ModuleType("cc3d")
+    cc3d.__version__ = "0.0.0+fake"
+    core = types.ModuleType("cc3d.core")
+    py_steppables = types.ModuleType("cc3d.core.PySteppables")
+    py_steppables.SteppableBasePy = SteppableBasePy
+    xml_utils = types.ModuleType("cc3d.core.XMLUtils")
+    xml_utils.ElementCC3D = ElementCC3D
+    cpp = types.ModuleType("cc3d.cpp")
+    compucell = types.ModuleType("cc3d.cpp.CompuCell")
+    compucell.CellG = CellG
+    compucell.cellfield = object
+
+    cc3d.core, cc3d.cpp = core, cpp
+    core.PySteppables, core.XMLUtils = py_steppables, xml_utils
+    cpp.CompuCell = compucell
+
+    sys.modules.update(
+        {
+            "cc3d": cc3d,
+            "cc3d.core": core,
+            "cc3d.core.PySteppables": py_steppables,
+            "cc3d.core.XMLUtils": xml_utils,
+            "cc3d.cpp": cpp,
+            "cc3d.cpp.CompuCell": compucell,
+        }
+    )
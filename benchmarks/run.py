@@ -0,0 +1,262 @@
+"""Time the steppables of cc3dslib against the CompuCell3D stand-in.
+
+Usage::
+
+    python -m benchmarks --sizes 1000 10000 100000 --steps 20 --output bench.json
+    python -m benchmarks --sizes 1000 --compare bench.json
+
+Each case is set up on a fresh `World`, run for a few warm-up steps and then
+timed per MCS. Moving the cells between steps is not part of the timings. A second,
+shorter pass with `tracemalloc` records the peak memory allocated during a step.
+The results are written as JSON, such that runs of different versions can be
+compared with `--compare`.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from importlib import metadata
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from . import fake_cc3d
+
+fake_cc3d.install()
+
+from cc3dslib import ActiveSwimmer, ActiveSwimmerParams, CompartmentSwimmer  # noqa
+from cc3dslib.analysis import (  # noqa
+    COMTracker,
+    ContactTracker,
+    DistanceTracker,
+    EnergyTracker,
+    OrderTracker,
+)
+from cc3dslib.filter import (  # noqa
+    CellTypeFilter,
+    CompartmentFilter,
+    RandomFractionFilter,
+)
+
+Case = Callable[[Path], list]
+"""Create the steppables of a benchmark case, given a directory for output files.
+
+All returned steppables are started and stepped; the time of all their steps
+together is reported for each MCS.
+"""
+
+
+def _active_swimmer(_: Path) -> list:
+    cell_filter = CompartmentFilter()
+    return [cell_filter, ActiveSwimmer(ActiveSwimmerParams(filter=cell_filter))]
+
+
+def _compartment_swimmer(_: Path) -> list:
+    cell_filter = CompartmentFilter()
+    return [cell_filter, CompartmentSwimmer(ActiveSwimmerParams(filter=cell_filter))]
+
+
+def _com_tracker(directory: Path) -> list:
+    cell_filter = CompartmentFilter()
+    return [cell_filter, COMTracker(directory / "com.h5", cell_filter, chunk_size=10)]
+
+
+def _contact_tracker(directory: Path) -> list:
+    cell_filter = CompartmentFilter()
+    return [
+        cell_filter,
+        ContactTracker(directory / "contacts.h5", cell_filter, chunk_size=10),
+    ]
+
+
+def _distance_tracker(directory: Path) -> list:
+    return [DistanceTracker(directory / "distance.h5", chunk_size=10)]
+
+
+def _order_tracker(directory: Path) -> list:
+    cell_filter = CompartmentFilter()
+    swimmer = ActiveSwimmer(ActiveSwimmerParams(filter=cell_filter))
+    return [
+        cell_filter,
+        swimmer,
+        OrderTracker(directory / "order.h5", cell_filter, swimmer, window=10),
+    ]
+
+
+def _energy_tracker(_: Path) -> list:
+    return [EnergyTracker()]
+
+
+class _FilterStep:
+    """Adapter timing one call of a filter per MCS."""
+
+    def __init__(self, cell_filter):
+        self.filter = cell_filter
+
+    def start(self):
+        pass
+
+    def step(self, _):
+        for _ in self.filter():
+            pass
+
+    def finish(self):
+        pass
+
+
+def _compartment_filter(_: Path) -> list:
+    return [_FilterStep(CompartmentFilter())]
+
+
+def _cell_type_filter(_: Path) -> list:
+    return [_FilterStep(CellTypeFilter(2))]
+
+
+def _random_fraction_filter(_: Path) -> list:
+    return [_FilterStep(RandomFractionFilter(CompartmentFilter(), 0.25, seed=0))]
+
+
+CASES: dict[str, Case] = {
+    "ActiveSwimmer": _active_swimmer,
+    "CompartmentSwimmer": _compartment_swimmer,
+    "COMTracker": _com_tracker,
+    "ContactTracker": _contact_tracker,
+    "DistanceTracker": _distance_tracker,
+    "EnergyTracker": _energy_tracker,
+    "OrderTracker": _order_tracker,
+    "CompartmentFilter": _compartment_filter,
+    "CellTypeFilter": _cell_type_filter,
+    "RandomFractionFilter": _random_fraction_filter,
+}
+
+
+def run_case(
+    name: str, n_cells: int, steps: int, warmup: int, memory_steps: int
+) -> dict:
+    """
+    Run a single benchmark case.
+
+    Parameters
+    ----------
+    name : str
+        The name of the case in `CASES`.
+    n_cells : int
+        The number of cells in the simulated population.
+    steps : int
+        The number of timed steps.
+    warmup : int
+        The number of untimed steps before the timed ones.
+    memory_steps : int
+        The number of steps traced with `tracemalloc`.
+
+    Returns
+    -------
+    dict
+        The per-MCS latency statistics in seconds and the peak memory in bytes.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        world = fake_cc3d.World(n_cells)
+        fake_cc3d.SteppableBasePy.world = world
+        steppables = CASES[name](Path(directory))
+        for steppable in steppables:
+            steppable.start()
+
+        timings = np.empty(steps)
+        for i in range(warmup + steps):
+            start = time.perf_counter()
+            for steppable in steppables:
+                steppable.step(world.simulator.mcs)
+            if i >= warmup:
+                timings[i - warmup] = time.perf_counter() - start
+            world.advance()
+
+        tracemalloc.start()
+        for _ in range(memory_steps):
+            for steppable in steppables:
+                steppable.step(world.simulator.mcs)
+            world.advance()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        for steppable in steppables:
+            steppable.finish()
+
+    return {
+        "case": name,
+        "n_cells": n_cells,
+        "steps": steps,
+        "mean_s": float(timings.mean()),
+        "median_s": float(np.median(timings)),
+        "p95_s": float(np.percentile(timings, 95)),
+        "min_s": float(timings.min()),
+        "peak_bytes": int(peak_bytes),
+    }
+
+
+def _version() -> str:
+    try:
+        return metadata.version("cc3dslib")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _compare(results: list[dict], baseline_file: Path) -> None:
+    """Print the ratio of the median latencies to those of a previous run."""
+    baseline = {
+        (r["case"], r["n_cells"]): r
+        for r in json.loads(baseline_file.read_text())["results"]
+    }
+    print(f"{'case':<22}{'n_cells':>9}{'median [ms]':>14}{'ratio':>9}")
+    for result in results:
+        reference = baseline.get((result["case"], result["n_cells"]))
+        ratio = (
+            f"{result['median_s'] / reference['median_s']:.2f}"
+            if reference is not None and reference["median_s"] > 0
+            else "-"
+        )
+        print(
+            f"{result['case']:<22}{result['n_cells']:>9}"
+            f"{result['median_s'] * 1e3:>14.3f}{ratio:>9}"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--memory-steps", type=int, default=2)
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON results of a previous run")
+    args = parser.parse_args(argv)
+
+    results = []
+    for n_cells in args.sizes:
+        for name in args.cases:
+            result = run_case(name, n_cells, args.steps, args.warmup, args.memory_steps)
+            results.append(result)
+            print(
+                f"{name:<22}{n_cells:>9}  median {result['median_s'] * 1e3:9.3f} ms"
+                f"  peak {result['peak_bytes'] / 2**20:8.2f} MiB",
+                file=sys.stderr,
+            )
+
+    report = {
+        "cc3dslib": _version(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.compare is not None:
+        _compare(results, args.compare)
@@ -1,8 +1,11 @@
 from .active_swimmer import ActiveSwimmer, ActiveSwimmerParams
 from .compartment_swimmer import CompartmentSwimmer
+from .snapshot import CellSnapshot, LatticeSnapshot
 
 __all__ = [
     "ActiveSwimmer",
     "ActiveSwimmerParams",
     "CompartmentSwimmer",
+    "CellSnapshot",
+    "LatticeSnapshot",
 ]
@@ -1,8 +1,12 @@
 """Steppable for active swimmer cells in the Simulation."""
 
 from dataclasses import dataclass
+from typing import Iterable
 from cc3d.cpp.CompuCell import CellG
 from cc3dslib.filter import Filter
+from cc3dslib.noise import NoiseStream
+from cc3dslib.ragged import Ragged
+from cc3dslib.slots import SlotAllocator
 from cc3dslib.simulation import Element
 
 from cc3d.core.PySteppables import SteppableBasePy
@@ -18,20 +22,95 @@ class ActiveSwimmerParams:
     force_magnitude: float = 0.8
     initial_magnitude: float = 0.0
     initial_steps: int = 0
+    seed: int | np.random.SeedSequence | None = None
+    noise_block_steps: int = 256
+    dynamic: bool = False
 
 
 class ActiveSwimmer(SteppableBasePy, Element):
-    def __init__(self, params: ActiveSwimmerParams, frequency=1):
+    """Apply a self-propulsion force with a rotationally diffusing direction.
+
+    All cells of a compartment returned by the filter are pushed in the same
+    direction. The forces of all cells are computed in one vectorized operation per
+    step. If `write_tolerance` is set, a cell's force is only written if one of its
+    components changed by more than the tolerance since it was last written by this
+    steppable, which skips redundant writes to the cells. This assumes that no other
+    steppable modifies the forces of the same cells.
+
+    The initial directions and the rotational noise are drawn from a `NoiseStream`
+    seeded with `params.seed`.
+
+    With `params.dynamic`, compartments may appear and disappear during the
+    simulation. The filter is then read on every step, and the direction of each
+    compartment is kept in a fixed slot of `angles` keyed by its cluster ID (see
+    `SlotAllocator`). New compartments start in a random direction. Otherwise, the
+    number of compartments must stay the same, but their sizes may change.
+    """
+
+    def __init__(
+        self,
+        params: ActiveSwimmerParams,
+        frequency=1,
+        write_tolerance: float | None = None,
+    ):
         super().__init__(frequency)
 
         self.params = params
         self.angles: np.ndarray | None = None
+        self.noise: NoiseStream | None = None
+        self.write_tolerance = write_tolerance
+
+        self.cells = Ragged.from_sizes([])
+        self.compartments = SlotAllocator()
+        self._slots = np.empty(0, dtype=np.int64)
+        self._last_forces: np.ndarray | None = None
+        self._restored_state: dict | None = None
 
     def start(self):
-        self.angles = np.random.random(size=len(list(self.params.filter()))) * 2 * np.pi
+        compartments = list(self.params.filter())
+        self.noise = NoiseStream(
+            len(compartments), self.params.noise_block_steps, self.params.seed
+        )
+        self.angles = self.noise.rng.random(size=len(compartments)) * 2 * np.pi
+
+        self.cells = Ragged.from_sizes([len(cells) for cells in compartments])
+        self._slots = np.arange(len(compartments))
+        self._last_forces = None
+
+        if self.params.dynamic:
+            # the directions are drawn in the order of the filter as above and
+            # moved to the slots of the compartments
+            non_empty = [len(cells) > 0 for cells in compartments]
+            self.compartments = SlotAllocator()
+            self._slots, _, _ = self.compartments.sync(
+                cells[0].clusterId for cells in compartments if len(cells) > 0
+            )
+            angles = np.full(self.compartments.capacity, np.nan)
+            angles[self._slots] = self.angles[non_empty]
+            self.angles = angles
+            self.cells = Ragged.from_sizes(self.cells.sizes[non_empty])
+            self.noise.resize(self.compartments.capacity)
+
+        if self._restored_state is not None:
+            self.angles = np.array(self._restored_state["angles"], dtype=float)
+            if self.params.dynamic:
+                self.compartments.load_state_dict(
+                    {
+                        "ids": self._restored_state["compartment_ids"],
+                        "free": self._restored_state["compartment_free"],
+                    }
+                )
+                self.noise.resize(len(self.angles))
+            self.noise.load_state_dict(
+                {
+                    "rng": self._restored_state["noise_rng"],
+                    "block": self._restored_state["noise_block"],
+                }
+            )
+            self._restored_state = None
 
     def step(self, mcs: int):
-        if self.angles is None:
+        if self.angles is None or self.noise is None:
             return
 
         force = (
@@ -40,23 +119,130 @@ class ActiveSwimmer(SteppableBasePy, Element):
             else self.params.initial_magnitude
         )
 
-        for compartments, angle in zip(
-            self.params.filter(),
-            self.angles,
-        ):
-            for cell in compartments:
-                # force component along X axis
-                cell.lambdaVecX = force * np.cos(angle)
-                # force component along Y axis
-                cell.lambdaVecY = force * np.sin(angle)
-
-        self.angles += (np.random.normal(size=self.angles.shape)) * np.sqrt(
-            2 * self.params.d_theta
+        compartments = list(self.params.filter())
+        if self.params.dynamic:
+            self._update_compartments(compartments)
+        else:
+            self._check_compartments(compartments)
+
+        cells = [cell for cells in compartments for cell in cells]
+        forces = self._compute_forces(force)
+        self._apply_forces(cells, forces)
+
+        self.angles += self.noise.next() * np.sqrt(2 * self.params.d_theta)
+
+    def _update_compartments(self, compartments: list[list[CellG]]) -> None:
+        """Assign slots to new compartments and free those of removed ones."""
+        assert self.angles is not None and self.noise is not None
+        compartments = [cells for cells in compartments if len(cells) > 0]
+        cells = Ragged.from_sizes([len(cells) for cells in compartments])
+        self._slots, added, removed = self.compartments.sync(
+            cells[0].clusterId for cells in compartments
         )
 
+        if self.compartments.capacity > len(self.angles):
+            self.angles = self.compartments.resize(self.angles, np.nan)
+            self.noise.resize(self.compartments.capacity)
+        self.angles[removed] = np.nan
+        self.angles[added] = self.noise.rng.random(size=len(added)) * 2 * np.pi
+
+        # the forces last written belong to other cells if the population changed
+        if (
+            len(added)
+            or len(removed)
+            or not np.array_equal(cells.offsets, self.cells.offsets)
+        ):
+            self._last_forces = None
+        self.cells = cells
+
+    def _check_compartments(self, compartments: list[list[CellG]]) -> None:
+        """
+        Rebuild the cell layout if the sizes of the compartments changed.
+
+        Raises
+        ------
+        ValueError
+            If the number of compartments changed, which requires `params.dynamic`.
+        """
+        sizes = [len(cells) for cells in compartments]
+        if len(sizes) != len(self._slots):
+            raise ValueError(
+                f"The filter returned {len(sizes)} compartments instead of "
+                f"{len(self._slots)}; use ActiveSwimmerParams(dynamic=True) in "
+                "simulations with cell division or death"
+            )
+        if not np.array_equal(sizes, self.cells.sizes):
+            self.cells = Ragged.from_sizes(sizes)
+            # the forces last written belong to other cells
+            self._last_forces = None
+
+    def _compute_forces(self, force: float) -> np.ndarray:
+        """
+        Compute the force vector of every cell.
+
+        Parameters
+        ----------
+        force : float
+            The magnitude of the force.
+
+        Returns
+        -------
+        np.ndarray
+            The x and y components of the force on each cell, shape `(n_cells, 2)`.
+        """
+        assert self.angles is not None
+        directions = np.stack((np.cos(self.angles), np.sin(self.angles)), axis=1)
+        return force * directions[self.cells.broadcast(self._slots)]
+
+    def _apply_forces(self, cells: list[CellG], forces: np.ndarray) -> None:
+        """
+        Write the forces to the cells.
+
+        Parameters
+        ----------
+        cells : list[CellG]
+            The cells in the same order as the forces.
+        forces : np.ndarray
+            The x and y components of the force on each cell, shape `(n_cells, 2)`.
+        """
+        indices: Iterable[int] = range(len(cells))
+        if self.write_tolerance is not None:
+            if self._last_forces is None or self._last_forces.shape != forces.shape:
+                self._last_forces = forces.copy()
+            else:
+                delta = np.abs(forces - self._last_forces).max(axis=1)
+                changed = delta > self.write_tolerance
+                indices = np.flatnonzero(changed).tolist()
+                forces = forces[changed]
+                self._last_forces[changed] = forces
+
+        for i, (force_x, force_y) in zip(indices, forces.tolist()):
+            cell = cells[i]
+            # force component along X axis
+            cell.lambdaVecX = force_x
+            # force component along Y axis
+            cell.lambdaVecY = force_y
+
     def finish(self):
         pass
 
+    def state_dict(self) -> dict:
+        assert self.noise is not None
+        noise = self.noise.state_dict()
+        state = {
+            "angles": np.asarray(self.angles),
+            "noise_rng": noise["rng"],
+            "noise_block": noise["block"],
+        }
+        if self.params.dynamic:
+            compartments = self.compartments.state_dict()
+            state["compartment_ids"] = compartments["ids"]
+            state["compartment_free"] = compartments["free"]
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        self._restored_state = state
+
     def build(self) -> list[ElementCC3D]:
         root_node = ElementCC3D("Plugin", {"Name": "ExternalPotential"})
         root_node.ElementCC3D("Algorithm", {}, "PixelBased")
@@ -1,5 +1,45 @@
 from .com_tracker import COMTracker
+from .compartment_coms import (
+    CompartmentCOMs,
+    DynamicCompartmentCOMs,
+    LatticeCompartmentCOMs,
+)
+from .contact_tracker import ContactTracker, read_contact_graph
 from .distance_tracker import DistanceTracker
 from .energy_tracker import EnergyTracker
+from .lattice_writer import LatticeWriter, iter_lattice, read_lattice
+from .msd_tracker import MSDTracker, MultiTauCorrelator
+from .order_tracker import OrderTracker, order_parameters
+from .schedule import (
+    ExplicitSchedule,
+    LinearSchedule,
+    LogSchedule,
+    MultiResolutionSchedule,
+    Schedule,
+)
+from .trajectory import Trajectory, repack
 
-__all__ = ["COMTracker", "DistanceTracker", "EnergyTracker"]
+__all__ = [
+    "COMTracker",
+    "CompartmentCOMs",
+    "DynamicCompartmentCOMs",
+    "LatticeCompartmentCOMs",
+    "ContactTracker",
+    "read_contact_graph",
+    "DistanceTracker",
+    "EnergyTracker",
+    "LatticeWriter",
+    "iter_lattice",
+    "read_lattice",
+    "MSDTracker",
+    "MultiTauCorrelator",
+    "OrderTracker",
+    "order_parameters",
+    "Trajectory",
+    "repack",
+    "Schedule",
+    "LinearSchedule",
+    "LogSchedule",
+    "MultiResolutionSchedule",
+    "ExplicitSchedule",
+]
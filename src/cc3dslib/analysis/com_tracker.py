@@ -8,13 +8,50 @@ from cc3d.core.PySteppables import SteppableBasePy
 from cc3d.cpp.CompuCell import CellG
 from cc3d.core.XMLUtils import ElementCC3D
 
+from cc3dslib.analysis.compartment_coms import (
+    CompartmentCOMs,
+    DynamicCompartmentCOMs,
+    LatticeCompartmentCOMs,
+)
+from cc3dslib.analysis.h5_writer import AsyncH5Writer, ChunkedDatasetWriter
+from cc3dslib.analysis.schedule import Schedule
 from cc3dslib.filter import Filter
 from cc3dslib.simulation import Element
+from cc3dslib.snapshot import CellSnapshot, LatticeSnapshot, read_cell_field
 
 
 class COMTracker(SteppableBasePy, Element):
     """
     Steppable to track the center of mass of cells between simulation steps.
+
+    If a `CellSnapshot` is given, cell positions and volumes are read from the
+    snapshot instead of the cells. In this case the compartments returned by the
+    filter at the start of the simulation are tracked.
+
+    With `async_write`, full chunks are written to the HDF5 file on a background
+    thread while the simulation continues.
+
+    By default, a sample is recorded every time the steppable runs. With a
+    `Schedule`, positions are still unwrapped every `frequency` MCS, but a sample
+    is only recorded at the first step at or after each scheduled MCS. The MCS of
+    each sample is stored in the `mcs` dataset next to `com`.
+
+    With `dynamic`, compartments may appear and disappear during the simulation
+    (see `DynamicCompartmentCOMs`). Each compartment is then written to a fixed
+    column of `com`, which grows as needed, and the cluster ID of the compartment
+    in each column is written to the `ids` dataset, with NaN positions and an ID of
+    -1 for unused columns.
+
+    With `lattice`, the centres of mass are computed from the cell IDs of the
+    lattice instead (see `LatticeCompartmentCOMs`). As this does not depend on the
+    previous steps, the lattice is only read when a sample is recorded, and the
+    tracker can run at its output frequency as long as compartments move by less
+    than half a box size between samples. Pass a `LatticeSnapshot` instead of
+    `True` to share the copy of the lattice with other steppables, e.g. a
+    `LatticeWriter`. The `CellSnapshot` is not used in this mode.
+
+    The tracker can be saved by a `Checkpointer`. On restart, it appends to the
+    existing file from the row of the checkpoint.
     """
 
     def __init__(
@@ -25,9 +62,17 @@ class COMTracker(SteppableBasePy, Element):
         chunk_size=1000,
         frequency=1,
         wrap_box: None | tuple[float, float] | tuple[float, float, float] = None,
+        snapshot: CellSnapshot | None = None,
+        async_write: bool = False,
+        schedule: Schedule | None = None,
+        dynamic: bool = False,
+        lattice: bool | LatticeSnapshot = False,
     ):
         super().__init__(frequency)
 
+        if dynamic and lattice:
+            raise ValueError("dynamic and lattice cannot be combined.")
+
         self.filename = filename
         self.dims = dims
         self.chunk_size = chunk_size
@@ -42,125 +87,181 @@ class COMTracker(SteppableBasePy, Element):
             self.wrap_box = None
 
         self.box_size = None
+        self.snapshot = snapshot
+        self.dynamic = dynamic
+        self.lattice = lattice is not False
+        self.lattice_snapshot = (
+            lattice if isinstance(lattice, LatticeSnapshot) else None
+        )
+        self.compartment_coms: (
+            CompartmentCOMs | DynamicCompartmentCOMs | LatticeCompartmentCOMs
+        )
+        if dynamic:
+            self.compartment_coms = DynamicCompartmentCOMs(filter, dims, snapshot)
+        elif lattice:
+            self.compartment_coms = LatticeCompartmentCOMs(
+                filter, self._read_lattice, dims
+            )
+        else:
+            self.compartment_coms = CompartmentCOMs(filter, dims, snapshot)
+        self.async_write = async_write
+        self.schedule = schedule
+        self._next_sample: int | None = 0
+        self._restored_state: dict | None = None
 
     def start(self):
         self.steps = 0
-        self.file = h5py.File(self.filename, "w")
-
-        n_particles = len(list(self.filter()))
-        self.com_dset = self.file.create_dataset(
-            "com",
-            (0, n_particles, self.dims),
-            maxshape=(None, n_particles, self.dims),
-            dtype="f",
-        )
-
-        self.max_compartment_size = 0
-        for cells in self.filter():
-            self.max_compartment_size = max(self.max_compartment_size, len(cells))
-
-        self.coms = np.empty((self.chunk_size, n_particles, 3))
-        self.last_coms = np.zeros((n_particles, self.max_compartment_size, 3))
-        for i, cells in enumerate(self.filter()):
-            self.last_coms[i, : len(cells), :] = np.array(
-                [self._get_com(cell) for cell in cells]
-            )
+        state, self._restored_state = self._restored_state, None
+        self.file = h5py.File(self.filename, "w" if state is None else "a")
 
         box_coords = self.get_box_coordinates()[1]
         self.box_size = np.array([box_coords.x, box_coords.y, box_coords.z])
+        self.compartment_coms.start(self.box_size)
 
-    def step(self, _):
-        for i, cells in enumerate(self.filter()):
-            new_coms = np.array([self._get_com(cell) for cell in cells])
-            cell_volumes = np.array([cell.volume for cell in cells])
-            old_coms = self.last_coms[i, : len(cells), :]
-
-            if cell_volumes.sum() == 0:
-                unwrapped_coms = np.zeros_like(new_coms)
-                cell_volumes = np.ones_like(cell_volumes)
+        if isinstance(self.compartment_coms, DynamicCompartmentCOMs):
+            n_particles = self.compartment_coms.capacity
+        else:
+            n_particles = self.compartment_coms.n_compartments
+        if state is None:
+            self.com_dset = self.file.create_dataset(
+                "com",
+                (0, n_particles, self.dims),
+                maxshape=(None, None if self.dynamic else n_particles, self.dims),
+                dtype="f",
+                fillvalue=np.nan,
+            )
+            if self.dynamic:
+                self.file.create_dataset(
+                    "ids",
+                    (0, n_particles),
+                    maxshape=(None, None),
+                    dtype="i8",
+                    fillvalue=-1,
+                )
+            self.mcs_dset = self.file.create_dataset(
+                "mcs", (0,), maxshape=(None,), dtype="i8"
+            )
+            # needed to unwrap the positions when reading them, see `Trajectory`
+            self.file.attrs["box"] = self.box_size[: self.dims]
+            if self.wrap_box is not None:
+                self.file.attrs["wrap_box"] = self.wrap_box[: self.dims]
+        else:
+            # drop the rows written after the checkpoint and append from there
+            self.com_dset = self.file["com"]
+            self.com_dset.resize(int(state["rows"]), axis=0)
+            self.mcs_dset = self.file["mcs"]
+            self.mcs_dset.resize(int(state["rows"]), axis=0)
+            if isinstance(self.compartment_coms, DynamicCompartmentCOMs):
+                self.file["ids"].resize(int(state["rows"]), axis=0)
+                self.compartment_coms.load_state_dict(state)
+            elif isinstance(self.compartment_coms, LatticeCompartmentCOMs):
+                self.compartment_coms.load_state_dict(state)
             else:
-                unwrapped_coms = old_coms + self._unwrapped_distance(old_coms, new_coms)
+                self.compartment_coms.last_coms = np.array(
+                    state["last_coms"], dtype=float
+                )
+            self.steps = int(state["steps"])
+        self.writer = AsyncH5Writer() if self.async_write else None
+        self.com_writer = ChunkedDatasetWriter(
+            self.com_dset, self.chunk_size, self.writer
+        )
+        self.mcs_writer = ChunkedDatasetWriter(
+            self.mcs_dset, self.chunk_size, self.writer
+        )
+        self.ids_writer = (
+            ChunkedDatasetWriter(self.file["ids"], self.chunk_size, self.writer)
+            if self.dynamic
+            else None
+        )
+        self._next_sample = self.schedule.next(0) if self.schedule is not None else 0
+        if state is not None and "next_sample" in state:
+            next_sample = int(state["next_sample"])
+            self._next_sample = next_sample if next_sample >= 0 else None
 
-            self.coms[self.steps % self.chunk_size, i, :] = np.average(
-                unwrapped_coms, weights=cell_volumes, axis=0
-            )
-            self.last_coms[i, :, :] = unwrapped_coms
+    def step(self, mcs: int):
+        if self.snapshot is not None:
+            self.snapshot.update(mcs)
+
+        # the lattice engine does not depend on previous updates and only runs
+        # when a sample is recorded
+        if not self.lattice:
+            coms = self.compartment_coms.update()[:, : self.dims]
+        if self.schedule is not None:
+            if self._next_sample is None or mcs < self._next_sample:
+                self.steps += 1
+                return
+            self._next_sample = self.schedule.next(mcs + 1)
+        if self.lattice:
+            coms = self.compartment_coms.update()[:, : self.dims]
+
+        if self.wrap_box is not None:
+            coms = coms % self.wrap_box[None, : self.dims]
+        if isinstance(self.compartment_coms, DynamicCompartmentCOMs):
+            self._append_ids(len(coms))
+        self.com_writer.append(coms)
+        self.mcs_writer.append(mcs)
 
         self.steps += 1
-        if self.steps % self.chunk_size == 0:
-            self._append_coms_to_h5()
 
     def finish(self):
-        self._append_coms_to_h5()
-        self.com_dset.resize(self.steps, axis=0)
+        if not self.file:
+            return
+
+        self._flush()
+        if self.writer is not None:
+            self.writer.close()
         self.file.close()
 
     def on_stop(self):
         self.finish()
 
-    def build(self) -> list[ElementCC3D]:
-        com_plugin = ElementCC3D("Plugin", {"Name": "CenterOfMass"})
-        return [com_plugin]
+    def state_dict(self) -> dict:
+        # rows still buffered in memory are written such that the checkpoint
+        # matches the file
+        self._flush()
+        if self.writer is not None:
+            self.writer.flush()
+        state = {
+            "steps": self.steps,
+            "rows": len(self.com_dset),
+            "next_sample": -1 if self._next_sample is None else self._next_sample,
+        }
+        if isinstance(
+            self.compartment_coms, (DynamicCompartmentCOMs, LatticeCompartmentCOMs)
+        ):
+            state.update(self.compartment_coms.state_dict())
+        else:
+            state["last_coms"] = self.compartment_coms.last_coms
+        return state
 
-    def _get_com(self, cell: CellG) -> np.ndarray:
-        """
-        Get the center of mass of a cell as numpy array.
-
-        Parameters
-        ----------
-        cell : CellG
-            The cell to get the center of mass of.
-
-        Returns
-        -------
-        np.ndarray
-            The center of mass of the cell
-        """
-        return np.array(
-            [
-                cell.xCOM,
-                cell.yCOM,
-                0 if self.dims == 2 else cell.zCOM,
-            ]
-        )
+    def load_state_dict(self, state: dict) -> None:
+        self._restored_state = state
 
-    def _append_coms_to_h5(self) -> None:
-        """
-        Append the center of mass positions to the HDF5 dataset.
-        """
-        self.com_dset.resize(self.com_dset.shape[0] + self.chunk_size, axis=0)
-        if self.wrap_box is None:
-            self.com_dset[-self.chunk_size :, :, :] = self.coms[:, :, : self.dims]
-            return
+    def _append_ids(self, n_particles: int) -> None:
+        """Write the compartment IDs of a sample, growing the columns if needed."""
+        assert isinstance(self.compartment_coms, DynamicCompartmentCOMs)
+        assert self.ids_writer is not None
+        if n_particles > self.com_dset.shape[1]:
+            self.com_writer.resize_rows((n_particles, self.dims))
+            self.ids_writer.resize_rows((n_particles,))
+        self.ids_writer.append(self.compartment_coms.compartments.ids)
 
-        self.com_dset[-self.chunk_size :, :, :] = (
-            self.coms[:, :, : self.dims] % self.wrap_box[None, None, : self.dims]
-        )
-
-    def _unwrapped_distance(self, old_coms, new_coms) -> np.ndarray:
-        """
-        Compute the unwrapped distance between two center of mass positions.
-
-        Compute the distance between two center of mass positions while taking into
-        account the periodic boundary conditions of the simulation.
-
-        Parameters
-        ----------
-        old_coms : np.ndarray
-            The old center of mass positions.
-        new_coms : np.ndarray
-            The new center of mass positions.
-
-        Returns
-        -------
-        np.ndarray
-            The unwrapped center of mass positions.
-        """
+    def _read_lattice(self) -> np.ndarray:
+        """Return the cell IDs of the lattice at the current MCS."""
+        if self.lattice_snapshot is not None:
+            return self.lattice_snapshot.update(self.simulator.getStep())
         assert self.box_size is not None
+        return read_cell_field(self, tuple(self.box_size[: self.dims].astype(int)))
 
-        diff = np.empty_like(old_coms)
-        for j in range(len(diff)):
-            diff[j] = new_coms[j] - old_coms[j]
-            diff -= np.rint(diff / self.box_size * 2) * self.box_size / 2
+    def _flush(self) -> None:
+        self.com_writer.flush()
+        self.mcs_writer.flush()
+        if self.ids_writer is not None:
+            self.ids_writer.flush()
 
-        return diff
+    def build(self) -> list[ElementCC3D]:
+        com_plugin = ElementCC3D("Plugin", {"Name": "CenterOfMass"})
+        if self.lattice:
+            pixel_tracker_plugin = ElementCC3D("Plugin", {"Name": "PixelTracker"})
+            return [com_plugin, pixel_tracker_plugin]
+        return [com_plugin]
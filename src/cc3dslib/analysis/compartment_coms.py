@@ -0,0 +1,472 @@
+"""Unwrapped centres of mass of compartments."""
+
+from typing import Callable
+
+import numpy as np
+from cc3d.cpp.CompuCell import CellG
+
+from cc3dslib.filter import Filter
+from cc3dslib.periodic import minimum_image, unwrap
+from cc3dslib.ragged import Ragged
+from cc3dslib.slots import SlotAllocator
+from cc3dslib.snapshot import CellSnapshot
+
+
+class CompartmentCOMs:
+    """Track the unwrapped centre of mass of the compartments returned by a filter.
+
+    The compartments are fixed when `start` is called. On each `update`, the
+    positions of their cells are unwrapped with respect to the previous update and
+    averaged, weighted by the cell volumes. Compartments without volume are reset
+    to the origin. The positions and volumes of the cells are kept in flat arrays,
+    grouped by compartment as described by `cells`. If a `CellSnapshot` is given,
+    positions and volumes are read from the snapshot instead of the cells; the
+    caller is responsible for keeping the snapshot up to date.
+
+    This is shared by the analysis steppables working on compartment trajectories.
+    """
+
+    def __init__(
+        self,
+        filter: Filter[list[CellG]],
+        dims: int = 2,
+        snapshot: CellSnapshot | None = None,
+    ):
+        self.filter = filter
+        self.dims = dims
+        self.snapshot = snapshot
+
+        self.box_size = np.zeros(3)
+        self.cells = Ragged.from_sizes([])
+        self.last_coms = np.zeros((0, 3))
+        self.volumes = np.zeros(0)
+        self._cell_ids = np.empty(0, dtype=np.int64)
+
+    @property
+    def n_compartments(self) -> int:
+        return self.cells.n_segments
+
+    def start(self, box_size: np.ndarray) -> np.ndarray:
+        """
+        Fix the compartments and read their initial positions.
+
+        Parameters
+        ----------
+        box_size : np.ndarray
+            The size of the periodic box along each spatial dimension.
+
+        Returns
+        -------
+        np.ndarray
+            The initial centre of mass of each compartment, shape
+            `(n_compartments, 3)`.
+        """
+        self.box_size = np.asarray(box_size, dtype=float)
+
+        compartments = list(self.filter())
+        self.cells = Ragged.from_sizes([len(cells) for cells in compartments])
+        if self.snapshot is not None:
+            self.snapshot.refresh()
+            self._cell_ids = np.array(
+                [cell.id for cells in compartments for cell in cells], dtype=np.int64
+            )
+
+        self.last_coms, self.volumes = self._gather()
+        return self.cells.weighted_mean(self.last_coms, self.volumes)
+
+    def update(self) -> np.ndarray:
+        """
+        Read the current positions and return the unwrapped centres of mass.
+
+        Returns
+        -------
+        np.ndarray
+            The centre of mass of each compartment, shape `(n_compartments, 3)`.
+        """
+        new_coms, volumes = self._gather()
+        unwrapped_coms = unwrap(self.last_coms, new_coms, self.box_size)
+        # compartments without volume are reset to the origin
+        empty = self.cells.sum(volumes) == 0
+        unwrapped_coms[self.cells.broadcast(empty)] = 0
+
+        self.last_coms = unwrapped_coms
+        self.volumes = volumes
+        return self.cells.weighted_mean(unwrapped_coms, volumes)
+
+    def _gather(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Read the centre of mass and volume of every tracked cell.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The centre of mass positions of shape `(n_cells, 3)` and the volumes of
+            shape `(n_cells,)` of the cells, grouped by compartment.
+        """
+        if self.snapshot is not None:
+            rows = self.snapshot.rows(self._cell_ids)
+            return self.snapshot.coms[rows], self.snapshot.volumes[rows]
+
+        values = np.array(
+            [
+                (
+                    cell.xCOM,
+                    cell.yCOM,
+                    0 if self.dims == 2 else cell.zCOM,
+                    cell.volume,
+                )
+                for cells in self.filter()
+                for cell in cells
+            ],
+            dtype=float,
+        ).reshape(-1, 4)
+
+        return values[:, :3], values[:, 3]
+
+
+class DynamicCompartmentCOMs:
+    """Track the unwrapped centre of mass of a changing set of compartments.
+
+    Unlike `CompartmentCOMs`, the compartments returned by the filter are read
+    again on every `update`, so compartments and cells may appear (e.g. after a
+    division) or disappear. Compartments are identified by the cluster ID of
+    their first cell and cells by their ID, and each is assigned a fixed slot by a
+    `SlotAllocator`. The centres of mass are returned per compartment slot, with
+    NaN for free slots.
+
+    A new cell is unwrapped with respect to the previous centre of mass of its
+    compartment, such that a cell added to an unwrapped compartment does not
+    make it jump by a box size. The cells of a new compartment start from their
+    wrapped positions. Compartments without volume are reset to the origin.
+
+    After each update, `slots`, `cells`, `positions`, `volumes` and `types`
+    describe the compartments and cells returned by the filter, in that order.
+    """
+
+    def __init__(
+        self,
+        filter: Filter[list[CellG]],
+        dims: int = 2,
+        snapshot: CellSnapshot | None = None,
+    ):
+        self.filter = filter
+        self.dims = dims
+        self.snapshot = snapshot
+
+        self.box_size = np.zeros(3)
+        self.compartments = SlotAllocator()
+        self.cell_slots = SlotAllocator()
+        self.coms = np.zeros((0, 3))
+        self.added = np.empty(0, dtype=np.int64)
+        self.removed = np.empty(0, dtype=np.int64)
+        self._cell_coms = np.zeros((0, 3))
+
+        self.slots = np.empty(0, dtype=np.int64)
+        self.cells = Ragged.from_sizes([])
+        self.positions = np.zeros((0, 3))
+        self.volumes = np.zeros(0)
+        self.types = np.zeros(0, dtype=int)
+
+    @property
+    def capacity(self) -> int:
+        """Return the number of compartment slots."""
+        return self.compartments.capacity
+
+    def start(self, box_size: np.ndarray) -> np.ndarray:
+        """
+        Read the initial positions.
+
+        Parameters
+        ----------
+        box_size : np.ndarray
+            The size of the periodic box along each spatial dimension.
+
+        Returns
+        -------
+        np.ndarray
+            The centre of mass of each compartment slot, shape `(capacity, 3)`.
+        """
+        self.box_size = np.asarray(box_size, dtype=float)
+        if self.snapshot is not None:
+            self.snapshot.refresh()
+        return self.update()
+
+    def update(self) -> np.ndarray:
+        """
+        Read the current compartments and return their unwrapped centres of mass.
+
+        The slots of the compartments added and removed by this update are stored
+        in `added` and `removed`.
+
+        Returns
+        -------
+        np.ndarray
+            The centre of mass of each compartment slot, shape `(capacity, 3)`,
+            NaN for free slots.
+        """
+        compartments = [cells for cells in self.filter() if len(cells) > 0]
+        self.cells = Ragged.from_sizes([len(cells) for cells in compartments])
+        self.slots, self.added, self.removed = self.compartments.sync(
+            cells[0].clusterId for cells in compartments
+        )
+        cell_ids = [cell.id for cells in compartments for cell in cells]
+        cell_slots, _, removed_cells = self.cell_slots.sync(cell_ids)
+        self._read(compartments, cell_ids)
+
+        previous_coms = self.compartments.resize(self.coms, np.nan)
+        previous_coms[self.removed] = np.nan
+        self._cell_coms = self.cell_slots.resize(self._cell_coms, np.nan)
+        self._cell_coms[removed_cells] = np.nan
+
+        # new cells continue from the centre of mass of their compartment, new
+        # compartments from the wrapped positions
+        reference = self._cell_coms[cell_slots]
+        new = np.isnan(reference[:, 0])
+        reference[new] = previous_coms[self.cells.broadcast(self.slots)[new]]
+        new = np.isnan(reference[:, 0])
+        reference[new] = self.positions[new]
+
+        unwrapped_coms = unwrap(reference, self.positions, self.box_size)
+        empty = self.cells.sum(self.volumes) == 0
+        unwrapped_coms[self.cells.broadcast(empty)] = 0
+        self._cell_coms[cell_slots] = unwrapped_coms
+
+        self.coms = np.full((self.capacity, 3), np.nan)
+        self.coms[self.slots] = self.cells.weighted_mean(unwrapped_coms, self.volumes)
+        return self.coms
+
+    def state_dict(self) -> dict:
+        return {
+            "coms": self.coms,
+            "cell_coms": self._cell_coms,
+            "compartment_ids": self.compartments.ids,
+            "compartment_free": self.compartments.state_dict()["free"],
+            "cell_ids": self.cell_slots.ids,
+            "cell_free": self.cell_slots.state_dict()["free"],
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        self.coms = np.array(state["coms"], dtype=float)
+        self._cell_coms = np.array(state["cell_coms"], dtype=float)
+        self.compartments.load_state_dict(
+            {"ids": state["compartment_ids"], "free": state["compartment_free"]}
+        )
+        self.cell_slots.load_state_dict(
+            {"ids": state["cell_ids"], "free": state["cell_free"]}
+        )
+
+    def _read(self, compartments: list[list[CellG]], cell_ids: list[int]) -> None:
+        """Read the position, volume and type of the cells of the compartments."""
+        if self.snapshot is not None:
+            rows = self.snapshot.rows(np.array(cell_ids, dtype=np.int64))
+            self.positions = self.snapshot.coms[rows]
+            self.volumes = self.snapshot.volumes[rows]
+            self.types = self.snapshot.types[rows].astype(int)
+            return
+
+        values = np.array(
+            [
+                (
+                    cell.xCOM,
+                    cell.yCOM,
+                    0 if self.dims == 2 else cell.zCOM,
+                    cell.volume,
+                    cell.type,
+                )
+                for cells in compartments
+                for cell in cells
+            ],
+            dtype=float,
+        ).reshape(-1, 5)
+
+        self.positions = values[:, :3]
+        self.volumes = values[:, 3]
+        self.types = values[:, 4].astype(int)
+
+
+class LatticeCompartmentCOMs:
+    """Compute the centre of mass of compartments from the pixels of their cells.
+
+    Unlike `CompartmentCOMs`, the centres of mass are computed from the lattice
+    without reference to the cell positions of the previous update, so `update`
+    only has to be called when a sample is recorded. The cell IDs of the lattice,
+    as returned by `lattice` (e.g. `LatticeSnapshot.update`), are mapped to the
+    compartments returned by the filter with a lookup array, and the pixel
+    coordinates are summed per compartment with `np.bincount`. Pixels of other
+    cells and of the medium are ignored. Along each periodic axis, the circular mean of
+    the pixel coordinates gives a reference point within the compartment, and the
+    mean minimum image offset of the pixels from the reference gives the exact
+    centre of mass, also for compartments crossing the boundary of the box as long
+    as they span less than half of it.
+
+    Between updates, only the wrapped centres of mass `wrapped` and the number of
+    times each compartment crossed the box along each axis, `images`, are kept.
+    On each update, the image count changes by the jump of the wrapped position
+    across the box, and the returned positions are `wrapped + images * box_size`.
+    This assumes that a compartment moves by less than half a box size between
+    two updates. Compartments without pixels are reset to the origin.
+    """
+
+    def __init__(
+        self,
+        filter: Filter[list[CellG]],
+        lattice: Callable[[], np.ndarray],
+        dims: int = 2,
+    ):
+        self.filter = filter
+        self.lattice = lattice
+        self.dims = dims
+
+        self.box_size = np.zeros(3)
+        self.wrapped = np.zeros((0, 3))
+        self.images = np.zeros((0, 3), dtype=np.int64)
+        self._n_compartments = 0
+
+    @property
+    def n_compartments(self) -> int:
+        return self._n_compartments
+
+    @property
+    def coms(self) -> np.ndarray:
+        """Return the unwrapped centres of mass of the last update."""
+        return self.wrapped + self.images * self.box_size
+
+    def start(self, box_size: np.ndarray) -> np.ndarray:
+        """
+        Fix the number of compartments and compute their initial positions.
+
+        Parameters
+        ----------
+        box_size : np.ndarray
+            The size of the periodic box along each spatial dimension.
+
+        Returns
+        -------
+        np.ndarray
+            The centre of mass of each compartment, shape `(n_compartments, 3)`.
+        """
+        self.box_size = np.asarray(box_size, dtype=float)
+        self._n_compartments = len(list(self.filter()))
+        self.wrapped = np.nan_to_num(self._compute())
+        self.images = np.zeros((self._n_compartments, 3), dtype=np.int64)
+        return self.coms
+
+    def update(self) -> np.ndarray:
+        """
+        Compute the current centres of mass and unwrap them.
+
+        Returns
+        -------
+        np.ndarray
+            The centre of mass of each compartment, shape `(n_compartments, 3)`.
+        """
+        wrapped = self._compute()
+        periodic = self.box_size > 0
+        jumps = np.rint(
+            (self.wrapped - wrapped) / np.where(periodic, self.box_size, 1.0)
+        )
+        self.images += np.where(periodic, np.nan_to_num(jumps), 0).astype(np.int64)
+
+        # compartments without pixels are reset to the origin
+        empty = np.isnan(wrapped[:, 0])
+        wrapped[empty] = 0
+        self.images[empty] = 0
+        self.wrapped = wrapped
+        return self.coms
+
+    def state_dict(self) -> dict:
+        return {"wrapped": self.wrapped, "images": self.images}
+
+    def load_state_dict(self, state: dict) -> None:
+        self.wrapped = np.array(state["wrapped"], dtype=float)
+        self.images = np.array(state["images"], dtype=np.int64)
+
+    def _compute(self) -> np.ndarray:
+        """
+        Compute the centre of mass of each compartment within the box.
+
+        Returns
+        -------
+        np.ndarray
+            The centres of mass of shape `(n_compartments, 3)`, NaN for
+            compartments without pixels.
+        """
+        lattice = self.lattice()
+        groups = list(self.filter())
+        if len(groups) != self._n_compartments:
+            raise ValueError(
+                f"The filter returned {len(groups)} compartments instead of "
+                f"{self._n_compartments}."
+            )
+
+        cell_ids = np.fromiter(
+            (cell.id for cells in groups for cell in cells), dtype=np.int64
+        )
+        lookup = np.full(
+            max(int(lattice.max(initial=0)), int(cell_ids.max(initial=0))) + 1,
+            -1,
+            dtype=np.int64,
+        )
+        lookup[cell_ids] = Ragged.from_sizes(
+            [len(cells) for cells in groups]
+        ).segment_ids
+
+        compartment_of_pixel = lookup[lattice.ravel()]
+        pixels = np.flatnonzero(compartment_of_pixel >= 0)
+        compartments = compartment_of_pixel[pixels]
+        coordinates = np.unravel_index(pixels, lattice.shape)
+
+        counts = np.bincount(compartments, minlength=self._n_compartments)
+        coms = np.zeros((self._n_compartments, 3))
+        for axis in range(lattice.ndim):
+            coms[:, axis] = _periodic_mean(
+                compartments,
+                coordinates[axis].astype(float),
+                counts,
+                self.box_size[axis],
+            )
+        coms[counts == 0] = np.nan
+        return coms
+
+
+def _periodic_mean(
+    segments: np.ndarray, values: np.ndarray, counts: np.ndarray, size: float
+) -> np.ndarray:
+    """
+    Compute the mean coordinate of each segment along a periodic axis.
+
+    Parameters
+    ----------
+    segments : np.ndarray
+        The segment of each value, shape `(n_values,)`.
+    values : np.ndarray
+        The coordinates of shape `(n_values,)`.
+    counts : np.ndarray
+        The number of values of each segment, shape `(n_segments,)`.
+    size : float
+        The size of the box along the axis, or 0 if the axis is not periodic.
+
+    Returns
+    -------
+    np.ndarray
+        The mean of each segment within `[0, size)`, shape `(n_segments,)`.
+    """
+    n_segments = len(counts)
+    safe_counts = np.maximum(counts, 1)
+    if size <= 0:
+        return np.bincount(segments, values, minlength=n_segments) / safe_counts
+
+    angles = 2 * np.pi * values / size
+    reference = (
+        np.arctan2(
+            np.bincount(segments, np.sin(angles), minlength=n_segments),
+            np.bincount(segments, np.cos(angles), minlength=n_segments),
+        )
+        * size
+        / (2 * np.pi)
+    )
+    offsets = minimum_image(values - reference[segments], np.array(size))
+    mean = (
+        reference + np.bincount(segments, offsets, minlength=n_segments) / safe_counts
+    )
+    return mean % size
@@ -0,0 +1,316 @@
+"""Steppable to track the contact graph between compartments."""
+
+from pathlib import Path
+
+import h5py
+import numpy as np
+from cc3d.core.PySteppables import SteppableBasePy
+from cc3d.core.XMLUtils import ElementCC3D
+from cc3d.cpp.CompuCell import CellG
+
+from cc3dslib.analysis.h5_writer import append_to_dataset
+from cc3dslib.analysis.schedule import Schedule
+from cc3dslib.filter import Filter
+from cc3dslib.simulation.element import Element
+
+CSR = tuple[np.ndarray, np.ndarray, np.ndarray]
+_CONTACT = np.dtype([("cell", np.int64), ("neighbor", np.int64), ("area", float)])
+
+
+class ContactTracker(SteppableBasePy, Element):
+    """Steppable to track the contact graph between compartments.
+
+    Each sample is the symmetric adjacency matrix of the compartments returned by
+    the filter, with the shared contact area between two compartments as weight,
+    in compressed sparse row format. Contacts with the medium, with cells outside
+    the compartments and within a compartment are ignored. The compartments are
+    fixed when the steppable starts; rows and columns are ordered as returned by
+    the filter, and the cluster ID of each compartment is stored in `cluster_ids`.
+    The filter is called again for every sample to read the neighbours, but only
+    the cells the compartments had at the start are tracked. The cells of
+    compartments created later are treated like untracked cells.
+
+    Samples are recorded every time the steppable runs or, with a `Schedule`, at
+    the first step at or after each scheduled MCS. The frames are stored as flat
+    `indices` and `data` datasets, with the row pointers of each frame in `indptr`
+    and the position of its first entry in `offset`. With `delta`, only frames
+    every `keyframe_interval` samples are stored in full and the others only
+    contain the entries that changed since the previous frame, with an area of
+    zero for removed contacts. Use `read_contact_graph` to reconstruct a frame.
+
+    The tracker can be saved by a `Checkpointer`. On restart, it appends to the
+    existing file from the frame of the checkpoint, starting with a keyframe. The
+    filter must then return the same number of compartments as in the file.
+    """
+
+    def __init__(
+        self,
+        filename: Path | str,
+        filter: Filter[list[CellG]],
+        chunk_size=100,
+        frequency=1,
+        schedule: Schedule | None = None,
+        delta: bool = False,
+        keyframe_interval: int = 100,
+    ):
+        super().__init__(frequency)
+
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1.")
+
+        self.filename = filename
+        self.filter = filter
+        self.chunk_size = chunk_size
+        self.schedule = schedule
+        self.delta = delta
+        self.keyframe_interval = keyframe_interval
+
+        self.n_compartments = 0
+        self._sorted_ids = np.empty(0, dtype=np.int64)
+        self._sorted_compartments = np.empty(0, dtype=np.int64)
+        self._next_sample: int | None = 0
+        self._restored_state: dict | None = None
+
+    def start(self):
+        state, self._restored_state = self._restored_state, None
+        self.file = h5py.File(self.filename, "w" if state is None else "a")
+
+        compartments = list(self.filter())
+        self.n_compartments = len(compartments)
+        cell_ids = np.array(
+            [cell.id for cells in compartments for cell in cells], dtype=np.int64
+        )
+        sizes = [len(cells) for cells in compartments]
+        order = np.argsort(cell_ids, kind="stable")
+        self._sorted_ids = cell_ids[order]
+        self._sorted_compartments = np.repeat(np.arange(len(sizes)), sizes)[order]
+
+        n = self.n_compartments
+        if state is None:
+            self.file.attrs["n_compartments"] = n
+            self.file.create_dataset(
+                "cluster_ids",
+                data=np.array([cells[0].clusterId for cells in compartments]),
+            )
+            for name, shape, dtype in (
+                ("mcs", (0,), "i8"),
+                ("keyframe", (0,), "?"),
+                ("offset", (0,), "i8"),
+                ("indptr", (0, n + 1), "i8"),
+                ("indices", (0,), "i4"),
+                ("data", (0,), "f"),
+            ):
+                self.file.create_dataset(
+                    name, shape, maxshape=(None,) + shape[1:], dtype=dtype
+                )
+        else:
+            n_saved = int(self.file.attrs["n_compartments"])
+            if n != n_saved:
+                self.file.close()
+                raise ValueError(
+                    f"The filter returned {n} compartments, but {self.filename} "
+                    f"was written for {n_saved}."
+                )
+            # drop the frames written after the checkpoint and append from there
+            for name in ("mcs", "keyframe", "offset", "indptr"):
+                self.file[name].resize(int(state["rows"]), axis=0)
+            for name in ("indices", "data"):
+                self.file[name].resize(int(state["nnz"]), axis=0)
+
+        self.frames = int(self.file["mcs"].shape[0])
+        self.nnz = int(self.file["indices"].shape[0])
+        self._buffer: list[tuple[int, bool, np.ndarray, np.ndarray, np.ndarray]] = []
+        # the first frame after (re)starting is always a keyframe
+        self._previous: tuple[np.ndarray, np.ndarray] | None = None
+        self._since_keyframe = 0
+
+        self._next_sample = self.schedule.next(0) if self.schedule is not None else 0
+        if state is not None and "next_sample" in state:
+            next_sample = int(state["next_sample"])
+            self._next_sample = next_sample if next_sample >= 0 else None
+
+    def step(self, mcs: int):
+        if self.schedule is not None:
+            if self._next_sample is None or mcs < self._next_sample:
+                return
+            self._next_sample = self.schedule.next(mcs + 1)
+
+        keys, areas = self.contact_graph()
+        keyframe = (
+            not self.delta
+            or self._previous is None
+            or self._since_keyframe >= self.keyframe_interval
+        )
+        if keyframe:
+            self._buffer.append((mcs, True, *self._to_csr(keys, areas)))
+            self._since_keyframe = 1
+        else:
+            assert self._previous is not None
+            changed_keys, changed_areas = _difference(*self._previous, keys, areas)
+            self._buffer.append(
+                (mcs, False, *self._to_csr(changed_keys, changed_areas))
+            )
+            self._since_keyframe += 1
+        self._previous = (keys, areas)
+
+        if len(self._buffer) >= self.chunk_size:
+            self._flush()
+
+    def finish(self):
+        if not self.file:
+            return
+
+        self._flush()
+        self.file.close()
+
+    def on_stop(self):
+        self.finish()
+
+    def contact_graph(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Read the current contacts of the tracked compartments.
+
+        The neighbours of all cells are read in a single pass and reduced to
+        compartment pairs with NumPy.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The sorted, unique keys `row * n_compartments + column` of the
+            compartment pairs in contact and their total shared contact area.
+        """
+        contacts = np.fromiter(
+            (
+                (cell.id, 0 if neighbor is None else neighbor.id, area)
+                for cells in self.filter()
+                for cell in cells
+                for neighbor, area in self.get_cell_neighbor_data_list(cell)
+            ),
+            dtype=_CONTACT,
+        )
+
+        rows = self._compartment_of(contacts["cell"])
+        columns = self._compartment_of(contacts["neighbor"])
+        valid = (rows >= 0) & (columns >= 0) & (rows != columns)
+
+        keys, inverse = np.unique(
+            rows[valid] * self.n_compartments + columns[valid], return_inverse=True
+        )
+        areas = np.bincount(
+            inverse, weights=contacts["area"][valid], minlength=len(keys)
+        )
+        return keys, areas
+
+    def state_dict(self) -> dict:
+        # frames still buffered in memory are written such that the checkpoint
+        # matches the file
+        self._flush()
+        return {
+            "rows": self.frames,
+            "nnz": self.nnz,
+            "next_sample": -1 if self._next_sample is None else self._next_sample,
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        self._restored_state = state
+
+    def build(self) -> list[ElementCC3D]:
+        neighbour_plugin = ElementCC3D("Plugin", {"Name": "NeighborTracker"})
+        return [neighbour_plugin]
+
+    def _compartment_of(self, cell_ids: np.ndarray) -> np.ndarray:
+        """Return the compartment of each cell, or -1 for untracked cells."""
+        if len(self._sorted_ids) == 0:
+            return np.full(cell_ids.shape, -1)
+
+        positions = np.searchsorted(self._sorted_ids, cell_ids).clip(
+            max=len(self._sorted_ids) - 1
+        )
+        found = self._sorted_ids[positions] == cell_ids
+        return np.where(found, self._sorted_compartments[positions], -1)
+
+    def _to_csr(self, keys: np.ndarray, areas: np.ndarray) -> CSR:
+        rows, indices = np.divmod(keys, self.n_compartments)
+        indptr = np.searchsorted(rows, np.arange(self.n_compartments + 1))
+        return indptr, indices, areas
+
+    def _flush(self) -> None:
+        """Append the buffered frames to the file."""
+        if not self._buffer:
+            return
+
+        mcs, keyframe, indptr, indices, data = zip(*self._buffer)
+        sizes = np.array([len(frame) for frame in indices], dtype=np.int64)
+        offsets = self.nnz + np.cumsum(sizes) - sizes
+
+        append_to_dataset(self.file["mcs"], np.array(mcs))
+        append_to_dataset(self.file["keyframe"], np.array(keyframe))
+        append_to_dataset(self.file["offset"], offsets)
+        append_to_dataset(self.file["indptr"], np.stack(indptr))
+        append_to_dataset(self.file["indices"], np.concatenate(indices))
+        append_to_dataset(self.file["data"], np.concatenate(data))
+
+        self.frames += len(self._buffer)
+        self.nnz += int(sizes.sum())
+        self._buffer = []
+
+
+def _difference(
+    keys: np.ndarray, areas: np.ndarray, new_keys: np.ndarray, new_areas: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the entries of a sparse matrix that changed, with zero if removed."""
+    all_keys = np.union1d(keys, new_keys)
+    old = np.zeros(len(all_keys))
+    new = np.zeros(len(all_keys))
+    old[np.searchsorted(all_keys, keys)] = areas
+    new[np.searchsorted(all_keys, new_keys)] = new_areas
+    changed = old != new
+    return all_keys[changed], new[changed]
+
+
+def read_contact_graph(filename: Path | str, frame: int) -> CSR:
+    """
+    Read a frame written by a `ContactTracker`.
+
+    Delta frames are applied to the preceding keyframe.
+
+    Parameters
+    ----------
+    filename : Path | str
+        The HDF5 file written by the tracker.
+    frame : int
+        The index of the frame; negative values count from the end.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray, np.ndarray]
+        The `indptr`, `indices` and `data` arrays of the contact graph in
+        compressed sparse row format, e.g. for `scipy.sparse.csr_matrix`.
+    """
+    with h5py.File(filename, "r") as file:
+        n = int(file.attrs["n_compartments"])
+        n_frames = len(file["mcs"])
+        frame = range(n_frames)[frame]
+        keyframes = np.flatnonzero(file["keyframe"][: frame + 1])
+        first = int(keyframes[-1])
+        offsets = file["offset"][first : frame + 1]
+
+        keys, areas = np.empty(0, dtype=np.int64), np.empty(0)
+        for i, current in enumerate(range(first, frame + 1)):
+            indptr = file["indptr"][current]
+            start, stop = offsets[i], offsets[i] + indptr[-1]
+            rows = np.repeat(np.arange(n), np.diff(indptr))
+            frame_keys = rows * n + file["indices"][start:stop]
+            frame_areas = file["data"][start:stop].astype(float)
+            if current == first:
+                keys, areas = frame_keys, frame_areas
+                continue
+
+            all_keys = np.union1d(keys, frame_keys)
+            values = np.zeros(len(all_keys))
+            values[np.searchsorted(all_keys, keys)] = areas
+            values[np.searchsorted(all_keys, frame_keys)] = frame_areas
+            keys, areas = all_keys[values != 0], values[values != 0]
+
+    rows, indices = np.divmod(keys, n)
+    return np.searchsorted(rows, np.arange(n + 1)), indices, areas
@@ -7,11 +7,29 @@ import numpy as np
 import h5py
 from cc3d.core.PySteppables import SteppableBasePy
 
+from cc3dslib.analysis.h5_writer import AsyncH5Writer, ChunkedDatasetWriter
+from cc3dslib.periodic import minimum_image
 from cc3dslib.simulation.element import Element
+from cc3dslib.slots import SlotAllocator
+from cc3dslib.snapshot import CellSnapshot
 
 
 class DistanceTracker(SteppableBasePy, Element):
-    """Steppable to track the displacement vector of cells between simulation steps."""
+    """Steppable to track the displacement vector of cells between simulation steps.
+
+    If a `CellSnapshot` is given, cell positions are read from the snapshot instead
+    of the cells. With `async_write`, full chunks are written to the HDF5 file on a
+    background thread while the simulation continues.
+
+    With `dynamic`, cells may appear and disappear during the simulation. Each
+    cell is then written to a fixed column of `floats` assigned by a
+    `SlotAllocator`, which grows as needed, and the cell ID in each column is
+    written to the `ids` dataset. Unused columns and the first step of a new cell
+    are NaN, and unused columns have an ID of -1.
+
+    The tracker can be saved by a `Checkpointer`. On restart, it appends to the
+    existing file from the row of the checkpoint.
+    """
 
     def __init__(
         self,
@@ -19,63 +37,202 @@ class DistanceTracker(SteppableBasePy, Element):
         dims: int = 2,
         chunk_size=1000,
         frequency=1,
+        snapshot: CellSnapshot | None = None,
+        async_write: bool = False,
+        dynamic: bool = False,
     ):
         super().__init__(frequency)
 
         self.filename = filename
         self.dims = dims
         self.chunk_size = chunk_size
+        self.snapshot = snapshot
+        self.async_write = async_write
+        self.dynamic = dynamic
+        self.slots = SlotAllocator()
+        self._restored_state: dict | None = None
 
     def start(self):
         self.steps = 0
-        self.file = h5py.File(self.filename, "w")
+        state, self._restored_state = self._restored_state, None
+        self.file = h5py.File(self.filename, "w" if state is None else "a")
 
         assert (
             self.cell_list is not None
         ), "No cells in simulation. Please add DistanceTracker after cell creation steppables."
 
-        n_particles = len(self.cell_list)
-        self.h5_dset = self.file.create_dataset(
-            "floats",
-            (0, n_particles, self.dims),
-            maxshape=(None, n_particles, self.dims),
+        if self.snapshot is not None:
+            self.snapshot.refresh()
+            self._cell_ids = self.snapshot.ids.copy()
+        if self.dynamic:
+            self.slots = SlotAllocator()
+            cell_ids, coms = self._gather_cells()
+            slots, _, _ = self.slots.sync(cell_ids)
+            self.last_coms = np.full((self.slots.capacity, 3), np.nan)
+            self.last_coms[slots] = coms
+            n_particles = self.slots.capacity
+        else:
+            self.last_coms = self._gather_coms()
+            n_particles = len(self.cell_list)
+
+        if state is None:
+            self.h5_dset = self.file.create_dataset(
+                "floats",
+                (0, n_particles, self.dims),
+                maxshape=(None, None if self.dynamic else n_particles, self.dims),
+                dtype="f",
+                fillvalue=np.nan,
+            )
+            if self.dynamic:
+                self.file.create_dataset(
+                    "ids",
+                    (0, n_particles),
+                    maxshape=(None, None),
+                    dtype="i8",
+                    fillvalue=-1,
+                )
+        else:
+            # drop the rows written after the checkpoint and append from there
+            self.h5_dset = self.file["floats"]
+            self.h5_dset.resize(int(state["rows"]), axis=0)
+            if self.dynamic:
+                self.file["ids"].resize(int(state["rows"]), axis=0)
+                self.slots.load_state_dict(
+                    {"ids": state["cell_ids"], "free": state["cell_free"]}
+                )
+            self.last_coms = np.array(state["last_coms"], dtype=float)
+            self.steps = int(state["steps"])
+        self.writer = AsyncH5Writer() if self.async_write else None
+        self.distance_writer = ChunkedDatasetWriter(
+            self.h5_dset, self.chunk_size, self.writer
+        )
+        self.ids_writer = (
+            ChunkedDatasetWriter(self.file["ids"], self.chunk_size, self.writer)
+            if self.dynamic
+            else None
         )
-        self.distances = np.empty((self.chunk_size, n_particles, self.dims))
-        self.last_coms = np.empty((n_particles, 3))
 
-        for i, cell in enumerate(self.cell_list):
-            self.last_coms[i, :] = [
-                cell.xCOM,
-                cell.yCOM,
-                0 if self.dims == 2 else cell.zCOM,
-            ]
+        box_coords = self.get_box_coordinates()[1]
+        self.box_size = np.array([box_coords.x, box_coords.y, box_coords.z])
 
-    def step(self, _):
+    def step(self, mcs: int):
         assert self.cell_list, "No cells in simulation."
+        if self.snapshot is not None:
+            self.snapshot.update(mcs)
 
-        if self.steps % self.chunk_size == 0:
-            self.h5_dset.resize(self.h5_dset.shape[0] + self.chunk_size, axis=0)
-            self.h5_dset[-self.chunk_size :, :, :] = self.distances
-
-        for i, cell in enumerate(self.cell_list):
-            current_com = [cell.xCOM, cell.yCOM, 0 if self.dims == 2 else cell.zCOM]
-            previous_com = self.last_coms[i, :]
-            self.distances[
-                self.steps % self.chunk_size, i, :
-            ] = self.invariant_distance_vector(current_com, previous_com)[: self.dims]
+        if self.dynamic:
+            self._step_dynamic()
+            self.steps += 1
+            return
 
-            self.last_coms[i, :] = current_com
+        current_coms = self._gather_coms()
+        self.distance_writer.append(
+            minimum_image(current_coms - self.last_coms, self.box_size)[:, : self.dims]
+        )
+        self.last_coms = current_coms
 
         self.steps += 1
 
+    def _step_dynamic(self) -> None:
+        """Write the displacements of the current cells to their columns."""
+        assert self.ids_writer is not None
+        cell_ids, current_coms = self._gather_cells()
+        slots, _, removed = self.slots.sync(cell_ids)
+
+        # new cells, including those reusing the slot of a removed cell, have no
+        # previous position
+        last_coms = self.slots.resize(self.last_coms, np.nan)
+        last_coms[removed] = np.nan
+        displacements = np.full((self.slots.capacity, self.dims), np.nan)
+        displacements[slots] = minimum_image(
+            current_coms - last_coms[slots], self.box_size
+        )[:, : self.dims]
+        self.last_coms = np.full((self.slots.capacity, 3), np.nan)
+        self.last_coms[slots] = current_coms
+
+        if self.slots.capacity > self.h5_dset.shape[1]:
+            self.distance_writer.resize_rows((self.slots.capacity, self.dims))
+            self.ids_writer.resize_rows((self.slots.capacity,))
+        self.distance_writer.append(displacements)
+        self.ids_writer.append(self.slots.ids)
+
     def finish(self):
-        self.h5_dset[-self.chunk_size :, :, :] = self.distances
-        self.h5_dset.resize(self.steps, axis=0)
+        if not self.file:
+            return
+
+        self.distance_writer.flush()
+        if self.ids_writer is not None:
+            self.ids_writer.flush()
+        if self.writer is not None:
+            self.writer.close()
         self.file.close()
 
     def on_stop(self):
         self.finish()
 
+    def state_dict(self) -> dict:
+        # rows still buffered in memory are written such that the checkpoint
+        # matches the file
+        self.distance_writer.flush()
+        if self.ids_writer is not None:
+            self.ids_writer.flush()
+        if self.writer is not None:
+            self.writer.flush()
+        state = {
+            "last_coms": self.last_coms,
+            "steps": self.steps,
+            "rows": len(self.h5_dset),
+        }
+        if self.dynamic:
+            slots = self.slots.state_dict()
+            state["cell_ids"], state["cell_free"] = slots["ids"], slots["free"]
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        self._restored_state = state
+
     def build(self) -> list[ElementCC3D]:
         com_plugin = ElementCC3D("Plugin", {"Name": "CenterOfMass"})
         return [com_plugin]
+
+    def _gather_coms(self) -> np.ndarray:
+        """
+        Read the centre of mass of every cell.
+
+        Returns
+        -------
+        np.ndarray
+            The centre of mass positions of shape `(n_particles, 3)`.
+        """
+        if self.snapshot is not None:
+            return self.snapshot.coms[self.snapshot.rows(self._cell_ids)]
+
+        return np.array(
+            [
+                (cell.xCOM, cell.yCOM, 0 if self.dims == 2 else cell.zCOM)
+                for cell in self.cell_list
+            ],
+            dtype=float,
+        ).reshape(-1, 3)
+
+    def _gather_cells(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Read the ID and centre of mass of every cell currently in the simulation.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The cell IDs of shape `(n_cells,)` and the centre of mass positions of
+            shape `(n_cells, 3)`.
+        """
+        if self.snapshot is not None:
+            return self.snapshot.ids, self.snapshot.coms
+
+        values = np.array(
+            [
+                (cell.id, cell.xCOM, cell.yCOM, 0 if self.dims == 2 else cell.zCOM)
+                for cell in self.cell_list
+            ],
+            dtype=float,
+        ).reshape(-1, 4)
+        return values[:, 0].astype(np.int64), values[:, 1:]
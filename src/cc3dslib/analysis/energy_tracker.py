@@ -1,49 +1,333 @@
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Sequence
+
 from cc3d.core.PySteppables import SteppableBasePy
 from cc3d.core.XMLUtils import ElementCC3D
 
+from cc3dslib.analysis.h5_writer import ChunkedDatasetWriter
+from cc3dslib.simulation.checkpoint import generator_state, set_generator_state
 from cc3dslib.simulation.element import Element
 
+import h5py
 import numpy as np
 
 
+@dataclass
+class EnergyStatistics:
+    """Statistics of the flip attempts of a single MCS.
+
+    Attributes:
+        - mean (np.ndarray): Mean energy change of each energy term
+        - accepted_mean (np.ndarray): Mean energy change of each energy term over
+          the accepted flips (zero if no flip was accepted)
+        - acceptance_rate (float): Fraction of accepted flips
+        - variance (np.ndarray | None): Variance of the energy change of each term
+        - minimum (np.ndarray | None): Minimum energy change of each term
+        - maximum (np.ndarray | None): Maximum energy change of each term
+    """
+
+    mean: np.ndarray
+    accepted_mean: np.ndarray
+    acceptance_rate: float
+    variance: np.ndarray | None = None
+    minimum: np.ndarray | None = None
+    maximum: np.ndarray | None = None
+
+
+def reduce_energy_calculations(
+    energy_changes: Sequence[Sequence[float]] | np.ndarray,
+    flip_results: Sequence[bool] | np.ndarray,
+    n_energies: int,
+    extended: bool = False,
+    max_samples: int | None = None,
+    rng: np.random.Generator | None = None,
+) -> EnergyStatistics:
+    """
+    Reduce the per flip attempt energy changes of one MCS to summary statistics.
+
+    The tables are converted to NumPy arrays exactly once (without copying if they
+    support the buffer protocol) and all statistics are computed from that
+    conversion without further copies of the table.
+
+    Parameters
+    ----------
+    energy_changes : Sequence[Sequence[float]] | np.ndarray
+        Energy change of each energy term for each flip attempt.
+    flip_results : Sequence[bool] | np.ndarray
+        Whether each flip attempt was accepted.
+    n_energies : int
+        The number of energy terms.
+    extended : bool
+        Whether to compute the variance, minimum and maximum as well.
+    max_samples : int | None
+        If given, statistics are computed over a random subsample of at most this
+        many flip attempts. Only the sampled rows are converted.
+    rng : np.random.Generator | None
+        Random number generator used for subsampling. If None, a generator is
+        seeded from the global NumPy random number generator.
+
+    Returns
+    -------
+    EnergyStatistics
+        The statistics of the flip attempts.
+    """
+    if max_samples is not None and len(flip_results) > max_samples:
+        if rng is None:
+            rng = np.random.default_rng(
+                int(np.random.randint(2**32, dtype=np.uint64))
+            )
+        indices = np.sort(rng.choice(len(flip_results), max_samples, replace=False))
+        if isinstance(energy_changes, np.ndarray):
+            energy_changes = energy_changes[indices]
+        else:
+            energy_changes = [energy_changes[i] for i in indices]
+        if isinstance(flip_results, np.ndarray):
+            flip_results = flip_results[indices]
+        else:
+            flip_results = [flip_results[i] for i in indices]
+
+    changes = np.asarray(energy_changes, dtype=float).reshape(-1, n_energies)
+    accepted = np.asarray(flip_results, dtype=bool).reshape(-1)
+
+    n_attempts = len(accepted)
+    n_accepted = np.count_nonzero(accepted)
+    total = changes.sum(axis=0)
+    accepted_total = accepted.astype(float) @ changes
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / n_attempts
+        statistics = EnergyStatistics(
+            mean=mean,
+            accepted_mean=(
+                accepted_total / n_accepted if n_accepted else np.zeros(n_energies)
+            ),
+            acceptance_rate=n_accepted / n_attempts if n_attempts else np.nan,
+        )
+        if extended:
+            # the squared deviations from the mean avoid the cancellation of
+            # E[x^2] - E[x]^2 for energies with a large offset
+            deviations = changes - mean
+            statistics.variance = (
+                np.einsum("ij,ij->j", deviations, deviations) / n_attempts
+            )
+            statistics.minimum = changes.min(axis=0, initial=np.inf)
+            statistics.maximum = changes.max(axis=0, initial=-np.inf)
+
+    return statistics
+
+
 class EnergyTracker(SteppableBasePy, Element):
-    def __init__(self, frequency=1):
+    """Steppable to track the mean energy changes and acceptance rate of flips.
+
+    By default, the statistics of each step are kept in memory and can be written
+    to disk with `save`. If a `filename` is given, the statistics are instead
+    streamed to extendable HDF5 datasets in chunks of `chunk_size` steps, which
+    keeps memory usage constant. The file is flushed after every chunk, such that
+    the data written so far can be recovered if the simulation is aborted.
+
+    With `extended_statistics`, the variance, minimum and maximum of the energy
+    changes are recorded as well. With `max_samples`, the statistics of each step
+    are computed from a random subsample of the flip attempts to bound the cost per
+    step on large lattices. The subsample is drawn with a generator seeded with
+    `seed`, or from the global NumPy random number generator if `seed` is None.
+
+    The tracker can be saved by a `Checkpointer`. On restart, it continues the
+    in-memory statistics or appends to the existing file from the row of the
+    checkpoint.
+    """
+
+    def __init__(
+        self,
+        frequency=1,
+        filename: Path | str | None = None,
+        chunk_size: int = 1000,
+        extended_statistics: bool = False,
+        max_samples: int | None = None,
+        seed: int | np.random.Generator | None = None,
+    ):
         super().__init__(frequency)
         self.num_flips: int = 0
         self.energy_names: list[str] = []
         self.energy_changes: list[np.ndarray] = []
         self.accepted_energy_changes: list[np.ndarray] = []
         self.flip_results: list[float] = []
+        self.energy_change_variances: list[np.ndarray] = []
+        self.min_energy_changes: list[np.ndarray] = []
+        self.max_energy_changes: list[np.ndarray] = []
+
+        self.extended_statistics = extended_statistics
+        self.max_samples = max_samples
+        if seed is None:
+            seed = int(np.random.randint(2**32, dtype=np.uint64))
+        self.rng = np.random.default_rng(seed)
+
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.file: h5py.File | None = None
+        self._writers: dict[str, ChunkedDatasetWriter] = {}
+        self._restored_state: dict | None = None
+
+    def start(self):
+        state, self._restored_state = self._restored_state, None
+        if state is not None:
+            set_generator_state(self.rng, state["rng"])
+
+        if self.filename is not None:
+            self.file = h5py.File(self.filename, "w" if state is None else "a")
+            if state is not None and "energy_names" in self.file:
+                self.energy_names = self.file["energy_names"].asstr()[:].tolist()
+                self._open_datasets(int(state["rows"]))
+        elif state is not None:
+            for name in self._record_names():
+                if name in state:
+                    setattr(self, name, list(state[name]))
 
     def step(self, mcs: int):
         calcs = self.get_energy_calculations()
 
-        if mcs == 0:
+        if not self.energy_names:
             self.energy_names = calcs.function_names
 
-        self.energy_changes.append(np.array(calcs.energy_changes).mean(axis=0))
-        if np.array(calcs.flip_results).any():
-            self.accepted_energy_changes.append(
-                np.array(calcs.energy_changes)[np.array(calcs.flip_results)].mean(
-                    axis=0
-                )
-            )
-        else:
-            self.accepted_energy_changes.append(np.zeros(len(self.energy_names)))
-        self.flip_results.append(np.array(calcs.flip_results).mean())
+        statistics = reduce_energy_calculations(
+            calcs.energy_changes,
+            calcs.flip_results,
+            len(self.energy_names),
+            extended=self.extended_statistics,
+            max_samples=self.max_samples,
+            rng=self.rng,
+        )
+        records = {
+            "energy_changes": statistics.mean,
+            "accepted_energy_changes": statistics.accepted_mean,
+            "flip_results": statistics.acceptance_rate,
+        }
+        if self.extended_statistics:
+            records["energy_change_variances"] = statistics.variance
+            records["min_energy_changes"] = statistics.minimum
+            records["max_energy_changes"] = statistics.maximum
+
+        if self.file is None:
+            for name, value in records.items():
+                getattr(self, name).append(value)
+            return
+
+        if not self._writers:
+            self._create_datasets(list(records))
+        for name, value in records.items():
+            self._writers[name].append(value)
+
+    def finish(self):
+        if not self.file:
+            return
+
+        for writer in self._writers.values():
+            writer.flush()
+        self.file.close()
+
+    def on_stop(self):
+        self.finish()
 
     def calc_acceptance_rates(self) -> np.ndarray:
-        return np.array(self.flip_results)
+        return self._load("flip_results")
 
     def save(self, filename: str | Path) -> None:
         np.savez(
             filename,
             energy_names=self.energy_names,
-            energy_changes=np.array(self.energy_changes),
-            accepted_energy_changes=np.array(self.accepted_energy_changes),
-            flip_results=np.array(self.flip_results),
+            **{name: self._load(name) for name in self._record_names()},
         )
 
+    def state_dict(self) -> dict:
+        state: dict = {"rng": generator_state(self.rng)}
+        if self.file is None:
+            for name in self._record_names():
+                state[name] = np.array(getattr(self, name))
+            return state
+
+        # rows still buffered in memory are written such that the checkpoint
+        # matches the file
+        rows = 0
+        for writer in self._writers.values():
+            writer.flush()
+            rows = len(writer.dataset)
+        state["rows"] = rows
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        self._restored_state = state
+
     def build(self) -> list[ElementCC3D]:
         return []
+
+    def _record_names(self) -> list[str]:
+        names = ["energy_changes", "accepted_energy_changes", "flip_results"]
+        if self.extended_statistics:
+            names += [
+                "energy_change_variances",
+                "min_energy_changes",
+                "max_energy_changes",
+            ]
+        return names
+
+    def _open_datasets(self, rows: int) -> None:
+        """Reopen the datasets of a previous run, truncated to `rows` steps."""
+        assert self.file is not None
+
+        for name in self._record_names():
+            dataset = self.file[name]
+            dataset.resize(rows, axis=0)
+            self._writers[name] = ChunkedDatasetWriter(
+                dataset, self.chunk_size, flush_file=True
+            )
+
+    def _create_datasets(self, names: list[str]) -> None:
+        """Create the extendable HDF5 datasets used in streaming mode."""
+        assert self.file is not None
+
+        n_energies = len(self.energy_names)
+        self.file.create_dataset(
+            "energy_names",
+            data=[str(name) for name in self.energy_names],
+            dtype=h5py.string_dtype(),
+        )
+        for name in names:
+            row_shape = () if name == "flip_results" else (n_energies,)
+            dataset = self.file.create_dataset(
+                name,
+                (0,) + row_shape,
+                maxshape=(None,) + row_shape,
+                chunks=(self.chunk_size,) + row_shape,
+                dtype="f8",
+            )
+            self._writers[name] = ChunkedDatasetWriter(
+                dataset, self.chunk_size, flush_file=True
+            )
+
+    def _load(self, name: str) -> np.ndarray:
+        """
+        Return the statistics recorded so far.
+
+        Parameters
+        ----------
+        name : str
+            One of `energy_changes`, `accepted_energy_changes`, `flip_results`,
+            `energy_change_variances`, `min_energy_changes` or `max_energy_changes`.
+
+        Returns
+        -------
+        np.ndarray
+            The recorded statistics, one row per step.
+        """
+        if self.filename is None:
+            return np.array(getattr(self, name))
+
+        if self.file:
+            writer = self._writers.get(name)
+            if writer is None:
+                return np.array([])
+            writer.flush()
+            return writer.dataset[:]
+
+        with h5py.File(self.filename, "r") as file:
+            return file[name][:] if name in file else np.array([])
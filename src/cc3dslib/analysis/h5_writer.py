@@ -0,0 +1,182 @@
+"""Helpers to append data to extendable HDF5 datasets in chunks."""
+
+import queue
+import threading
+from typing import Callable
+
+import h5py
+import numpy as np
+
+
+def append_to_dataset(dataset: h5py.Dataset, data: np.ndarray) -> None:
+    """
+    Append rows to an HDF5 dataset that is extendable along its first axis.
+
+    Parameters
+    ----------
+    dataset : h5py.Dataset
+        The dataset to append to.
+    data : np.ndarray
+        The rows to append. All but the first dimension must match the dataset.
+    """
+    n_rows = dataset.shape[0]
+    dataset.resize(n_rows + len(data), axis=0)
+    dataset[n_rows:] = data
+
+
+class AsyncH5Writer:
+    """Write chunks to HDF5 datasets on a dedicated I/O thread.
+
+    Chunks are handed off through a bounded queue, so the simulation only blocks if
+    the I/O thread falls behind by more than `max_pending` chunks. Errors raised on
+    the I/O thread are re-raised on the next call to `flush` or `close`.
+    """
+
+    def __init__(self, max_pending: int = 2):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(
+            target=self._run, name="cc3dslib-h5-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(
+        self,
+        dataset: h5py.Dataset,
+        data: np.ndarray,
+        on_written: Callable[[np.ndarray], None] | None = None,
+    ) -> None:
+        """
+        Queue rows to be appended to a dataset.
+
+        Parameters
+        ----------
+        dataset : h5py.Dataset
+            The dataset to append to.
+        data : np.ndarray
+            The rows to append. The array must not be modified until it is passed
+            to `on_written`.
+        on_written : Callable[[np.ndarray], None] | None
+            Called on the I/O thread with `data` once it has been written.
+        """
+        self._raise_error()
+        self._queue.put((dataset, data, on_written))
+
+    def flush(self) -> None:
+        """Block until all queued chunks have been written."""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """Write all queued chunks and stop the I/O thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                dataset, data, on_written = item
+                try:
+                    if self._error is None:
+                        append_to_dataset(dataset, data)
+                except BaseException as error:  # re-raised on the simulation thread
+                    self._error = error
+                if on_written is not None:
+                    on_written(data)
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+
+class ChunkedDatasetWriter:
+    """Buffer rows in memory and append them to a dataset one chunk at a time.
+
+    Without a writer, full chunks are written synchronously. With an
+    `AsyncH5Writer`, two chunk buffers are used alternately: while the I/O thread
+    writes one, the simulation fills the other. With `flush_file`, the HDF5 file is
+    flushed after every chunk, such that the data is recoverable if the process is
+    aborted.
+    """
+
+    def __init__(
+        self,
+        dataset: h5py.Dataset,
+        chunk_size: int,
+        writer: AsyncH5Writer | None = None,
+        flush_file: bool = False,
+    ):
+        self.dataset = dataset
+        self.chunk_size = chunk_size
+        self.writer = writer
+        self.flush_file = flush_file
+
+        self._allocate(dataset.shape[1:])
+
+    def resize_rows(self, shape: tuple[int, ...]) -> None:
+        """
+        Change the shape of the rows, e.g. when the number of particles grows.
+
+        The buffered rows are written first. The rows already in the dataset are
+        padded with the fill value of the dataset, so the dataset must have been
+        created with a `maxshape` of None along the resized axes.
+
+        Parameters
+        ----------
+        shape : tuple[int, ...]
+            The new shape of a single row.
+        """
+        self.flush()
+        if self.writer is not None:
+            self.writer.flush()
+        for axis, size in enumerate(shape, start=1):
+            self.dataset.resize(size, axis=axis)
+        self._allocate(shape)
+
+    def append(self, row: np.ndarray) -> None:
+        """Append a single row, writing the chunk once it is full."""
+        self.buffer[self.size] = row
+        self.size += 1
+        if self.size == self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand off the buffered rows, even if the chunk is not full."""
+        if self.size == 0:
+            return
+
+        if self.writer is None:
+            append_to_dataset(self.dataset, self.buffer[: self.size])
+            self._flush_file()
+        else:
+            buffer = self.buffer
+
+            def on_written(_: np.ndarray) -> None:
+                self._flush_file()
+                self._free.put(buffer)
+
+            self.writer.submit(self.dataset, buffer[: self.size], on_written)
+            self.buffer = self._free.get()
+
+        self.size = 0
+
+    def _allocate(self, shape: tuple[int, ...]) -> None:
+        n_buffers = 1 if self.writer is None else 2
+        self._free: queue.Queue = queue.Queue()
+        for _ in range(n_buffers):
+            self._free.put(np.empty((self.chunk_size,) + shape, self.dataset.dtype))
+
+        self.buffer: np.ndarray = self._free.get()
+        self.size = 0
+
+    def _flush_file(self) -> None:
+        if self.flush_file:
+            self.dataset.file.flush()
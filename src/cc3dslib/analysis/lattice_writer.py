@@ -0,0 +1,281 @@
+"""Steppable to write delta-encoded snapshots of the cell lattice."""
+
+from pathlib import Path
+from typing import Iterator
+
+import h5py
+import numpy as np
+from cc3d.core.PySteppables import SteppableBasePy
+from cc3d.core.XMLUtils import ElementCC3D
+
+from cc3dslib.analysis.h5_writer import AsyncH5Writer, append_to_dataset
+from cc3dslib.analysis.schedule import Schedule
+from cc3dslib.simulation.element import Element
+from cc3dslib.snapshot import LatticeSnapshot, read_cell_field
+
+
+class LatticeWriter(SteppableBasePy, Element):
+    """Steppable to write the cell ID of every pixel to a compressed HDF5 file.
+
+    The lattice is copied into a NumPy array of shape `(x, y)` (2D) or `(x, y, z)`
+    (3D), with 0 for the medium, by `read_cell_field`. If a `LatticeSnapshot` is
+    given, its copy is used and shared with the other steppables using it. Keyframes are stored in full in the `keyframes` dataset, one chunk per
+    frame. The frames in between only store the pixels that changed since the
+    previous frame, as flat pixel indices in `delta_index` and the new cell IDs in
+    `delta_id`, starting at `delta_offset` of the frame. A keyframe is written
+    every `keyframe_interval` frames and whenever more than `max_delta_fraction`
+    of the pixels changed. Use `read_lattice` or `iter_lattice` to reconstruct the
+    frames.
+
+    Frames are written every time the steppable runs or, with a `Schedule`, at the
+    first step at or after each scheduled MCS. With `async_write`, the frames are
+    written to the file on a background thread while the simulation continues.
+
+    The writer can be saved by a `Checkpointer`. On restart, it appends to the
+    existing file from the frame of the checkpoint, starting with a keyframe.
+    """
+
+    def __init__(
+        self,
+        filename: Path | str,
+        dims: int = 2,
+        frequency=100,
+        schedule: Schedule | None = None,
+        keyframe_interval: int = 50,
+        max_delta_fraction: float = 0.25,
+        compression: str | None = "gzip",
+        compression_opts: int | None = 4,
+        async_write: bool = False,
+        snapshot: LatticeSnapshot | None = None,
+    ):
+        super().__init__(frequency)
+
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1.")
+
+        self.filename = filename
+        self.dims = dims
+        self.schedule = schedule
+        self.keyframe_interval = keyframe_interval
+        self.max_delta_fraction = max_delta_fraction
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.async_write = async_write
+        self.snapshot = snapshot
+
+        self.shape: tuple[int, ...] = ()
+        self._next_sample: int | None = 0
+        self._restored_state: dict | None = None
+
+    def start(self):
+        state, self._restored_state = self._restored_state, None
+        self.file = h5py.File(self.filename, "w" if state is None else "a")
+
+        box_coords = self.get_box_coordinates()[1]
+        self.shape = (box_coords.x, box_coords.y, box_coords.z)[: self.dims]
+
+        if state is None:
+            self.file.attrs["shape"] = self.shape
+            compression = {
+                "compression": self.compression,
+                "compression_opts": self.compression_opts,
+            }
+            for name, dtype in (
+                ("mcs", "i8"),
+                ("keyframe", "?"),
+                ("keyframe_index", "i8"),
+                ("delta_offset", "i8"),
+            ):
+                self.file.create_dataset(name, (0,), maxshape=(None,), dtype=dtype)
+            self.file.create_dataset(
+                "keyframes",
+                (0,) + self.shape,
+                maxshape=(None,) + self.shape,
+                chunks=(1,) + self.shape,
+                dtype="i4",
+                **compression,
+            )
+            for name, dtype in (("delta_index", "i8"), ("delta_id", "i4")):
+                self.file.create_dataset(
+                    name,
+                    (0,),
+                    maxshape=(None,),
+                    chunks=(1 << 16,),
+                    dtype=dtype,
+                    **compression,
+                )
+        else:
+            # drop the frames written after the checkpoint and append from there
+            for name in ("mcs", "keyframe", "keyframe_index", "delta_offset"):
+                self.file[name].resize(int(state["rows"]), axis=0)
+            self.file["keyframes"].resize(int(state["keyframes"]), axis=0)
+            for name in ("delta_index", "delta_id"):
+                self.file[name].resize(int(state["deltas"]), axis=0)
+
+        self.frames = len(self.file["mcs"])
+        self.keyframes = len(self.file["keyframes"])
+        self.deltas = len(self.file["delta_index"])
+        self.writer = AsyncH5Writer() if self.async_write else None
+        # the first frame after (re)starting is always a keyframe
+        self._previous: np.ndarray | None = None
+        self._since_keyframe = 0
+
+        self._next_sample = self.schedule.next(0) if self.schedule is not None else 0
+        if state is not None and "next_sample" in state:
+            next_sample = int(state["next_sample"])
+            self._next_sample = next_sample if next_sample >= 0 else None
+
+    def step(self, mcs: int):
+        if self.schedule is not None:
+            if self._next_sample is None or mcs < self._next_sample:
+                return
+            self._next_sample = self.schedule.next(mcs + 1)
+
+        lattice = self.gather_lattice()
+        changed = np.empty(0, dtype=np.int64)
+        if self._previous is not None:
+            changed = np.flatnonzero(lattice != self._previous)
+
+        keyframe = (
+            self._previous is None
+            or self._since_keyframe >= self.keyframe_interval
+            or len(changed) > self.max_delta_fraction * lattice.size
+        )
+        if keyframe:
+            self._append("keyframes", lattice[None])
+            self.keyframes += 1
+            self._since_keyframe = 1
+        else:
+            self._append("delta_index", changed)
+            self._append("delta_id", lattice.ravel()[changed])
+            self._since_keyframe += 1
+
+        self._append("mcs", np.array([mcs]))
+        self._append("keyframe", np.array([keyframe]))
+        self._append("keyframe_index", np.array([self.keyframes - 1]))
+        self._append("delta_offset", np.array([self.deltas]))
+        self.deltas += 0 if keyframe else len(changed)
+        self.frames += 1
+        self._previous = lattice
+
+    def finish(self):
+        if not self.file:
+            return
+
+        if self.writer is not None:
+            self.writer.close()
+        self.file.close()
+
+    def on_stop(self):
+        self.finish()
+
+    def gather_lattice(self) -> np.ndarray:
+        """
+        Gather the cell ID of every pixel from the current simulation.
+
+        Returns
+        -------
+        np.ndarray
+            The cell IDs of shape `(x, y)` (2D) or `(x, y, z)` (3D), with 0 for
+            the medium.
+        """
+        if self.snapshot is not None:
+            return self.snapshot.update(self.simulator.getStep())
+        return read_cell_field(self, self.shape)
+
+    def state_dict(self) -> dict:
+        # frames still queued are written such that the checkpoint matches the file
+        if self.writer is not None:
+            self.writer.flush()
+        return {
+            "rows": self.frames,
+            "keyframes": self.keyframes,
+            "deltas": self.deltas,
+            "next_sample": -1 if self._next_sample is None else self._next_sample,
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        self._restored_state = state
+
+    def build(self) -> list[ElementCC3D]:
+        pixel_tracker_plugin = ElementCC3D("Plugin", {"Name": "PixelTracker"})
+        return [pixel_tracker_plugin]
+
+    def _append(self, name: str, data: np.ndarray) -> None:
+        if self.writer is None:
+            append_to_dataset(self.file[name], data)
+        else:
+            self.writer.submit(self.file[name], data)
+
+
+def iter_lattice(
+    filename: Path | str, start: int = 0, stop: int | None = None
+) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Iterate over the frames written by a `LatticeWriter`.
+
+    Only the keyframe preceding `start` is read in full; all further frames are
+    reconstructed by applying the changed pixels to the previous frame.
+
+    Parameters
+    ----------
+    filename : Path | str
+        The HDF5 file written by the writer.
+    start : int
+        The index of the first frame.
+    stop : int | None
+        The index after the last frame, or None to read until the end.
+
+    Yields
+    ------
+    tuple[int, np.ndarray]
+        The MCS and the cell IDs of each frame. The array is reused between
+        frames, so copy it to keep it.
+    """
+    with h5py.File(filename, "r") as file:
+        n_frames = len(file["mcs"])
+        stop = n_frames if stop is None else min(stop, n_frames)
+        if start >= stop:
+            return
+
+        mcs = file["mcs"][:stop]
+        keyframe = file["keyframe"][:stop]
+        keyframe_index = file["keyframe_index"][:stop]
+        # the changed pixels of a frame end where those of the next frame start
+        offsets = np.append(file["delta_offset"][:], len(file["delta_index"]))
+
+        first = int(np.flatnonzero(keyframe[: start + 1])[-1])
+        lattice = np.empty(0, dtype=np.int32)
+        for frame in range(first, stop):
+            if keyframe[frame]:
+                lattice = file["keyframes"][keyframe_index[frame]]
+            else:
+                changed = slice(offsets[frame], offsets[frame + 1])
+                lattice.ravel()[file["delta_index"][changed]] = file["delta_id"][
+                    changed
+                ]
+            if frame >= start:
+                yield int(mcs[frame]), lattice
+
+
+def read_lattice(filename: Path | str, frame: int) -> np.ndarray:
+    """
+    Read a frame written by a `LatticeWriter`.
+
+    Parameters
+    ----------
+    filename : Path | str
+        The HDF5 file written by the writer.
+    frame : int
+        The index of the frame; negative values count from the end.
+
+    Returns
+    -------
+    np.ndarray
+        The cell IDs of shape `(x, y)` (2D) or `(x, y, z)` (3D).
+    """
+    with h5py.File(filename, "r") as file:
+        frame = range(len(file["mcs"]))[frame]
+    for _, lattice in iter_lattice(filename, frame, frame + 1):
+        return lattice
+    raise IndexError(f"Frame {frame} is not in {filename}.")
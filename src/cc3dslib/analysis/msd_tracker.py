@@ -0,0 +1,267 @@
+"""Steppable to accumulate the mean squared displacement of compartments online."""
+
+from pathlib import Path
+
+import h5py
+import numpy as np
+from cc3d.core.PySteppables import SteppableBasePy
+from cc3d.core.XMLUtils import ElementCC3D
+from cc3d.cpp.CompuCell import CellG
+
+from cc3dslib.analysis.compartment_coms import CompartmentCOMs
+from cc3dslib.filter import Filter
+from cc3dslib.simulation.element import Element
+from cc3dslib.snapshot import CellSnapshot
+
+
+class MultiTauCorrelator:
+    """Multiple-tau correlator of positions and velocities.
+
+    Level `l` keeps the last `block_size` samples taken every `2**l` samples. When
+    a sample is added to a level, its displacement to and the product of its
+    velocity with each stored sample are accumulated for the lags `k * 2**l`, with
+    `k` from `block_size // 2` to `block_size - 1` (from 0 on level 0). New levels
+    are added as the number of samples grows, so the memory usage is
+    `O(n * block_size * log(samples))`. As the samples of higher levels are taken,
+    not averaged, the mean squared displacement and the velocity autocorrelation
+    are exact at each lag, but averaged over fewer time origins for longer lags.
+    """
+
+    def __init__(self, n: int, dims: int, block_size: int = 16):
+        if block_size < 2 or block_size % 2:
+            raise ValueError("block_size must be an even number of at least 2.")
+
+        self.n = n
+        self.dims = dims
+        self.block_size = block_size
+        self.samples = 0
+
+        self.positions: list[np.ndarray] = []
+        self.velocities: list[np.ndarray] = []
+        self.filled: list[int] = []
+        self._first = (np.zeros((n, dims)), np.zeros((n, dims)))
+
+        self.msd_sum = np.zeros(0)
+        self.vacf_sum = np.zeros(0)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def lags(self) -> np.ndarray:
+        """Return the lags of the accumulated correlations in samples."""
+        half = self.block_size // 2
+        lags = [np.arange(self.block_size)]
+        for level in range(1, len(self.positions)):
+            lags.append(np.arange(half, self.block_size) * 2**level)
+        return np.concatenate(lags)
+
+    def add(self, position: np.ndarray, velocity: np.ndarray) -> None:
+        """
+        Add the next sample.
+
+        Parameters
+        ----------
+        position : np.ndarray
+            The unwrapped positions, shape `(n, dims)`.
+        velocity : np.ndarray
+            The velocities, shape `(n, dims)`.
+        """
+        if self.samples == 0:
+            self._first = (position.copy(), velocity.copy())
+
+        level = 0
+        while True:
+            if level == len(self.positions):
+                # the first sample belongs to every level
+                self._add_level()
+                if self.samples > 0:
+                    self._add_to_level(level, *self._first)
+            self._add_to_level(level, position, velocity)
+
+            level += 1
+            if self.samples == 0 or self.samples % 2**level:
+                break
+
+        self.samples += 1
+
+    def msd(self) -> np.ndarray:
+        """Return the mean squared displacement at each lag (NaN without data)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.msd_sum / self.counts
+
+    def vacf(self) -> np.ndarray:
+        """Return the velocity autocorrelation at each lag (NaN without data)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.vacf_sum / self.counts
+
+    def state_dict(self) -> dict:
+        return {
+            "samples": self.samples,
+            "positions": np.array(self.positions).reshape(
+                -1, self.block_size, self.n, self.dims
+            ),
+            "velocities": np.array(self.velocities).reshape(
+                -1, self.block_size, self.n, self.dims
+            ),
+            "filled": np.array(self.filled, dtype=np.int64),
+            "first_position": self._first[0],
+            "first_velocity": self._first[1],
+            "msd_sum": self.msd_sum,
+            "vacf_sum": self.vacf_sum,
+            "counts": self.counts,
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        self.samples = int(state["samples"])
+        self.positions = list(np.array(state["positions"], dtype=float))
+        self.velocities = list(np.array(state["velocities"], dtype=float))
+        self.filled = [int(filled) for filled in state["filled"]]
+        self._first = (
+            np.array(state["first_position"], dtype=float),
+            np.array(state["first_velocity"], dtype=float),
+        )
+        self.msd_sum = np.array(state["msd_sum"], dtype=float)
+        self.vacf_sum = np.array(state["vacf_sum"], dtype=float)
+        self.counts = np.array(state["counts"], dtype=np.int64)
+
+    def _add_level(self) -> None:
+        shape = (self.block_size, self.n, self.dims)
+        self.positions.append(np.zeros(shape))
+        self.velocities.append(np.zeros(shape))
+        self.filled.append(0)
+
+        n_lags = self.block_size if len(self.positions) == 1 else self.block_size // 2
+        self.msd_sum = np.append(self.msd_sum, np.zeros(n_lags))
+        self.vacf_sum = np.append(self.vacf_sum, np.zeros(n_lags))
+        self.counts = np.append(self.counts, np.zeros(n_lags, dtype=np.int64))
+
+    def _add_to_level(
+        self, level: int, position: np.ndarray, velocity: np.ndarray
+    ) -> None:
+        # the sample taken k samples (of this level) ago is stored at index -k
+        positions = np.roll(self.positions[level], 1, axis=0)
+        velocities = np.roll(self.velocities[level], 1, axis=0)
+        positions[0] = position
+        velocities[0] = velocity
+        self.positions[level] = positions
+        self.velocities[level] = velocities
+        self.filled[level] = min(self.filled[level] + 1, self.block_size)
+
+        half = self.block_size // 2
+        first_lag = 0 if level == 0 else half
+        offset = 0 if level == 0 else self.block_size + (level - 1) * half
+        lags = np.arange(first_lag, self.filled[level])
+        if len(lags) == 0:
+            return
+
+        delta = positions[0] - positions[lags]
+        index = offset + lags - first_lag
+        self.msd_sum[index] += np.einsum("knd,knd->k", delta, delta)
+        self.vacf_sum[index] += np.einsum("nd,knd->k", velocities[0], velocities[lags])
+        self.counts[index] += self.n
+
+
+class MSDTracker(SteppableBasePy, Element):
+    """Steppable to accumulate the MSD and VACF of compartments online.
+
+    The unwrapped centre of mass of each compartment returned by the filter is
+    sampled every `frequency` MCS and passed to a `MultiTauCorrelator`, which
+    accumulates the mean squared displacement and the velocity autocorrelation,
+    averaged over compartments and time origins, at log-spaced lags. The velocity
+    is the displacement between two samples divided by `frequency`. Instead of
+    the full trajectory, only the averaged curves are written to `filename` at the
+    end of the simulation, with the datasets `lag` (in MCS), `msd`, `vacf` and
+    `count` (number of accumulated products per lag). The correlator can be saved
+    by a `Checkpointer`.
+    """
+
+    def __init__(
+        self,
+        filename: Path | str,
+        filter: Filter[list[CellG]],
+        dims: int = 2,
+        frequency=1,
+        block_size: int = 16,
+        snapshot: CellSnapshot | None = None,
+    ):
+        super().__init__(frequency)
+
+        self.filename = filename
+        self.dims = dims
+        self.block_size = block_size
+        self.snapshot = snapshot
+        self.compartment_coms = CompartmentCOMs(filter, dims, snapshot)
+        self.correlator: MultiTauCorrelator | None = None
+        self.last_position: np.ndarray | None = None
+        self._written = False
+        self._restored_state: dict | None = None
+
+    def start(self):
+        box_coords = self.get_box_coordinates()[1]
+        coms = self.compartment_coms.start(
+            np.array([box_coords.x, box_coords.y, box_coords.z])
+        )
+
+        n = self.compartment_coms.n_compartments
+        self.correlator = MultiTauCorrelator(n, self.dims, self.block_size)
+        self.last_position = coms[:, : self.dims]
+        self._written = False
+
+        state, self._restored_state = self._restored_state, None
+        if state is not None:
+            self.compartment_coms.last_coms = np.array(state["last_coms"], dtype=float)
+            self.last_position = np.array(state["last_position"], dtype=float)
+            self.correlator.load_state_dict(
+                {
+                    key.removeprefix("correlator_"): value
+                    for key, value in state.items()
+                    if key.startswith("correlator_")
+                }
+            )
+
+    def step(self, mcs: int):
+        if self.correlator is None or self.last_position is None:
+            return
+        if self.snapshot is not None:
+            self.snapshot.update(mcs)
+
+        position = self.compartment_coms.update()[:, : self.dims]
+        velocity = (position - self.last_position) / self.frequency
+        self.correlator.add(position, velocity)
+        self.last_position = position
+
+    def finish(self):
+        if self._written or self.correlator is None:
+            return
+
+        self._written = True
+        # lags of the last level may not have been reached yet
+        reached = self.correlator.counts > 0
+        with h5py.File(self.filename, "w") as file:
+            file.create_dataset(
+                "lag", data=self.correlator.lags[reached] * self.frequency
+            )
+            file.create_dataset("msd", data=self.correlator.msd()[reached])
+            file.create_dataset("vacf", data=self.correlator.vacf()[reached])
+            file.create_dataset("count", data=self.correlator.counts[reached])
+            file.attrs["samples"] = self.correlator.samples
+            file.attrs["n_compartments"] = self.correlator.n
+
+    def on_stop(self):
+        self.finish()
+
+    def state_dict(self) -> dict:
+        assert self.correlator is not None
+        state = {
+            "last_coms": self.compartment_coms.last_coms,
+            "last_position": self.last_position,
+        }
+        for key, value in self.correlator.state_dict().items():
+            state[f"correlator_{key}"] = value
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        self._restored_state = state
+
+    def build(self) -> list[ElementCC3D]:
+        com_plugin = ElementCC3D("Plugin", {"Name": "CenterOfMass"})
+        return [com_plugin]
@@ -0,0 +1,229 @@
+"""Steppable to track the collective order of compartments online."""
+
+from collections import deque
+from pathlib import Path
+
+import h5py
+import numpy as np
+from cc3d.core.PySteppables import SteppableBasePy
+from cc3d.core.XMLUtils import ElementCC3D
+from cc3d.cpp.CompuCell import CellG
+
+from cc3dslib.analysis.compartment_coms import CompartmentCOMs
+from cc3dslib.analysis.h5_writer import ChunkedDatasetWriter
+from cc3dslib.analysis.schedule import Schedule
+from cc3dslib.filter import Filter
+from cc3dslib.simulation.element import Element
+from cc3dslib.snapshot import CellSnapshot
+
+
+def order_parameters(vectors: np.ndarray) -> tuple[float, float]:
+    """
+    Compute the polar and nematic order parameter of a set of directions.
+
+    The polar order is the length of the mean unit vector. The nematic order is
+    the largest eigenvalue of the order tensor `(d <u u> - I) / (d - 1)` in `d`
+    dimensions, which is `|<exp(2i theta)>|` in 2D. Both are 1 for perfectly
+    aligned and close to 0 for random directions. Vectors of zero length are
+    ignored.
+
+    Parameters
+    ----------
+    vectors : np.ndarray
+        The vectors of shape `(n, dims)`; only their directions are used.
+
+    Returns
+    -------
+    tuple[float, float]
+        The polar and the nematic order parameter, or NaN if there is no vector
+        of non-zero length.
+    """
+    norms = np.linalg.norm(vectors, axis=1)
+    valid = norms > 0
+    if not valid.any():
+        return np.nan, np.nan
+
+    units = vectors[valid] / norms[valid, None]
+    dims = units.shape[1]
+    polar = np.linalg.norm(units.mean(axis=0))
+    tensor = (dims * units.T @ units / len(units) - np.eye(dims)) / (dims - 1)
+    nematic = np.linalg.eigvalsh(tensor)[-1]
+    return float(polar), float(nematic)
+
+
+class OrderTracker(SteppableBasePy, Element):
+    """Steppable to track the polar and nematic order and the mean speed online.
+
+    The unwrapped centre of mass of each compartment returned by the filter is
+    updated every time the steppable runs, and the last `window + 1` positions are
+    kept. At each sample, the displacement of every compartment over the window
+    (or since the start, while the window is not full yet) gives its velocity.
+    The following scalar time series are written to `filename`:
+
+    - `mcs`: The MCS of each sample
+    - `polar_order`, `nematic_order`: Order parameters of the velocities (see
+      `order_parameters`)
+    - `mean_speed`: The mean length of the velocities in pixels per MCS
+    - `heading_polar_order`, `heading_nematic_order`: Order parameters of the
+      `angles` of the given swimmer (only if a swimmer is given)
+
+    Samples are recorded every time the steppable runs or, with a `Schedule`, at
+    the first step at or after each scheduled MCS. If a `CellSnapshot` is given,
+    positions and volumes are read from the snapshot instead of the cells.
+
+    The tracker can be saved by a `Checkpointer`. On restart, it appends to the
+    existing file from the row of the checkpoint.
+    """
+
+    def __init__(
+        self,
+        filename: Path | str,
+        filter: Filter[list[CellG]],
+        swimmer: SteppableBasePy | None = None,
+        dims: int = 2,
+        window: int = 1,
+        chunk_size=1000,
+        frequency=1,
+        schedule: Schedule | None = None,
+        snapshot: CellSnapshot | None = None,
+    ):
+        super().__init__(frequency)
+
+        if window < 1:
+            raise ValueError("window must be at least 1.")
+
+        self.filename = filename
+        self.swimmer = swimmer
+        self.dims = dims
+        self.window = window
+        self.chunk_size = chunk_size
+        self.schedule = schedule
+        self.snapshot = snapshot
+        self.compartment_coms = CompartmentCOMs(filter, dims, snapshot)
+
+        self.history: deque[tuple[int, np.ndarray]] = deque(maxlen=window + 1)
+        self._next_sample: int | None = 0
+        self._restored_state: dict | None = None
+
+    @property
+    def series(self) -> list[str]:
+        """Return the names of the written time series."""
+        names = ["mcs", "polar_order", "nematic_order", "mean_speed"]
+        if self.swimmer is not None:
+            names += ["heading_polar_order", "heading_nematic_order"]
+        return names
+
+    def start(self):
+        state, self._restored_state = self._restored_state, None
+        self.file = h5py.File(self.filename, "w" if state is None else "a")
+
+        box_coords = self.get_box_coordinates()[1]
+        coms = self.compartment_coms.start(
+            np.array([box_coords.x, box_coords.y, box_coords.z])
+        )
+        self.history.clear()
+
+        if state is None:
+            self.file.attrs["window"] = self.window
+            self.file.attrs["n_compartments"] = self.compartment_coms.n_compartments
+            for name in self.series:
+                self.file.create_dataset(
+                    name, (0,), maxshape=(None,), dtype="i8" if name == "mcs" else "f"
+                )
+        else:
+            # drop the rows written after the checkpoint and append from there
+            for name in self.series:
+                self.file[name].resize(int(state["rows"]), axis=0)
+            self.compartment_coms.last_coms = np.array(state["last_coms"], dtype=float)
+            coms = None
+            for mcs, positions in zip(state["history_mcs"], state["history"]):
+                self.history.append((int(mcs), np.array(positions, dtype=float)))
+
+        self.writers = {
+            name: ChunkedDatasetWriter(self.file[name], self.chunk_size)
+            for name in self.series
+        }
+        if coms is not None:
+            self.history.append((self.simulator.getStep(), coms[:, : self.dims]))
+
+        self._next_sample = self.schedule.next(0) if self.schedule is not None else 0
+        if state is not None and "next_sample" in state:
+            next_sample = int(state["next_sample"])
+            self._next_sample = next_sample if next_sample >= 0 else None
+
+    def step(self, mcs: int):
+        if self.snapshot is not None:
+            self.snapshot.update(mcs)
+
+        positions = self.compartment_coms.update()[:, : self.dims]
+        self.history.append((mcs, positions))
+        if self.schedule is not None:
+            if self._next_sample is None or mcs < self._next_sample:
+                return
+            self._next_sample = self.schedule.next(mcs + 1)
+
+        for name, value in self.sample().items():
+            self.writers[name].append(value)
+
+    def sample(self) -> dict[str, float]:
+        """
+        Compute the order parameters from the current state.
+
+        Returns
+        -------
+        dict[str, float]
+            The value of each time series in `series`.
+        """
+        mcs, positions = self.history[-1]
+        first_mcs, first_positions = self.history[0]
+        values = {"mcs": mcs}
+
+        if mcs > first_mcs:
+            velocities = (positions - first_positions) / (mcs - first_mcs)
+            values["polar_order"], values["nematic_order"] = order_parameters(
+                velocities
+            )
+            values["mean_speed"] = float(np.linalg.norm(velocities, axis=1).mean())
+        else:
+            values["polar_order"] = values["nematic_order"] = np.nan
+            values["mean_speed"] = np.nan
+
+        if self.swimmer is not None:
+            angles = np.asarray(self.swimmer.angles)
+            headings = np.stack((np.cos(angles), np.sin(angles)), axis=1)
+            polar, nematic = order_parameters(headings)
+            values["heading_polar_order"] = polar
+            values["heading_nematic_order"] = nematic
+
+        return values
+
+    def finish(self):
+        if not self.file:
+            return
+
+        for writer in self.writers.values():
+            writer.flush()
+        self.file.close()
+
+    def on_stop(self):
+        self.finish()
+
+    def state_dict(self) -> dict:
+        # rows still buffered in memory are written such that the checkpoint
+        # matches the file
+        for writer in self.writers.values():
+            writer.flush()
+        return {
+            "last_coms": self.compartment_coms.last_coms,
+            "history_mcs": np.array([mcs for mcs, _ in self.history], dtype=np.int64),
+            "history": np.array([positions for _, positions in self.history]),
+            "rows": len(self.file["mcs"]),
+            "next_sample": -1 if self._next_sample is None else self._next_sample,
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        self._restored_state = state
+
+    def build(self) -> list[ElementCC3D]:
+        com_plugin = ElementCC3D("Plugin", {"Name": "CenterOfMass"})
+        return [com_plugin]
@@ -0,0 +1,117 @@
+"""Schedules deciding at which MCS a tracker records a sample."""
+
+import math
+from abc import ABC, abstractmethod
+from typing import Sequence
+
+import numpy as np
+
+
+class Schedule(ABC):
+    """Base class of sampling schedules.
+
+    A schedule is a strictly increasing sequence of MCS. Subclasses implement
+    `next`, which returns the first MCS of the sequence at or after a given MCS.
+    """
+
+    @abstractmethod
+    def next(self, mcs: int) -> int | None:
+        """Return the first sampled MCS at or after `mcs`, or None if there is
+        none."""
+
+    def __call__(self, mcs: int) -> bool:
+        """Return whether `mcs` is sampled."""
+        return self.next(mcs) == mcs
+
+    def sample_times(self, until: int) -> np.ndarray:
+        """Return all sampled MCS before `until`."""
+        times = []
+        mcs = self.next(0)
+        while mcs is not None and mcs < until:
+            times.append(mcs)
+            mcs = self.next(mcs + 1)
+        return np.array(times, dtype=np.int64)
+
+
+class LinearSchedule(Schedule):
+    """Sample every `every` MCS, starting at `start`."""
+
+    def __init__(self, every: int = 1, start: int = 0):
+        if every < 1:
+            raise ValueError("every must be at least 1.")
+        self.every = every
+        self.start = start
+
+    def next(self, mcs: int) -> int | None:
+        if mcs <= self.start:
+            return self.start
+        return self.start + -(-(mcs - self.start) // self.every) * self.every
+
+
+class LogSchedule(Schedule):
+    """Sample at logarithmically spaced MCS.
+
+    The sampled MCS are `round(start * 10**(k / per_decade))` for `k = 0, 1, ...`
+    preceded by MCS 0 if `include_zero` is set. Duplicates due to rounding at
+    early times are skipped.
+    """
+
+    def __init__(self, per_decade: int = 10, start: int = 1, include_zero=True):
+        if per_decade < 1 or start < 1:
+            raise ValueError("per_decade and start must be at least 1.")
+        self.per_decade = per_decade
+        self.start = start
+        self.include_zero = include_zero
+
+    def _point(self, k: int) -> int:
+        return round(self.start * 10 ** (k / self.per_decade))
+
+    def next(self, mcs: int) -> int | None:
+        if mcs <= 0 and self.include_zero:
+            return 0
+        if mcs <= self.start:
+            return self.start
+
+        # start slightly below the solution to be robust against rounding
+        k = max(math.floor(self.per_decade * math.log10(mcs / self.start)) - 1, 0)
+        while self._point(k) < mcs:
+            k += 1
+        return self._point(k)
+
+
+class MultiResolutionSchedule(Schedule):
+    """Sample with a different interval in consecutive ranges of MCS.
+
+    `stages` is a list of `(until, every)` pairs: sample every `every` MCS until
+    (excluding) `until`, then continue with the next stage. The last stage may use
+    `None` as `until` to sample until the end of the simulation. For example,
+    `[(1_000, 1), (100_000, 100), (None, 10_000)]` samples densely early on and
+    sparsely later.
+    """
+
+    def __init__(self, stages: Sequence[tuple[int | None, int]]):
+        self.stages = [LinearSchedule(every, 0) for _, every in stages]
+        bounds = [until if until is not None else math.inf for until, _ in stages]
+        self.bounds = [0] + bounds
+        for stage, lower in zip(self.stages, self.bounds):
+            stage.start = lower
+
+    def next(self, mcs: int) -> int | None:
+        for stage, upper in zip(self.stages, self.bounds[1:]):
+            if mcs >= upper:
+                continue
+            candidate = stage.next(mcs)
+            if candidate is not None and candidate < upper:
+                return candidate
+        return None
+
+
+class ExplicitSchedule(Schedule):
+    """Sample at an explicit list of MCS."""
+
+    def __init__(self, mcs: Sequence[int] | np.ndarray):
+        self.mcs = np.unique(np.asarray(mcs, dtype=np.int64))
+
+    def next(self, mcs: int) -> int | None:
+        index = np.searchsorted(self.mcs, mcs)
+        return int(self.mcs[index]) if index < len(self.mcs) else None
@@ -0,0 +1,276 @@
+"""Lazy readers of the trajectories written by the trackers."""
+
+from pathlib import Path
+from typing import Iterator
+
+import h5py
+import numpy as np
+
+from cc3dslib.periodic import minimum_image
+
+
+class Trajectory:
+    """Read a `COMTracker` or `DistanceTracker` file block by block.
+
+    The trajectory, of shape `(n_frames, n_particles, dims)`, is never loaded as a
+    whole. Indexing reads only the selected part from disk, and `iter_frames` and
+    `iter_particles` iterate over blocks of frames or particles that are aligned
+    with the chunks of the dataset, such that every chunk is read once per pass.
+
+    If the dataset is stored contiguously and uncompressed (see `repack`), it is
+    memory-mapped, and indexing as well as the blocks returned without unwrapping
+    are views into the file instead of copies.
+
+    With `unwrap`, the blocks are continuous trajectories: positions written with
+    a `wrap_box` are unwrapped on the fly by the minimum image of the
+    displacement between frames, and the displacements of a `DistanceTracker` are
+    summed to the displacement from the first frame. Positions that have not been
+    wrapped are returned unchanged.
+
+    Files written with `dynamic=True` contain an `ids` dataset with the ID in each
+    column per frame. When unwrapping such files, a column starts a new trajectory
+    wherever its ID changes or after a NaN entry (an unused column, or the first
+    frame of a new cell in a `DistanceTracker` file), such that trajectories of
+    different IDs are never joined. The displacements of a new cell are summed from
+    its first frame.
+    """
+
+    def __init__(
+        self,
+        filename: Path | str,
+        dataset: str | None = None,
+        memmap: bool = True,
+    ):
+        self.filename = filename
+        self.file = h5py.File(filename, "r")
+        if dataset is None:
+            dataset = "com" if "com" in self.file else "floats"
+
+        self.dataset: h5py.Dataset = self.file[dataset]
+        self.displacements = dataset == "floats"
+        wrap_box = self.file.attrs.get("wrap_box")
+        self.wrap_box = None if wrap_box is None else np.asarray(wrap_box, dtype=float)
+        self.memmap = _memmap(filename, self.dataset) if memmap else None
+        self.ids: h5py.Dataset | None = self.file["ids"] if "ids" in self.file else None
+
+    def __enter__(self) -> "Trajectory":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.n_frames
+
+    def __getitem__(self, key) -> np.ndarray:
+        return self.data[key]
+
+    @property
+    def data(self) -> h5py.Dataset | np.memmap:
+        """Return the memory-mapped dataset if available, else the HDF5 dataset."""
+        return self.memmap if self.memmap is not None else self.dataset
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self.dataset.shape
+
+    @property
+    def n_frames(self) -> int:
+        return self.shape[0]
+
+    @property
+    def n_particles(self) -> int:
+        return self.shape[1]
+
+    @property
+    def dims(self) -> int:
+        return self.shape[2]
+
+    @property
+    def chunks(self) -> tuple[int, ...]:
+        """Return the chunk shape, or the full shape for contiguous datasets."""
+        return self.dataset.chunks or tuple(max(size, 1) for size in self.shape)
+
+    @property
+    def mcs(self) -> np.ndarray:
+        """Return the MCS of each frame, or the frame indices if not recorded."""
+        if "mcs" in self.file:
+            return self.file["mcs"][:]
+        return np.arange(self.n_frames)
+
+    def iter_frames(
+        self, block: int | None = None, unwrap: bool = False
+    ) -> Iterator[tuple[slice, np.ndarray]]:
+        """
+        Iterate over blocks of consecutive frames.
+
+        Parameters
+        ----------
+        block : int | None
+            The number of frames per block, rounded up to a multiple of the chunk
+            length along the time axis. Defaults to one chunk.
+        unwrap : bool
+            Whether to return continuous trajectories (see class docstring).
+
+        Yields
+        ------
+        tuple[slice, np.ndarray]
+            The frames of the block and their data of shape
+            `(block, n_particles, dims)`.
+        """
+        block = _aligned(block, self.chunks[0])
+        previous = previous_ids = None
+        for start in range(0, self.n_frames, block):
+            frames = slice(start, min(start + block, self.n_frames))
+            data = self.data[frames]
+            if unwrap:
+                ids = None if self.ids is None else self.ids[frames]
+                data = self._unwrap(data, ids, previous, previous_ids)
+                previous = data[-1]
+                previous_ids = None if ids is None else ids[-1]
+            yield frames, data
+
+    def iter_particles(
+        self, block: int | None = None, unwrap: bool = False
+    ) -> Iterator[tuple[slice, np.ndarray]]:
+        """
+        Iterate over the full trajectories of blocks of particles.
+
+        Parameters
+        ----------
+        block : int | None
+            The number of particles per block, rounded up to a multiple of the
+            chunk length along the particle axis. Defaults to one chunk.
+        unwrap : bool
+            Whether to return continuous trajectories (see class docstring).
+
+        Yields
+        ------
+        tuple[slice, np.ndarray]
+            The particles of the block and their data of shape
+            `(n_frames, block, dims)`.
+        """
+        block = _aligned(block, self.chunks[1])
+        for start in range(0, self.n_particles, block):
+            particles = slice(start, min(start + block, self.n_particles))
+            data = self.data[:, particles]
+            if unwrap:
+                ids = None if self.ids is None else self.ids[:, particles]
+                data = self._unwrap(data, ids, None, None)
+            yield particles, data
+
+    def close(self) -> None:
+        self.memmap = None
+        self.file.close()
+
+    def _unwrap(
+        self,
+        data: np.ndarray,
+        ids: np.ndarray | None,
+        previous: np.ndarray | None,
+        previous_ids: np.ndarray | None,
+    ) -> np.ndarray:
+        """
+        Make a block of frames continuous.
+
+        Parameters
+        ----------
+        data : np.ndarray
+            The block as stored in the file.
+        ids : np.ndarray | None
+            The IDs of the block of shape `(block, n_particles)`, if recorded.
+        previous : np.ndarray | None
+            The last continuous frame of the preceding block, if any.
+        previous_ids : np.ndarray | None
+            The IDs of the last frame of the preceding block, if recorded.
+
+        Returns
+        -------
+        np.ndarray
+            The continuous block.
+        """
+        data = np.asarray(data, dtype=float)
+        if (not self.displacements and self.wrap_box is None) or len(data) == 0:
+            return data
+
+        if previous is not None:
+            # the preceding frame starts the trajectories continued by this block
+            data = np.concatenate((previous[None], data))
+            if ids is not None and previous_ids is not None:
+                ids = np.concatenate((previous_ids[None], ids))
+
+        if self.displacements:
+            steps = data.copy()
+        else:
+            # wrapped and unwrapped positions differ by multiples of the box size,
+            # so the minimum image of the difference to the previous frame is
+            # unaffected
+            steps = minimum_image(
+                np.diff(data, axis=0, prepend=data[:1]), self.wrap_box
+            )
+
+        # a trajectory starts at the first frame, after a NaN entry and wherever
+        # the ID of the column changes
+        starts = np.zeros(data.shape[:2], dtype=bool)
+        starts[0] = True
+        starts[1:] = np.isnan(data[:-1, :, 0])
+        if ids is not None and len(ids) == len(data):
+            starts[1:] |= ids[1:] != ids[:-1]
+        steps[starts] = data[starts]
+
+        # cumulative sum restarting at the first frame of every trajectory
+        totals = np.cumsum(np.nan_to_num(steps), axis=0)
+        frames = np.arange(len(data))[:, None]
+        first = np.maximum.accumulate(np.where(starts, frames, 0), axis=0)
+        offsets = np.take_along_axis(totals - steps, first[..., None], axis=0)
+        positions = totals - np.nan_to_num(offsets)
+        positions[np.isnan(data)] = np.nan
+        return positions if previous is None else positions[1:]
+
+
+def repack(filename: Path | str, output: Path | str, block: int | None = None) -> None:
+    """
+    Copy a tracker file to a contiguous, uncompressed layout.
+
+    Contiguous datasets can be memory-mapped by `Trajectory`. The data is copied
+    in blocks of frames, such that the file is never loaded as a whole.
+
+    Parameters
+    ----------
+    filename : Path | str
+        The file written by a tracker.
+    output : Path | str
+        The file to create.
+    block : int | None
+        The number of frames copied at once, rounded up to a multiple of the chunk
+        length along the first axis. Defaults to one chunk.
+    """
+    with h5py.File(filename, "r") as source, h5py.File(output, "w") as target:
+        target.attrs.update(source.attrs)
+        for name, dataset in source.items():
+            copy = target.create_dataset(name, dataset.shape, dtype=dataset.dtype)
+            copy.attrs.update(dataset.attrs)
+            chunk = dataset.chunks[0] if dataset.chunks else max(len(dataset), 1)
+            step = _aligned(block, chunk)
+            for start in range(0, len(dataset), step):
+                copy[start : start + step] = dataset[start : start + step]
+
+
+def _aligned(block: int | None, chunk: int) -> int:
+    """Round a block length up to a multiple of the chunk length."""
+    if block is None:
+        return chunk
+    return max(-(-block // chunk), 1) * chunk
+
+
+def _memmap(filename: Path | str, dataset: h5py.Dataset) -> np.memmap | None:
+    """Memory-map a dataset if it is stored contiguously and uncompressed."""
+    if dataset.chunks is not None or dataset.compression is not None:
+        return None
+
+    offset = dataset.id.get_offset()
+    if offset is None or dataset.size == 0:
+        return None
+    return np.memmap(
+        filename, dtype=dataset.dtype, mode="r", offset=offset, shape=dataset.shape
+    )
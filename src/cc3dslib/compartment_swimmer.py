@@ -1,10 +1,14 @@
 """Steppable for active swimmer cells in the Simulation."""
 
 from dataclasses import dataclass
-from cc3d.cpp.CompuCell import CellG
 from cc3dslib.filter import Filter
 from cc3dslib.simulation import Element
 from cc3dslib.active_swimmer import ActiveSwimmerParams
+from cc3dslib.analysis.compartment_coms import DynamicCompartmentCOMs
+from cc3dslib.noise import NoiseStream
+from cc3dslib.periodic import minimum_image, unwrap
+from cc3dslib.ragged import Ragged
+from cc3dslib.snapshot import CellSnapshot
 
 from cc3d.core.PySteppables import SteppableBasePy
 from cc3d.core.XMLUtils import ElementCC3D
@@ -13,38 +17,108 @@ import numpy as np
 
 
 class CompartmentSwimmer(SteppableBasePy, Element):
-    def __init__(self, params: ActiveSwimmerParams, k: float = 0.1, frequency=1):
+    """Propel compartments along a rotationally diffusing direction.
+
+    The cells of each compartment returned by the filter are pushed along the
+    direction of the compartment, except for the nuclei (cell type 2), which are
+    pulled towards the unwrapped centre of mass of their compartment by a spring
+    of stiffness `k` relative to the force magnitude.
+
+    With `params.dynamic`, compartments may appear and disappear during the
+    simulation. Their centres of mass are then tracked by a
+    `DynamicCompartmentCOMs`, and the direction of each compartment is kept in
+    the slot of `angles` assigned to its cluster ID. New compartments start in a
+    random direction.
+    """
+
+    def __init__(
+        self,
+        params: ActiveSwimmerParams,
+        k: float = 0.1,
+        frequency=1,
+        snapshot: CellSnapshot | None = None,
+    ):
         super().__init__(frequency)
 
         self.params = params
         self.angles: np.ndarray | None = None
+        self.noise: NoiseStream | None = None
         self.coms: np.ndarray | None = None
         self.last_coms: np.ndarray | None = None
-        self.max_compartment_size = 0
+        self.cells = Ragged.from_sizes([])
+        self.engine = DynamicCompartmentCOMs(params.filter, 2, snapshot)
+        self._slots = np.empty(0, dtype=np.int64)
 
         self.box_size = None
         self.k = k
+        self.snapshot = snapshot
+        self._restored_state: dict | None = None
 
     def start(self):
-        n_cells = len(list(self.params.filter()))
-        self.angles = np.random.random(size=n_cells) * 2 * np.pi
-
-        self.max_compartment_size = 0
-        for cells in self.params.filter():
-            self.max_compartment_size = max(self.max_compartment_size, len(cells))
-
-        self.coms = np.zeros((n_cells, 3))
-        self.last_coms = np.zeros((n_cells, self.max_compartment_size, 3))
-        for i, cells in enumerate(self.params.filter()):
-            # cells = [c for c in cells_raw if c.type == 1]
-            self.last_coms[i, : len(cells), :] = np.array(
-                [self._get_com(cell) for cell in cells]
-            )
+        compartments = list(self.params.filter())
+        n_cells = len(compartments)
+        self.noise = NoiseStream(
+            n_cells, self.params.noise_block_steps, self.params.seed
+        )
+        self.angles = self.noise.rng.random(size=n_cells) * 2 * np.pi
 
         box_coords = self.get_box_coordinates()[1]
         self.box_size = np.array([box_coords.x, box_coords.y, box_coords.z])
 
+        if self.params.dynamic:
+            self._start_dynamic(compartments)
+        else:
+            self._start_static(compartments)
+
+        if self._restored_state is not None:
+            # continue from the unwrapped positions of the previous run
+            self.angles = np.array(self._restored_state["angles"], dtype=float)
+            if self.params.dynamic:
+                self.engine.load_state_dict(self._restored_state)
+                self.noise.resize(len(self.angles))
+            else:
+                self.coms = np.array(self._restored_state["coms"], dtype=float)
+                self.last_coms = np.array(
+                    self._restored_state["last_coms"], dtype=float
+                )
+            self.noise.load_state_dict(
+                {
+                    "rng": self._restored_state["noise_rng"],
+                    "block": self._restored_state["noise_block"],
+                }
+            )
+            self._restored_state = None
+
+    def _start_static(self, compartments: list[list]) -> None:
+        self.cells = Ragged.from_sizes([len(cells) for cells in compartments])
+        self._slots = np.arange(len(compartments))
+        if self.snapshot is not None:
+            self.snapshot.refresh()
+            self._cell_ids = np.array(
+                [cell.id for cells in compartments for cell in cells],
+                dtype=np.int64,
+            )
+
+        self.coms = np.zeros((len(compartments), 3))
+        self.last_coms, _, _ = self._gather_cells()
+
+    def _start_dynamic(self, compartments: list[list]) -> None:
+        assert self.angles is not None and self.noise is not None
+        # the directions are drawn in the order of the filter and moved to the
+        # slots of the compartments
+        non_empty = [len(cells) > 0 for cells in compartments]
+        self.engine.start(self.box_size)
+        self._read_engine()
+
+        angles = np.full(self.engine.capacity, np.nan)
+        angles[self._slots] = self.angles[non_empty]
+        self.angles = angles
+        self.noise.resize(self.engine.capacity)
+
     def step(self, mcs: int):
+        if self.snapshot is not None:
+            self.snapshot.update(mcs)
+
         self._update_coms()
         self._update_forces(mcs)
         self._update_angles()
@@ -59,101 +133,120 @@ class CompartmentSwimmer(SteppableBasePy, Element):
             else self.params.initial_magnitude
         )
 
-        for cidx, (compartments, angle) in enumerate(
-            zip(
-                self.params.filter(),
-                self.angles,
-            )
-        ):
-            for cell in compartments:
-                if cell.type == 2 and cell.volume > 0:
-                    compartment_com = self.coms[cidx]
-                    cell_com = self._get_com(cell)
-
-                    # spring force (Hooke's law)
-                    k = self.k * force_magnitude  #  * cell.targetVolume
-                    force = k * self._unwrapped_distance(compartment_com, cell_com)
-
-                    # force component along X axis
-                    cell.lambdaVecX = force[0]
-                    # force component along Y axis
-                    cell.lambdaVecY = force[1]
-                else:
-                    # force component along X axis
-                    cell.lambdaVecX = force_magnitude * np.cos(angle)
-                    # force component along Y axis
-                    cell.lambdaVecY = force_magnitude * np.sin(angle)
+        # propulsion force along the compartment's direction of motion
+        directions = np.stack((np.cos(self.angles), np.sin(self.angles)), axis=1)
+        forces = force_magnitude * directions[self.cells.broadcast(self._slots)]
 
-    def _update_angles(self):
-        if self.angles is None:
-            return
-
-        self.angles += (np.random.normal(size=self.angles.shape)) * np.sqrt(
-            2 * self.params.d_theta
+        # spring force (Hooke's law) pulling nuclei towards the compartment's COM
+        k = self.k * force_magnitude  #  * cell.targetVolume
+        spring = k * minimum_image(
+            self._cell_coms - self.cells.broadcast(self.coms), self.box_size
         )
+        is_nucleus = (self._cell_types == 2) & (self._cell_volumes > 0)
+        forces = np.where(is_nucleus[..., None], spring[..., :2], forces)
 
-    def _update_coms(self):
-        assert self.coms is not None and self.last_coms is not None
-        for i, cells in enumerate(self.params.filter()):
-            # cells = [c for c in cells_raw if c.type == 1]
-            new_coms = np.array([self._get_com(cell) for cell in cells])
-            cell_volumes = np.array([cell.volume for cell in cells])
-            old_coms = self.last_coms[i, : len(cells), :]
+        cells = [cell for cells in self.params.filter() for cell in cells]
+        for cell, (force_x, force_y) in zip(cells, forces.tolist()):
+            # force component along X axis
+            cell.lambdaVecX = force_x
+            # force component along Y axis
+            cell.lambdaVecY = force_y
 
-            unwrapped_coms = old_coms + self._unwrapped_distance(old_coms, new_coms)
+    def _update_angles(self):
+        if self.angles is None or self.noise is None:
+            return
 
-            self.coms[i, :] = np.average(unwrapped_coms, weights=cell_volumes, axis=0)
-            self.last_coms[i, :, :] = unwrapped_coms
+        self.angles += self.noise.next() * np.sqrt(2 * self.params.d_theta)
 
-    def _get_com(self, cell: CellG) -> np.ndarray:
-        """
-        Get the center of mass of a cell as numpy array.
+    def _update_coms(self):
+        if self.params.dynamic:
+            self._update_compartments()
+            return
 
-        Parameters
-        ----------
-        cell : CellG
-            The cell to get the center of mass of.
+        assert self.coms is not None and self.last_coms is not None
+        new_coms, cell_volumes, cell_types = self._gather_cells()
+        unwrapped_coms = unwrap(self.last_coms, new_coms, self.box_size)
+
+        self._cell_coms = new_coms
+        self._cell_volumes = cell_volumes
+        self._cell_types = cell_types
+
+        self.coms = self.cells.weighted_mean(unwrapped_coms, cell_volumes)
+        self.last_coms = unwrapped_coms
+
+    def _update_compartments(self):
+        assert self.angles is not None and self.noise is not None
+        self.engine.update()
+        self._read_engine()
+
+        if self.engine.capacity > len(self.angles):
+            self.angles = self.engine.compartments.resize(self.angles, np.nan)
+            self.noise.resize(self.engine.capacity)
+        self.angles[self.engine.removed] = np.nan
+        self.angles[self.engine.added] = (
+            self.noise.rng.random(size=len(self.engine.added)) * 2 * np.pi
+        )
 
-        Returns
-        -------
-        np.ndarray
-            The center of mass of the cell
-        """
-        return np.array([cell.xCOM, cell.yCOM, 0])
+    def _read_engine(self):
+        """Take the compartments and cells of the last update of the engine."""
+        self.cells = self.engine.cells
+        self._slots = self.engine.slots
+        self.coms = self.engine.coms[self._slots]
+        self._cell_coms = self.engine.positions
+        self._cell_volumes = self.engine.volumes
+        self._cell_types = self.engine.types
 
-    def _unwrapped_distance(self, old_coms, new_coms) -> np.ndarray:
+    def _gather_cells(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
-        Compute the unwrapped distance between two center of mass positions.
-
-        Compute the distance between two center of mass positions while taking into
-        account the periodic boundary conditions of the simulation.
-
-        Parameters
-        ----------
-        old_coms : np.ndarray
-            The old center of mass positions.
-        new_coms : np.ndarray
-            The new center of mass positions.
+        Read the centre of mass, volume and type of every cell returned by the filter.
 
         Returns
         -------
-        np.ndarray
-            The unwrapped center of mass positions.
+        tuple[np.ndarray, np.ndarray, np.ndarray]
+            The centre of mass positions of shape `(n_cells, 3)` and the volumes
+            and types of shape `(n_cells,)` of the cells, grouped by compartment as
+            described by `cells`.
         """
-        assert self.box_size is not None
+        if self.snapshot is not None:
+            rows = self.snapshot.rows(self._cell_ids)
+            return (
+                self.snapshot.coms[rows],
+                self.snapshot.volumes[rows],
+                self.snapshot.types[rows].astype(int),
+            )
 
-        diff = np.empty_like(old_coms)
-        for j in range(len(diff)):
-            diff[j] = new_coms[j] - old_coms[j]
-            diff -= np.rint(diff / self.box_size * 2) * self.box_size / 2
-        return diff
+        values = np.array(
+            [
+                (cell.xCOM, cell.yCOM, 0, cell.volume, cell.type)
+                for cells in self.params.filter()
+                for cell in cells
+            ],
+            dtype=float,
+        ).reshape(-1, 5)
 
-        # new_coms = old_coms + diff
-        # return new_coms
+        return values[:, :3], values[:, 3], values[:, 4].astype(int)
 
     def finish(self):
         pass
 
+    def state_dict(self) -> dict:
+        assert self.noise is not None
+        noise = self.noise.state_dict()
+        state = {
+            "angles": np.asarray(self.angles),
+            "noise_rng": noise["rng"],
+            "noise_block": noise["block"],
+        }
+        if self.params.dynamic:
+            state.update(self.engine.state_dict())
+        else:
+            state["coms"] = np.asarray(self.coms)
+            state["last_coms"] = np.asarray(self.last_coms)
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        self._restored_state = state
+
     def build(self) -> list[ElementCC3D]:
         root_node = ElementCC3D("Plugin", {"Name": "ExternalPotential"})
         root_node.ElementCC3D("Algorithm", {}, "PixelBased")
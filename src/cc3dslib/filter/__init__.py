@@ -1,11 +1,13 @@
 from .cell_filter import CellFilter
 from .cell_type_filter import CellTypeFilter
 from .compartment_filter import CompartmentFilter
-from .filter import Filter
+from .filter import Filter, FilterCacheStats, cached
 from .random_fraction_filter import RandomFractionFilter
 
 __all__ = [
     "Filter",
+    "FilterCacheStats",
+    "cached",
     "CellFilter",
     "CellTypeFilter",
     "CompartmentFilter",
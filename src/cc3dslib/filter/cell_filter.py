@@ -1,11 +1,12 @@
 from cc3d.cpp.CompuCell import CellG
-from .filter import Filter
+from .filter import Filter, cached
 
 
 class CellFilter(Filter[CellG]):
     def __init__(self):
         super().__init__(frequency=float("inf"))
 
+    @cached
     def __call__(self) -> list[CellG]:
         assert self.cell_list is not None
         return list(self.cell_list)
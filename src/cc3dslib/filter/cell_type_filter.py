@@ -1,7 +1,7 @@
 from typing import Iterable
 from cc3d.core.PySteppables import SteppableBasePy
 from cc3d.cpp.CompuCell import CellG
-from .filter import Filter
+from .filter import Filter, cached
 
 
 class CellTypeFilter(Filter):
@@ -9,6 +9,7 @@ class CellTypeFilter(Filter):
         super().__init__(frequency=float("inf"))
         self.cell_types = types
 
+    @cached
     def __call__(self) -> Iterable[CellG]:
         """Return cells of the specified type(s).
 
@@ -2,7 +2,7 @@ from typing import Iterator
 from cc3d.core.PySteppables import SteppableBasePy
 
 from cc3dslib.active_swimmer import CellG
-from .filter import Filter
+from .filter import Filter, cached
 
 
 class CompartmentFilter(Filter[list[CellG]]):
@@ -15,6 +15,7 @@ class CompartmentFilter(Filter[list[CellG]]):
     def __init__(self):
         super().__init__(frequency=float("inf"))
 
+    @cached
     def __call__(self) -> Iterator[list[CellG]]:
         assert self.clusters is not None
         for compartment in self.clusters:
@@ -1,7 +1,12 @@
+import sys
 from abc import ABC, abstractmethod
-from typing import Iterable, Generic, TypeVar, Callable
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Iterable, Generic, TypeVar, Callable
 from cc3d.core.PySteppables import SteppableBasePy
 
+import numpy as np
+
 
 from cc3d.core.XMLUtils import ElementCC3D
 
@@ -12,19 +17,116 @@ T = TypeVar("T", covariant=True)
 TO = TypeVar("TO", covariant=True)
 
 
+@dataclass
+class FilterCacheStats:
+    """Counters describing the result cache of a filter.
+
+    Attributes:
+        - hits (int): Number of calls answered from the cache
+        - misses (int): Number of calls that had to evaluate the filter
+        - invalidations (int): Number of times a cached result was discarded
+          because the MCS changed or cells were created or destroyed
+        - nbytes (int): Approximate memory held by the cached result in bytes
+    """
+
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    nbytes: int = 0
+
+
+def cached(call: Callable[["Filter[T]"], Iterable[T]]):
+    """Cache the result of a filter's `__call__` for the current MCS.
+
+    The result is materialised into a list and returned as is until the MCS
+    changes, cells are created or destroyed (see `Filter.cache_key`), or
+    `Filter.invalidate` is called. Callers must not modify the returned list.
+    Filters that are not attached to a simulation are evaluated on every call.
+    """
+
+    @wraps(call)
+    def wrapper(self: "Filter[T]") -> Iterable[T]:
+        key = self.cache_key() if self.cache else None
+        if key is None:
+            return self._evaluate(call)
+
+        if self._cache is not None:
+            if self._cache[0] == key:
+                self.cache_stats.hits += 1
+                return self._cache[1]
+            self.cache_stats.invalidations += 1
+
+        self.cache_stats.misses += 1
+        result = self._evaluate(call)
+        self._cache = (key, result)
+        self.cache_stats.nbytes = _sizeof(result)
+        return result
+
+    return wrapper
+
+
+def _sizeof(result: list[Any]) -> int:
+    """Approximate the memory held by a cached filter result."""
+    size = sys.getsizeof(result)
+    for item in result:
+        size += item.nbytes if isinstance(item, np.ndarray) else sys.getsizeof(item)
+    return size
+
+
 class Filter(ABC, SteppableBasePy, Element, Generic[T]):
     """A filter is a callable that returns an iterable.
 
-    Filters can be used to select a subset of cells from a simulation.
+    Filters can be used to select a subset of cells from a simulation. Filters
+    decorated with `cached` evaluate at most once per MCS; see `cache_stats` for the
+    hit and invalidation counters of the cache.
     """
 
-    def __init__(self, frequency: float = float("inf")):
+    def __init__(self, frequency: float = float("inf"), cache: bool = True):
         super().__init__(frequency=frequency)
+        self.cache = cache
+        self.cache_stats = FilterCacheStats()
+        self._cache: tuple[tuple[int, int, int], list[T]] | None = None
 
     @abstractmethod
     def __call__(self) -> Iterable[T]:
         """Return an iterable of cells."""
 
+    def cache_key(self) -> tuple[int, int, int] | None:
+        """Return the key identifying the current state of the simulation.
+
+        The key consists of the current MCS, the number of cells and the ID of the
+        most recently created cell. Cell IDs are never reused, so the last ID grows
+        with every creation and the number of cells drops with every destruction
+        that is not matched by a creation. Cached results are therefore invalidated
+        at every step and whenever cells are created or destroyed, also if a birth
+        and a death happen in the same MCS. Returns `None` if the filter is not
+        attached to a simulation.
+        """
+        simulator = getattr(self, "simulator", None)
+        cell_list = getattr(self, "cell_list", None)
+        if simulator is None or cell_list is None:
+            return None
+        return simulator.getStep(), len(cell_list), self._last_cell_id(cell_list)
+
+    def _last_cell_id(self, cell_list: Iterable) -> int:
+        """Return the ID of the most recently created cell."""
+        potts = getattr(self, "potts", None)
+        if potts is not None:
+            return int(potts.getRecentlyCreatedCellId())
+        # without access to Potts, fall back to a pass over the cells
+        return max((cell.id for cell in cell_list), default=0)
+
+    def _evaluate(self, call: Callable[["Filter[T]"], Iterable[T]]) -> list[T]:
+        """Evaluate the filter bypassing the cache. `StepProfiler` times this call."""
+        return list(call(self))
+
+    def invalidate(self) -> None:
+        """Discard the cached result, e.g. after creating or destroying cells or
+        reassigning cluster IDs during an MCS."""
+        if self._cache is not None:
+            self._cache = None
+            self.cache_stats.invalidations += 1
+
     def transform(
         self, transform: Callable[[Iterable[T]], Iterable[TO]]
     ) -> "Filter[TO]":
@@ -50,9 +152,13 @@ class TransformFilter(Filter[TO], Generic[TO]):
         self.filter = filter
         self._transform_fn = transform
 
+    @cached
     def __call__(self) -> Iterable[TO]:
         return self._transform_fn(self.filter())
 
+    def cache_key(self) -> tuple[int, int] | None:
+        return self.filter.cache_key()
+
 
 class ApplyFilter(Filter[TO], Generic[TO]):
     """A filter that applies a transformation to each element returned by another filter."""
@@ -62,5 +168,9 @@ class ApplyFilter(Filter[TO], Generic[TO]):
         self.filter = filter
         self._transform_fn = transform
 
+    @cached
     def __call__(self) -> Iterable[TO]:
         return map(self._transform_fn, self.filter())
+
+    def cache_key(self) -> tuple[int, int] | None:
+        return self.filter.cache_key()
@@ -1,29 +1,103 @@
-from typing import Iterable, TypeVar, Generic
+from typing import Any, Callable, Iterable, Iterator, Sized, TypeVar, Generic
 
 import numpy as np
 
-from .filter import Filter
+from cc3dslib.simulation.checkpoint import generator_state, set_generator_state
+
+from .filter import Filter, cached
 
 
 T = TypeVar("T", covariant=True)
 
 
+def stable_key(element: Any) -> int:
+    """Return a key identifying a filter element across simulation steps.
+
+    Compartments (lists of cells) are identified by their cluster ID, single cells
+    by their cell ID.
+    """
+    if isinstance(element, (list, tuple)):
+        return element[0].clusterId
+    return element.id
+
+
 class RandomFractionFilter(Filter[T], Generic[T]):
-    """Randomly select a given fraction of the elements a filter returns"""
+    """Randomly select a given fraction of the elements a filter returns.
+
+    The selection is made once by a stable key (see `stable_key`) and stored as an
+    index of keys in `selected`. Each call streams the elements of the upstream
+    filter and only yields the selected ones, so the selection stays consistent if
+    the order of the upstream elements changes. Elements whose key is not part of
+    the selection, e.g. newly created cells, are skipped until `reselect` is called.
+    With `reselect_on_change`, a new selection is drawn whenever the number of
+    upstream elements changes.
+
+    If `seed` is None, the generator is seeded from the global NumPy random number
+    generator, such that `np.random.seed` still makes the selection reproducible.
+    """
 
-    def __init__(self, filter: Filter[T], fraction: float):
+    def __init__(
+        self,
+        filter: Filter[T],
+        fraction: float,
+        key: Callable[[T], int] = stable_key,
+        seed: int | np.random.Generator | None = None,
+        reselect_on_change: bool = False,
+    ):
         super().__init__(frequency=float("inf"))
         self.filter = filter
         self.fraction = fraction
-        self.indices: np.ndarray | None = None
+        self.key = key
+        if seed is None:
+            seed = int(np.random.randint(2**32, dtype=np.uint64))
+        self.rng = np.random.default_rng(seed)
+        self.reselect_on_change = reselect_on_change
+
+        self.selected: np.ndarray | None = None
+        self.population = 0
+        self._selected_keys: frozenset[int] = frozenset()
+
+    @cached
+    def __call__(self) -> Iterator[T]:
+        elements = self.filter()
+        if self.selected is None or (
+            self.reselect_on_change
+            and isinstance(elements, Sized)
+            and len(elements) != self.population
+        ):
+            self.reselect(elements)
+            if not isinstance(elements, Sized):
+                elements = self.filter()
+
+        selected_keys = self._selected_keys
+        return (element for element in elements if self.key(element) in selected_keys)
+
+    def reselect(self, elements: Iterable[T] | None = None) -> None:
+        """Draw a new random selection from the elements of the upstream filter."""
+        if elements is None:
+            elements = self.filter()
+
+        keys = np.fromiter((self.key(element) for element in elements), dtype=np.int64)
+        size = int(len(keys) * self.fraction)
+
+        self.selected = np.sort(self.rng.choice(keys, size, replace=False))
+        self.population = len(keys)
+        self._selected_keys = frozenset(self.selected.tolist())
+        self.invalidate()
 
-    def __call__(self) -> Iterable[T]:
-        data = np.array(list(self.filter()))
-        if self.indices is None:
-            self._assign_indices(data)
+    def state_dict(self) -> dict:
+        state: dict = {"rng": generator_state(self.rng), "population": self.population}
+        if self.selected is not None:
+            state["selected"] = self.selected
+        return state
 
-        return data[self.indices]
+    def load_state_dict(self, state: dict) -> None:
+        set_generator_state(self.rng, state["rng"])
+        self.population = int(state["population"])
+        if "selected" in state:
+            self.selected = np.array(state["selected"], dtype=np.int64)
+            self._selected_keys = frozenset(self.selected.tolist())
+        self.invalidate()
 
-    def _assign_indices(self, data: np.ndarray) -> None:
-        size = len(data)
-        self.indices = np.random.choice(size, int(size * self.fraction), replace=False)
+    def cache_key(self) -> tuple[int, int] | None:
+        return self.filter.cache_key()
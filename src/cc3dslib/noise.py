@@ -0,0 +1,92 @@
+"""Seeded streams of Gaussian noise drawn in blocks of several steps."""
+
+import numpy as np
+
+from cc3dslib.simulation.checkpoint import generator_state, set_generator_state
+
+Seed = int | np.random.SeedSequence | np.random.Generator | None
+
+
+def spawn_seeds(
+    seed: int | np.random.SeedSequence, n: int
+) -> list[np.random.SeedSequence]:
+    """
+    Split a seed into `n` independent seeds.
+
+    Use this to give each steppable (or each run of a sweep) its own stream of
+    random numbers that does not overlap with the others.
+
+    Parameters
+    ----------
+    seed : int | np.random.SeedSequence
+        The seed to split.
+    n : int
+        The number of seeds.
+
+    Returns
+    -------
+    list[np.random.SeedSequence]
+        The independent seeds.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+
+class NoiseStream:
+    """Standard normal noise for a fixed number of values per step.
+
+    Instead of drawing `size` values each step, the noise of `block_steps` steps is
+    drawn at once into a `(block_steps, size)` block and handed out row by row.
+    This amortises the overhead of calling the random number generator over many
+    steps. The values are the same as drawing `block_steps * size` values at once
+    from a `np.random.Generator` seeded with `seed`.
+
+    If `seed` is None, the generator is seeded from the global NumPy random number
+    generator, such that `np.random.seed` still makes the stream reproducible.
+    """
+
+    def __init__(self, size: int, block_steps: int = 256, seed: Seed = None):
+        if seed is None:
+            seed = int(np.random.randint(2**32, dtype=np.uint64))
+
+        self.size = size
+        self.block_steps = block_steps
+        self.rng = np.random.default_rng(seed)
+        self._block = np.empty((0, size))
+        self._position = 0
+
+    def next(self) -> np.ndarray:
+        """
+        Return the noise of the next step.
+
+        Returns
+        -------
+        np.ndarray
+            `size` standard normal values. The array is a view into the current
+            block and must not be modified.
+        """
+        if self._position == len(self._block):
+            self._block = self.rng.standard_normal((self.block_steps, self.size))
+            self._position = 0
+
+        noise = self._block[self._position]
+        self._position += 1
+        return noise
+
+    def resize(self, size: int) -> None:
+        """Change the number of values per step, discarding the current block."""
+        self.size = size
+        self._block = np.empty((0, size))
+        self._position = 0
+
+    def state_dict(self) -> dict:
+        return {
+            "rng": generator_state(self.rng),
+            "block": self._block[self._position :],
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        set_generator_state(self.rng, state["rng"])
+        self._block = np.array(state["block"], dtype=float).reshape(-1, self.size)
+        self._position = 0
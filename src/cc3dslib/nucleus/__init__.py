@@ -1,6 +1,14 @@
+from .layout import CompartmentLayout, compartment_layout
 from .nucleus_compartment_cell import (
     NucleusCompartmentCell,
     NucleusCompartmentCellParams,
 )
+from .nucleus_compartment_filter import NucleusCompartmentFilter
 
-__all__ = ["NucleusCompartmentCell", "NucleusCompartmentCellParams"]
+__all__ = [
+    "CompartmentLayout",
+    "compartment_layout",
+    "NucleusCompartmentCell",
+    "NucleusCompartmentCellParams",
+    "NucleusCompartmentFilter",
+]
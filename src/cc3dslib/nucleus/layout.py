@@ -0,0 +1,369 @@
+"""Label layouts of confluent compartmentalised cells, computed with NumPy."""
+
+from dataclasses import dataclass
+from typing import Literal
+
+import numpy as np
+
+Packing = Literal["square", "hex"]
+
+
+@dataclass
+class CompartmentLayout:
+    """Assignment of lattice pixels to compartments and their nuclei.
+
+    All arrays cover the box the layout was created for, starting at `origin` in
+    lattice coordinates. For a 2D box, the arrays have a single z layer.
+
+    Attributes:
+        - dims (int): Dimensionality of the layout (2 or 3)
+        - origin (np.ndarray): Lattice coordinates of the lower corner of the box
+        - diameter (int): Diameter of the compartments in pixels
+        - nucleus_size (int): Edge length of the (square or cubic) nuclei in pixels
+        - centres (np.ndarray): Centres of the compartments in lattice coordinates,
+          shape `(n_compartments, 3)`
+        - compartments (np.ndarray): Index of the compartment each pixel belongs to,
+          plus one (zero for pixels outside of all compartments)
+        - nucleus (np.ndarray): Whether each pixel belongs to the nucleus of its
+          compartment
+    """
+
+    dims: int
+    origin: np.ndarray
+    diameter: int
+    nucleus_size: int
+    centres: np.ndarray
+    compartments: np.ndarray
+    nucleus: np.ndarray
+
+    @property
+    def n_compartments(self) -> int:
+        return len(self.centres)
+
+    def volumes(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Count the pixels of each compartment.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The number of cytoplasm and nucleus pixels of each compartment.
+        """
+        n = self.n_compartments + 1
+        total = np.bincount(self.compartments.ravel(), minlength=n)[1:]
+        nucleus = np.bincount(self.compartments[self.nucleus].ravel(), minlength=n)[1:]
+        return total - nucleus, nucleus
+
+    def boxes(self, nucleus: bool = False) -> np.ndarray:
+        """
+        Decompose the layout into axis-aligned boxes of equal labels.
+
+        The boxes of the compartments cover their nuclei as well, such that the
+        lattice is initialised by writing the compartment boxes first and the
+        nucleus boxes on top. For the default square packing, this yields exactly
+        one box per compartment and nucleus.
+
+        Parameters
+        ----------
+        nucleus : bool
+            Whether to decompose the nuclei instead of the compartments.
+
+        Returns
+        -------
+        np.ndarray
+            One row `(compartment, x0, x1, y0, y1, z0, z1)` per box, with the
+            compartment index starting at zero and the half-open extent of the box
+            in lattice coordinates.
+        """
+        labels = np.where(self.nucleus, self.compartments, 0) if nucleus else None
+        boxes = _label_boxes(self.compartments if labels is None else labels)
+        boxes[:, 0] -= 1
+        boxes[:, 1:3] += self.origin[0]
+        boxes[:, 3:5] += self.origin[1]
+        boxes[:, 5:7] += self.origin[2]
+        return boxes
+
+    def cell_boxes(self) -> np.ndarray:
+        """
+        Decompose the layout into disjoint boxes of cytoplasm, nuclei and free pixels.
+
+        Unlike `boxes`, every pixel of the layout is covered by exactly one box, such
+        that the lattice is initialised by writing each pixel once.
+
+        Returns
+        -------
+        np.ndarray
+            One row `(compartment, nucleus, x0, x1, y0, y1, z0, z1)` per box, with
+            the compartment index starting at zero (-1 for pixels outside of all
+            compartments), whether the box belongs to the nucleus, and the half-open
+            extent of the box in lattice coordinates.
+        """
+        boxes = _label_boxes(2 * self.compartments + self.nucleus + 1)
+        compartment, nucleus = np.divmod(boxes[:, 0] - 1, 2)
+        boxes[:, 1:3] += self.origin[0]
+        boxes[:, 3:5] += self.origin[1]
+        boxes[:, 5:7] += self.origin[2]
+        return np.column_stack((compartment - 1, nucleus, boxes[:, 1:]))
+
+
+def compartment_layout(
+    box: tuple[int, int, int, int] | tuple[int, int, int, int, int, int],
+    diameter: int,
+    nucleus_size_ratio: float,
+    packing: Packing = "square",
+    jitter: float = 0.0,
+    seed: int | np.random.Generator | None = None,
+    edge_compartments: bool = False,
+) -> CompartmentLayout:
+    """
+    Fill a box with confluent compartments, each with a nucleus at its centre.
+
+    With the default square packing, the compartments are squares (cubes in 3D)
+    of edge length `diameter` starting at the lower corner of the box. With the
+    hexagonal packing, every other row (layer) of compartments is shifted by half
+    a diameter. If `jitter` is positive, the centres are displaced randomly by up to
+    `jitter * diameter / 2` along each axis. In these cases, each pixel belongs to
+    the compartment with the nearest centre.
+
+    By default, only compartments that fit into the box entirely are created, e.g.
+    `(x1 - x0) // diameter` compartments along x for the square packing, and the
+    remaining pixels at the edges of the box are left free. With
+    `edge_compartments`, compartments at the edges are clipped to the box instead,
+    such that the whole box is covered.
+
+    Parameters
+    ----------
+    box : tuple[int, int, int, int] | tuple[int, int, int, int, int, int]
+        The box `(x0, y0, x1, y1)` in 2D or `(x0, y0, z0, x1, y1, z1)` in 3D.
+    diameter : int
+        The diameter of the compartments in pixels.
+    nucleus_size_ratio : float
+        The edge length of the nuclei relative to `diameter`.
+    packing : "square" | "hex"
+        The arrangement of the compartment centres.
+    jitter : float
+        The maximum random displacement of the centres, relative to `diameter`.
+        Must be between 0 and 1.
+    seed : int | np.random.Generator | None
+        The seed of the random displacements.
+    edge_compartments : bool
+        Whether to fill the edges of the box with clipped compartments.
+
+    Returns
+    -------
+    CompartmentLayout
+        The layout of the box.
+    """
+    if len(box) == 4:
+        lower = np.array([box[0], box[1], 0])
+        upper = np.array([box[2], box[3], 1])
+        dims = 2
+    elif len(box) == 6:
+        lower = np.array(box[:3])
+        upper = np.array(box[3:])
+        dims = 3
+    else:
+        raise ValueError("box must be a 4 (2D) or 6 (3D) element tuple.")
+    if not 0 <= jitter <= 1:
+        raise ValueError("jitter must be between 0 and 1.")
+
+    shape = tuple(int(n) for n in upper - lower)
+    nucleus_size = int(diameter * nucleus_size_ratio)
+
+    # centres relative to the lower corner of the box
+    centres = _centres(shape, diameter, dims, packing)
+    # whether the compartments fit into the box before they are displaced
+    inside = np.all(
+        (centres[:, :dims] >= diameter / 2)
+        & (centres[:, :dims] <= np.array(shape[:dims]) - diameter / 2),
+        axis=1,
+    )
+    if jitter > 0:
+        rng = np.random.default_rng(seed)
+        displacement = rng.uniform(-0.5, 0.5, size=centres.shape) * jitter * diameter
+        displacement[:, dims:] = 0
+        centres = np.clip(centres + displacement, 0, np.array(shape) - 1e-6)
+
+    if packing == "square" and jitter == 0:
+        index = [np.arange(n) // diameter for n in shape[:dims]]
+        counts = [-(-n // diameter) for n in shape[:dims]]
+        compartments = np.ravel_multi_index(
+            np.meshgrid(*index, indexing="ij"), counts
+        ).reshape(shape)
+        compartments += 1
+    else:
+        compartments = _nearest_centre(shape, centres, diameter, dims, jitter) + 1
+
+    if not edge_compartments:
+        labels = np.zeros(len(centres) + 1, dtype=np.int64)
+        labels[1:][inside] = np.arange(1, np.count_nonzero(inside) + 1)
+        compartments = labels[compartments]
+        centres = centres[inside]
+
+    nucleus = _nucleus_mask(compartments, centres, diameter, nucleus_size, dims)
+    if dims == 2:
+        centres[:, 2] = 0
+
+    return CompartmentLayout(
+        dims=dims,
+        origin=lower,
+        diameter=diameter,
+        nucleus_size=nucleus_size,
+        centres=centres + lower,
+        compartments=compartments.astype(np.int32),
+        nucleus=nucleus,
+    )
+
+
+def _centres(
+    shape: tuple[int, ...], diameter: int, dims: int, packing: Packing
+) -> np.ndarray:
+    """Return the compartment centres inside a box of the given shape."""
+    if packing == "square":
+        axes = [diameter * (np.arange(-(-n // diameter)) + 0.5) for n in shape[:dims]]
+        if dims == 2:
+            axes.append(np.array([0.5]))
+        grid = np.meshgrid(*axes, indexing="ij")
+        return np.stack([axis.ravel() for axis in grid], axis=1)
+
+    if packing != "hex":
+        raise ValueError(f"Unknown packing {packing!r}.")
+
+    # hexagonal rows in the xy plane, layers stacked as in a hexagonal close packing
+    row_spacing = diameter * np.sqrt(3) / 2
+    layer_spacing = diameter * np.sqrt(2 / 3) if dims == 3 else 1.0
+    n_rows = int(np.ceil(shape[1] / row_spacing)) + 1
+    n_columns = int(np.ceil(shape[0] / diameter)) + 1
+    n_layers = int(np.ceil(shape[2] / layer_spacing)) + 1 if dims == 3 else 1
+
+    layer, row, column = np.meshgrid(
+        np.arange(n_layers), np.arange(n_rows), np.arange(-1, n_columns), indexing="ij"
+    )
+    x = diameter * (column + 0.5 + 0.5 * (row % 2) + 0.5 * (layer % 2))
+    y = row_spacing * (row + 0.5 + (layer % 2) / 3)
+    z = layer_spacing * (layer + 0.5)
+    centres = np.stack((x.ravel(), y.ravel(), z.ravel()), axis=1)
+
+    inside = np.all((centres >= 0) & (centres < np.array(shape)), axis=1)
+    if dims == 2:
+        centres[:, 2] = 0.5
+        inside = np.all((centres[:, :2] >= 0) & (centres[:, :2] < shape[:2]), axis=1)
+    return centres[inside]
+
+
+def _nearest_centre(
+    shape: tuple[int, ...],
+    centres: np.ndarray,
+    diameter: int,
+    dims: int,
+    jitter: float,
+) -> np.ndarray:
+    """
+    Return the index of the nearest centre of each pixel.
+
+    Each centre is only compared with the pixels within the largest possible
+    distance of a pixel to its nearest centre, `sqrt(dims) * (1 + jitter) / 2`
+    diameters. Pixels at the edges of the box that are not reached by any centre
+    this way are compared with all centres.
+    """
+    radius = np.sqrt(dims) * (1 + jitter) / 2 * diameter
+    best = np.full(shape, np.inf)
+    nearest = np.zeros(shape, dtype=np.int64)
+
+    for i, centre in enumerate(centres):
+        lower = np.maximum(np.floor(centre - radius).astype(int), 0)
+        upper = np.minimum(np.ceil(centre + radius).astype(int) + 1, shape)
+        lower[dims:], upper[dims:] = 0, shape[dims:]
+        region = tuple(slice(lo, hi) for lo, hi in zip(lower, upper))
+
+        grid = np.ogrid[region]
+        distance = sum((grid[axis] + 0.5 - centre[axis]) ** 2 for axis in range(dims))
+        distance = np.broadcast_to(distance, best[region].shape)
+        closer = distance < best[region]
+        best[region][closer] = distance[closer]
+        nearest[region][closer] = i
+
+    unreached = np.argwhere(np.isinf(best))
+    for start in range(0, len(unreached), 4096):
+        pixels = unreached[start : start + 4096]
+        delta = pixels[:, None, :dims] + 0.5 - centres[None, :, :dims]
+        nearest[tuple(pixels.T)] = np.einsum("ijk,ijk->ij", delta, delta).argmin(1)
+
+    return nearest
+
+
+def _nucleus_mask(
+    compartments: np.ndarray,
+    centres: np.ndarray,
+    diameter: int,
+    nucleus_size: int,
+    dims: int,
+) -> np.ndarray:
+    """Return whether each pixel lies in the nucleus of its compartment.
+
+    The nucleus starts `(diameter - nucleus_size) // 2` pixels after the lower
+    corner of the compartment's bounding square, as in a regular grid.
+    """
+    start = (diameter - nucleus_size) // 2
+    corners = np.floor(centres - diameter / 2).astype(np.int64)
+    index = np.maximum(compartments - 1, 0)
+    mask = compartments > 0
+    for axis in range(dims):
+        pixel = np.arange(compartments.shape[axis]).reshape(
+            [-1 if i == axis else 1 for i in range(3)]
+        )
+        offset = pixel - corners[index, axis] - start
+        mask &= (offset >= 0) & (offset < nucleus_size)
+    return mask
+
+
+def _label_boxes(labels: np.ndarray) -> np.ndarray:
+    """
+    Decompose a label array into axis-aligned boxes of equal, non-zero labels.
+
+    Runs of equal labels along x are merged with the identical runs of the
+    following rows (y) and then of the following layers (z).
+
+    Returns
+    -------
+    np.ndarray
+        One row `(label, x0, x1, y0, y1, z0, z1)` per box.
+    """
+    nx, ny, nz = labels.shape
+    rows = labels.transpose(2, 1, 0).reshape(-1, nx)
+
+    # runs along x
+    starts = np.ones(rows.shape, dtype=bool)
+    starts[:, 1:] = rows[:, 1:] != rows[:, :-1]
+    row, x0 = np.nonzero(starts)
+    x1 = np.append(x0[1:], nx)
+    x1[np.append(row[1:] != row[:-1], True)] = nx
+    label = rows[row, x0]
+    keep = label != 0
+    row, x0, x1, label = row[keep], x0[keep], x1[keep], label[keep]
+    z, y = np.divmod(row, ny)
+
+    # merge runs over consecutive rows, then over consecutive layers
+    y0, y1, (label, x0, x1, z) = _merge(y, y + 1, (label, x0, x1, z))
+    z0, z1, (label, x0, x1, y0, y1) = _merge(z, z + 1, (label, x0, x1, y0, y1))
+
+    return np.stack((label, x0, x1, y0, y1, z0, z1), axis=1).astype(np.int64)
+
+
+def _merge(
+    lower: np.ndarray, upper: np.ndarray, keys: tuple[np.ndarray, ...]
+) -> tuple[np.ndarray, np.ndarray, tuple[np.ndarray, ...]]:
+    """Merge adjacent intervals `[lower, upper)` that share all keys."""
+    order = np.lexsort((lower,) + keys[::-1])
+    lower, upper = lower[order], upper[order]
+    keys = tuple(key[order] for key in keys)
+
+    new_group = np.ones(len(lower), dtype=bool)
+    same_keys = np.ones(len(lower) - 1, dtype=bool) if len(lower) else new_group[:0]
+    for key in keys:
+        same_keys &= key[1:] == key[:-1]
+    new_group[1:] = ~same_keys | (lower[1:] != upper[:-1])
+
+    first = np.flatnonzero(new_group)
+    last = np.append(first[1:], len(lower)) - 1
+    return lower[first], upper[last], tuple(key[first] for key in keys)
@@ -7,6 +7,7 @@ from cc3d.core.PySteppables import SteppableBasePy
 from cc3d.core.XMLUtils import ElementCC3D
 from cc3d.cpp import CompuCell
 
+from cc3dslib.nucleus.layout import CompartmentLayout, Packing, compartment_layout
 from cc3dslib.simulation import Element
 
 
@@ -40,6 +41,10 @@ class NucleusCompartmentCell(SteppableBasePy, Element):
 
         self.params = params
         self._cluster_ids: np.ndarray = np.array([])
+        self._cell_ids: np.ndarray = np.empty((0, 2), dtype=np.int64)
+        self._sorted_ids: np.ndarray = np.empty(0, dtype=np.int64)
+        self._sorted_compartments: np.ndarray = np.empty(0, dtype=np.int64)
+        self._layout: CompartmentLayout | None = None
 
     def start(self):
         """Create a cell with a nucleus and cytoplasm."""
@@ -47,43 +52,91 @@ class NucleusCompartmentCell(SteppableBasePy, Element):
         self._assign_cell_custer_ids()
         self._assign_volume_terms()
 
-    def _assign_cells_to_grid(self):
-        """Create new cells in a regular grid with the nucleus in the centre."""
-        start_x, start_y, end_x, end_y = self.params.box
-
-        cell_size = self.params.diameter
-        nuc_size = int(cell_size * self.params.nucleus_size_ratio)
-        nuc_start = int((cell_size - nuc_size) / 2)
-        nuc_end = nuc_start + nuc_size
+    @property
+    def layout(self) -> CompartmentLayout:
+        """Return the layout of the compartments, computed on first access."""
+        if self._layout is None:
+            self._layout = compartment_layout(
+                self.params.box,
+                self.params.diameter,
+                self.params.nucleus_size_ratio,
+                packing=self.params.packing,
+                jitter=self.params.jitter,
+                seed=self.params.seed,
+                edge_compartments=self.params.edge_compartments,
+            )
+        return self._layout
 
-        self.cell_field[:, :, 0] = self.new_cell(self.DUMMY)
+    def _assign_cells_to_grid(self):
+        """Create the cells of the layout, writing each pixel of the box once.
 
-        for x in np.arange(start_x, end_x, cell_size).astype(np.float64):
-            for y in np.arange(start_y, end_y, cell_size).astype(np.float64):
-                self.cell_field[
-                    x : x + cell_size, y : y + self.params.diameter, 0
-                ] = self.new_cell(self.CYTOPLASM)
+        The cytoplasm, the nuclei and the free pixels of the layout are written as
+        disjoint boxes (see `CompartmentLayout.cell_boxes`). The free pixels and the
+        rest of the lattice belong to a single dummy cell.
+        """
+        layout = self.layout
 
-                self.cell_field[
-                    x + nuc_start : x + nuc_end, y + nuc_start : y + nuc_end, 0
-                ] = self.new_cell(self.NUCLEUS)
+        boxes = layout.cell_boxes()
+        box_coords = self.get_box_coordinates()[1]
+        lattice_shape = (box_coords.x, box_coords.y, box_coords.z)[: layout.dims]
+        covers_lattice = not layout.origin.any() and (
+            layout.compartments.shape[: layout.dims] == lattice_shape
+        )
+        if not covers_lattice:
+            # the free pixels of the layout are then covered by the dummy cell as well
+            dummy = self.new_cell(self.DUMMY)
+            if layout.dims == 2:
+                self.cell_field[:, :, 0] = dummy
+            else:
+                self.cell_field[:, :, :] = dummy
+            boxes = boxes[boxes[:, 0] >= 0]
+        elif np.any(boxes[:, 0] < 0):
+            dummy = self.new_cell(self.DUMMY)
+
+        self._cytoplasm, self._nuclei = [], []
+        for _ in range(layout.n_compartments):
+            self._cytoplasm.append(self.new_cell(self.CYTOPLASM))
+            self._nuclei.append(self.new_cell(self.NUCLEUS))
+
+        cells = (self._cytoplasm, self._nuclei)
+        for i, nucleus, x0, x1, y0, y1, z0, z1 in boxes.tolist():
+            self.cell_field[x0:x1, y0:y1, z0:z1] = (
+                cells[nucleus][i] if i >= 0 else dummy
+            )
 
     def _assign_cell_custer_ids(self):
-        """Assign the same cluster ID to the nucleus and cytoplasm of each cell."""
-        cluster_ids: list[int] = []
-        for cyto_cell, nuc_cell in zip(
-            self.cell_list_by_type(self.CYTOPLASM), self.cell_list_by_type(self.NUCLEUS)
-        ):
-            cluster_id = cyto_cell.clusterId
-            self.reassign_cluster_id(nuc_cell, cluster_id)
-            cluster_ids.append(cluster_id)
+        """Assign the same cluster ID to the nucleus and cytoplasm of each cell.
+
+        The nucleus and cytoplasm of each compartment are known from the layout,
+        so the cells are paired directly instead of matching them by creation order.
+        """
+        for cyto_cell, nuc_cell in zip(self._cytoplasm, self._nuclei):
+            self.reassign_cluster_id(nuc_cell, cyto_cell.clusterId)
 
-        self._cluster_ids = np.array(cluster_ids)
+        self._cluster_ids = np.array(
+            [cell.clusterId for cell in self._cytoplasm], dtype=np.int64
+        )
+        self._cell_ids = np.array(
+            [
+                (cyto_cell.id, nuc_cell.id)
+                for cyto_cell, nuc_cell in zip(self._cytoplasm, self._nuclei)
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        self._cytoplasm, self._nuclei = [], []
+
+        # sorted once, such that `compartment_of` is a binary search
+        order = np.argsort(self._cell_ids.ravel(), kind="stable")
+        self._sorted_ids = self._cell_ids.ravel()[order]
+        self._sorted_compartments = order // self._cell_ids.shape[1]
 
     def _assign_volume_terms(self):
         """Assign the volume terms for each cell according to the cell size."""
-        cell_vol = self.params.diameter**2
-        nuc_vol = self.params.nucleus_size_ratio**2 * cell_vol
+        dims = self.layout.dims
+        cell_vol = self.params.diameter**dims
+        if self.params.packing != "square" or self.params.jitter > 0:
+            cell_vol = np.mean(np.add(*self.layout.volumes()))
+        nuc_vol = self.params.nucleus_size_ratio**dims * self.params.diameter**dims
         cyto_vol = cell_vol - nuc_vol
 
         for cell in self.cell_list_by_type(self.NUCLEUS):
@@ -96,7 +149,7 @@ class NucleusCompartmentCell(SteppableBasePy, Element):
 
         n_cells = len(self.cell_list_by_type(self.CYTOPLASM))
         box_coords = self.get_box_coordinates()[1]
-        box_size = box_coords.x * box_coords.y
+        box_size = box_coords.x * box_coords.y * (box_coords.z if dims == 3 else 1)
         for cell in self.cell_list_by_type(self.DUMMY):
             cell.targetVolume = box_size - n_cells * cell_vol
             cell.lambdaVolume = self.params.cyto_lambda_volume
@@ -112,13 +165,55 @@ class NucleusCompartmentCell(SteppableBasePy, Element):
         """Return the cluster IDs of the cells created by this steppable."""
         return self._cluster_ids
 
+    @property
+    def cell_ids(self) -> np.ndarray:
+        """Return the cell IDs of the cytoplasm (first column) and nucleus (second
+        column) of each compartment, in the order of `cluster_ids`."""
+        return self._cell_ids
+
+    def compartment_index(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the cells of each compartment in compressed sparse row format.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The offsets `indptr` of shape `(n_clusters + 1,)` and the cell IDs, such
+            that `cell_ids[indptr[i]:indptr[i + 1]]` are the cells of the compartment
+            with cluster ID `cluster_ids[i]`.
+        """
+        indptr = np.arange(len(self._cell_ids) + 1) * self._cell_ids.shape[1]
+        return indptr, self._cell_ids.ravel()
+
+    def compartment_of(self, cell_ids: np.ndarray) -> np.ndarray:
+        """
+        Look up the compartment of cells created by this steppable.
+
+        Parameters
+        ----------
+        cell_ids : np.ndarray
+            The IDs of the cells.
+
+        Returns
+        -------
+        np.ndarray
+            The index of the compartment (into `cluster_ids`) of each cell, or -1 for
+            cells not created by this steppable.
+        """
+        cell_ids = np.asarray(cell_ids, dtype=np.int64)
+        if len(self._sorted_ids) == 0:
+            return np.full(cell_ids.shape, -1)
+
+        positions = np.searchsorted(self._sorted_ids, cell_ids).clip(
+            max=len(self._sorted_ids) - 1
+        )
+        found = self._sorted_ids[positions] == cell_ids
+        return np.where(found, self._sorted_compartments[positions], -1)
+
     @property
     def n_clusters(self) -> int:
         """Return the number of clusters created by this steppable."""
-        start_x, start_y, end_x, end_y = self.params.box
-        cell_size = self.params.diameter
-
-        return int((end_x - start_x) / cell_size) * int((end_y - start_y) / cell_size)
+        return self.layout.n_compartments
 
     def build(self) -> list[ElementCC3D]:
         """Return the XML element for this steppable."""
@@ -201,8 +296,10 @@ class NucleusCompartmentCellParams:
     """Parameters for NucleusCompartmentCell:
 
     Attributes:
-        - box (tuple[int, int, int, int]): The size of the box that is supposed to be
-          filled with a confluent layer of compartmentalised nucleus cells
+        - box (tuple[int, int, int, int] | tuple[int, int, int, int, int, int]): The
+          box `(x0, y0, x1, y1)` (2D) or `(x0, y0, z0, x1, y1, z1)` (3D) that is
+          supposed to be filled with a confluent layer of compartmentalised nucleus
+          cells
         - diameter (int): Diameter of the cytoplasm in pixels
         - nucleus_size_ratio (float): Ratio of the nucleus size (must be between 0 and
           1). The nucleus diamter is thus `nucleus_size_ratio * diameter`
@@ -213,10 +310,17 @@ class NucleusCompartmentCellParams:
         - contact_energy (dict): Dictionary of contact energies between cell types.
         - contact_internal (dict): Dictionary of contact energies between cell nucleus
           and cytoplasm
+        - packing ("square" | "hex"): Arrangement of the cells in the box
+        - jitter (float): Maximum random displacement of the cell centres relative to
+          the diameter (between 0 and 1)
+        - seed (int | None): Seed of the random displacements
+        - edge_compartments (bool): Whether to fill the edges of the box that do
+          not fit a whole compartment with clipped compartments instead of the
+          dummy cell
 
     """
 
-    box: tuple[int, int, int, int]
+    box: tuple[int, int, int, int] | tuple[int, int, int, int, int, int]
     diameter: int = 20
     nucleus_size_ratio: float = 0.2
     cyto_lambda_volume: float = 0.1
@@ -230,3 +334,7 @@ class NucleusCompartmentCellParams:
     neighbour_order_contact: int = 20
     neighbour_order_internal: int = 20
     neighbour_order_volume: int = 20
+    packing: Packing = "square"
+    jitter: float = 0.0
+    seed: int | None = None
+    edge_compartments: bool = False
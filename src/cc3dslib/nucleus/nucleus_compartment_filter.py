@@ -0,0 +1,34 @@
+from typing import Iterator
+
+from cc3d.cpp.CompuCell import CellG
+
+from cc3dslib.filter import Filter, cached
+from cc3dslib.nucleus.nucleus_compartment_cell import NucleusCompartmentCell
+
+
+class NucleusCompartmentFilter(Filter[list[CellG]]):
+    """A filter iterating over the compartments of a `NucleusCompartmentCell`.
+
+    Each compartment is returned as its cytoplasm and nucleus cell, in the order of
+    `NucleusCompartmentCell.cluster_ids`. The cells are fetched by ID from the
+    `compartment_index` of the steppable, so the cells of the simulation are not
+    grouped by cluster ID as in `CompartmentFilter`. Cells that no longer exist are
+    left out, as are compartments without any cells. Use
+    `NucleusCompartmentCell.compartment_of` to map cell IDs back to compartments.
+    """
+
+    def __init__(self, cells: NucleusCompartmentCell):
+        super().__init__(frequency=float("inf"))
+        self.cells = cells
+
+    @cached
+    def __call__(self) -> Iterator[list[CellG]]:
+        indptr, cell_ids = self.cells.compartment_index()
+        for start, stop in zip(indptr[:-1].tolist(), indptr[1:].tolist()):
+            compartment = [
+                cell
+                for cell in map(self.fetch_cell_by_id, cell_ids[start:stop].tolist())
+                if cell is not None
+            ]
+            if compartment:
+                yield compartment
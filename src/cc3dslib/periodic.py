@@ -0,0 +1,54 @@
+"""Vectorized helpers for periodic boundary conditions."""
+
+import numpy as np
+
+
+def minimum_image(delta: np.ndarray, box_size: np.ndarray) -> np.ndarray:
+    """
+    Map displacement vectors onto their minimum image.
+
+    The displacements may have any leading shape, e.g. `(n_cells, 3)` for a flat
+    (ragged) list of cells or `(n_compartments, 3)` for the centres of mass of the
+    compartments. Axes with a box size of zero are treated as non-periodic.
+
+    Parameters
+    ----------
+    delta : np.ndarray
+        Displacement vectors with the spatial dimensions along the last axis.
+    box_size : np.ndarray
+        The size of the periodic box along each spatial dimension.
+
+    Returns
+    -------
+    np.ndarray
+        The displacement vectors shifted by integer multiples of the box size such
+        that each component lies within half a box size of zero.
+    """
+    box_size = np.asarray(box_size, dtype=float)
+    periodic = box_size > 0
+    safe_box = np.where(periodic, box_size, 1.0)
+    return delta - np.rint(delta / safe_box) * np.where(periodic, box_size, 0.0)
+
+
+def unwrap(
+    previous: np.ndarray, current: np.ndarray, box_size: np.ndarray
+) -> np.ndarray:
+    """
+    Unwrap positions with respect to their previous, already unwrapped, values.
+
+    Parameters
+    ----------
+    previous : np.ndarray
+        The unwrapped positions of the previous step.
+    current : np.ndarray
+        The (wrapped) positions of the current step. Must have the same shape as
+        `previous`.
+    box_size : np.ndarray
+        The size of the periodic box along each spatial dimension.
+
+    Returns
+    -------
+    np.ndarray
+        The unwrapped positions of the current step.
+    """
+    return previous + minimum_image(current - previous, box_size)
@@ -0,0 +1,122 @@
+"""Flat storage of per-cell values grouped by compartment."""
+
+from functools import cached_property
+from typing import Sequence
+
+import numpy as np
+
+
+class Ragged:
+    """Layout of values grouped into consecutive segments of varying length.
+
+    The values themselves are kept in flat arrays with the cells along the first
+    axis, e.g. `(n_cells, 3)` for positions. Segment `i` (a compartment) consists
+    of the rows `offsets[i]:offsets[i + 1]`, as the row pointers of a compressed
+    sparse row matrix. Compared to arrays padded to the size of the largest
+    compartment, memory and work scale with the number of cells. The reductions
+    over segments are vectorized with `np.add.reduceat`.
+    """
+
+    def __init__(self, offsets: Sequence[int] | np.ndarray):
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if offsets.ndim != 1 or len(offsets) == 0 or offsets[0] != 0:
+            raise ValueError("offsets must be a non-empty 1D array starting at 0.")
+        if np.any(np.diff(offsets) < 0):
+            raise ValueError("offsets must be non-decreasing.")
+        self.offsets = offsets
+
+    @classmethod
+    def from_sizes(cls, sizes: Sequence[int] | np.ndarray) -> "Ragged":
+        """Create the layout of consecutive segments of the given sizes."""
+        sizes = np.asarray(sizes, dtype=np.int64)
+        return cls(np.concatenate(([0], np.cumsum(sizes))))
+
+    @property
+    def n_segments(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def n_values(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def sizes(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @cached_property
+    def segment_ids(self) -> np.ndarray:
+        """Return the segment of each value, shape `(n_values,)`."""
+        return np.repeat(np.arange(self.n_segments), self.sizes)
+
+    def broadcast(self, segment_values: np.ndarray) -> np.ndarray:
+        """
+        Repeat a value per segment for each value of the segment.
+
+        Parameters
+        ----------
+        segment_values : np.ndarray
+            The values of shape `(n_segments, ...)`.
+
+        Returns
+        -------
+        np.ndarray
+            The values of shape `(n_values, ...)`.
+        """
+        return np.asarray(segment_values)[self.segment_ids]
+
+    def sum(self, values: np.ndarray) -> np.ndarray:
+        """
+        Sum the values of each segment.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            The values of shape `(n_values, ...)`.
+
+        Returns
+        -------
+        np.ndarray
+            The sums of shape `(n_segments, ...)`, zero for empty segments.
+        """
+        values = np.asarray(values)
+        sums = np.zeros((self.n_segments,) + values.shape[1:], dtype=values.dtype)
+        # reduceat returns a single value instead of zero for empty segments
+        non_empty = self.sizes > 0
+        if non_empty.any():
+            sums[non_empty] = np.add.reduceat(
+                values, self.offsets[:-1][non_empty], axis=0
+            )
+        return sums
+
+    def weighted_mean(
+        self, values: np.ndarray, weights: np.ndarray, default: float = 0.0
+    ) -> np.ndarray:
+        """
+        Compute the weighted mean of each segment, e.g. the centre of mass of
+        each compartment weighted by the cell volumes.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            The values of shape `(n_values, dims)`.
+        weights : np.ndarray
+            The weights of shape `(n_values,)`.
+        default : float
+            Value used for segments whose weights sum to zero.
+
+        Returns
+        -------
+        np.ndarray
+            The weighted mean of each segment, shape `(n_segments, dims)`.
+        """
+        weights = np.asarray(weights, dtype=float)
+        total = self.sum(weights)
+        weighted = self.sum(weights[:, None] * values)
+        empty = total == 0
+        result = weighted / np.where(empty, 1.0, total)[:, None]
+        result[empty] = default
+        return result
+
+    def split(self, values: np.ndarray) -> list[np.ndarray]:
+        """Return the values of each segment as a list of views."""
+        return np.split(np.asarray(values), self.offsets[1:-1])
@@ -1,4 +1,15 @@
 from .element import Element
 from .config_builder import ConfigBuilder, PottsParams
+from .profiling import StepProfiler
+from .checkpoint import Checkpointable, Checkpointer
+from .sweep import Sweep
 
-__all__ = ["Element", "ConfigBuilder", "PottsParams"]
+__all__ = [
+    "Element",
+    "ConfigBuilder",
+    "PottsParams",
+    "StepProfiler",
+    "Checkpointable",
+    "Checkpointer",
+    "Sweep",
+]
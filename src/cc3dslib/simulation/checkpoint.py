@@ -0,0 +1,163 @@
+"""Periodic checkpoints of the state of cc3dslib steppables."""
+
+import json
+import os
+from pathlib import Path
+from typing import Protocol, runtime_checkable
+
+import h5py
+import numpy as np
+from cc3d.core.PySteppables import SteppableBasePy
+from cc3d.core.XMLUtils import ElementCC3D
+
+from cc3dslib.simulation.element import Element
+
+State = dict[str, np.ndarray | int | float | str]
+
+
+@runtime_checkable
+class Checkpointable(Protocol):
+    """A steppable whose state can be saved and restored.
+
+    `load_state_dict` is called before the simulation starts; implementations keep
+    the state and apply it at the end of their `start` method. Trackers use it to
+    append to their existing output files instead of overwriting them.
+    """
+
+    def state_dict(self) -> State:
+        ...
+
+    def load_state_dict(self, state: State) -> None:
+        ...
+
+
+def generator_state(rng: np.random.Generator) -> str:
+    """Serialise the state of a random number generator for a checkpoint."""
+    return json.dumps(rng.bit_generator.state)
+
+
+def set_generator_state(rng: np.random.Generator, state: str) -> None:
+    """Restore the state of a random number generator from a checkpoint."""
+    rng.bit_generator.state = json.loads(state)
+
+
+class Checkpointer(SteppableBasePy, Element):
+    """Steppable to periodically save the state of other steppables to one file.
+
+    Every `frequency` MCS, the `state_dict` of each element and the state of the
+    global NumPy random number generator are written to an HDF5 file. The file is
+    first written to a temporary file and then moved into place, such that an
+    abort while writing never corrupts the last checkpoint. Only the (small) state
+    of the steppables is saved, not the lattice; restoring the lattice and the MCS
+    counter is left to CompuCell3D's own restart mechanism.
+
+    With `resume`, an existing checkpoint is loaded when the checkpointer is
+    created and passed to the elements before the simulation starts. Add the
+    checkpointer after the steppables it saves, such that all of them have
+    completed the same MCS when a checkpoint is written. The saved state of the
+    global random number generator is only applied in `start`, after the
+    steppables registered before the checkpointer have started, such that random
+    numbers they draw while starting do not advance the restored stream.
+    """
+
+    def __init__(
+        self,
+        filename: Path | str,
+        elements: list[Checkpointable],
+        frequency: int = 10_000,
+        resume: bool = False,
+    ):
+        super().__init__(frequency)
+
+        self.filename = Path(filename)
+        self.elements = {
+            f"{i}_{type(element).__name__}": element
+            for i, element in enumerate(elements)
+        }
+        self.resumed = False
+        self.last_mcs: int | None = None
+        self._random_state: State | None = None
+
+        if resume and self.filename.exists():
+            self.restore()
+
+    def start(self):
+        if self._random_state is not None:
+            _set_global_random_state(self._random_state)
+            self._random_state = None
+
+    def step(self, mcs: int):
+        self.save(mcs)
+
+    def finish(self):
+        pass
+
+    def save(self, mcs: int) -> None:
+        """Write a checkpoint of all elements at `mcs`."""
+        tmp_filename = self.filename.with_name(self.filename.name + ".tmp")
+        with h5py.File(tmp_filename, "w") as file:
+            file.attrs["mcs"] = mcs
+            _write_state(file.create_group("numpy.random"), _global_random_state())
+            for name, element in self.elements.items():
+                _write_state(file.create_group(name), element.state_dict())
+
+        os.replace(tmp_filename, self.filename)
+        self.last_mcs = mcs
+
+    def restore(self) -> None:
+        """
+        Load the checkpoint and pass the saved state to each element.
+
+        The state of the global random number generator is kept until `start`.
+        """
+        with h5py.File(self.filename, "r") as file:
+            self.last_mcs = int(file.attrs["mcs"])
+            self._random_state = _read_state(file["numpy.random"])
+            for name, element in self.elements.items():
+                if name not in file:
+                    raise KeyError(
+                        f"Checkpoint {self.filename} has no state for {name}"
+                    )
+                element.load_state_dict(_read_state(file[name]))
+
+        self.resumed = True
+
+    def build(self) -> list[ElementCC3D]:
+        return []
+
+
+def _write_state(group: h5py.Group, state: State) -> None:
+    for key, value in state.items():
+        if isinstance(value, np.ndarray):
+            group.create_dataset(key, data=value)
+        else:
+            group.attrs[key] = value
+
+
+def _read_state(group: h5py.Group) -> State:
+    state: State = {key: group[key][()] for key in group}
+    for key, value in group.attrs.items():
+        state[key] = value.item() if isinstance(value, np.generic) else value
+    return state
+
+
+def _global_random_state() -> State:
+    _, key, pos, has_gauss, cached_gaussian = np.random.get_state()
+    return {
+        "key": key,
+        "pos": int(pos),
+        "has_gauss": int(has_gauss),
+        "cached_gaussian": float(cached_gaussian),
+    }
+
+
+def _set_global_random_state(state: State) -> None:
+    np.random.set_state(
+        (
+            "MT19937",
+            state["key"],
+            state["pos"],
+            state["has_gauss"],
+            state["cached_gaussian"],
+        )
+    )
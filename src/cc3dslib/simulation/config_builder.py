@@ -1,9 +1,11 @@
+from pathlib import Path
 from typing import Literal
 import cc3d
 from cc3d.core.PySteppables import SteppableBasePy
 from cc3d.core.XMLUtils import ElementCC3D
 
 from .element import Element
+from .profiling import ProfileReport, StepProfiler
 
 from dataclasses import dataclass, field
 
@@ -18,6 +20,7 @@ class PottsParams:
     boundary_y: str = field(default="Periodic")
     boundary_z: str | None = field(default=None)
     energy_function_calculator: Literal["Statistics"] | None = field(default=None)
+    random_seed: int | None = field(default=None)
 
 
 class ConfigBuilder:
@@ -26,6 +29,7 @@ class ConfigBuilder:
             "CompuCell3D", {"Revision": "0", "Version": cc3d.__version__}
         )
         self.elements: list[Element] = []
+        self.profiler: StepProfiler | None = None
 
     def base(self, n_processors: int = 1, dbg_frequency: int = 4000) -> "ConfigBuilder":
         metadata = self.root_element.ElementCC3D("Metadata")
@@ -51,6 +55,8 @@ class ConfigBuilder:
                 {"Type": params.energy_function_calculator},
                 "",
             )
+        if params.random_seed is not None:
+            potts.ElementCC3D("RandomSeed", {}, str(params.random_seed))
         return self
 
     def add(self, element: Element) -> "ConfigBuilder":
@@ -59,6 +65,18 @@ class ConfigBuilder:
             self.root_element.add_child(e)
         return self
 
+    def profile(
+        self, filename: Path | str = "profile.h5", capacity: int = 100_000
+    ) -> "ConfigBuilder":
+        """Time the `start`, `step` and `finish` calls of every registered steppable.
+
+        At the end of the simulation, a summary table and the per-MCS time series
+        of the last `capacity` calls of each method are written to `filename`
+        (HDF5 for `.h5`/`.hdf5`, CSV otherwise) and the summary is printed.
+        """
+        self.profiler = StepProfiler(filename, capacity)
+        return self
+
     def build(self) -> ElementCC3D:
         return self.root_element
 
@@ -68,8 +86,13 @@ class ConfigBuilder:
         CompuCellSetup.setSimulationXMLDescription(self.build())
 
         for element in filter(lambda x: isinstance(x, SteppableBasePy), self.elements):
+            if self.profiler is not None:
+                self.profiler.wrap(element)
             CompuCellSetup.register_steppable(element)
 
+        if self.profiler is not None:
+            CompuCellSetup.register_steppable(ProfileReport(self.profiler))
+
         return Simulation()
 
 
@@ -0,0 +1,221 @@
+"""Opt-in timing of the steppables registered by `ConfigBuilder`."""
+
+import csv
+import time
+from functools import wraps
+from pathlib import Path
+from typing import Callable
+
+import h5py
+import numpy as np
+from cc3d.core.PySteppables import SteppableBasePy
+from cc3d.core.XMLUtils import ElementCC3D
+
+
+class _RingBuffer:
+    """Fixed-size record of the most recent (mcs, seconds) pairs of one method."""
+
+    def __init__(self, capacity: int):
+        self.mcs = np.empty(capacity, dtype=np.int64)
+        self.seconds = np.empty(capacity, dtype=np.float64)
+        self.calls = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, mcs: int, seconds: float) -> None:
+        index = self.calls % len(self.mcs)
+        self.mcs[index] = mcs
+        self.seconds[index] = seconds
+        self.calls += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def series(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the recorded calls in chronological order."""
+        capacity = len(self.mcs)
+        if self.calls <= capacity:
+            return self.mcs[: self.calls], self.seconds[: self.calls]
+
+        order = np.roll(np.arange(capacity), -(self.calls % capacity))
+        return self.mcs[order], self.seconds[order]
+
+
+class StepProfiler:
+    """Record the wall time of every call to `start`, `step` and `finish`.
+
+    For filters, every evaluation that is not answered from the filter cache is
+    timed as well and reported as the method `filter`, at the MCS of the
+    evaluation. This time is also contained in the `step` of the steppable calling
+    the filter first in an MCS, and includes the evaluation of the filters it
+    wraps.
+
+    Each wrapped method records into its own ring buffer holding the last
+    `capacity` calls, while the number of calls, the total and the maximum time are
+    accumulated over the whole run. `write` stores a summary table and the per-MCS
+    time series, either as HDF5 (`.h5`/`.hdf5`) or as two CSV files.
+    """
+
+    METHODS = ("start", "step", "finish")
+
+    def __init__(self, filename: Path | str, capacity: int = 100_000):
+        self.filename = Path(filename)
+        self.capacity = capacity
+        self.records: dict[tuple[str, str], _RingBuffer] = {}
+        self._elements = 0
+
+    def wrap(self, element: SteppableBasePy) -> None:
+        """
+        Replace the `start`, `step` and `finish` methods of a steppable instance
+        with timed versions, and the uncached evaluation of a filter.
+
+        Parameters
+        ----------
+        element : SteppableBasePy
+            The steppable to time.
+        """
+        name = f"{self._elements}:{type(element).__name__}"
+        self._elements += 1
+        for method in self.METHODS:
+            buffer = _RingBuffer(self.capacity)
+            self.records[(name, method)] = buffer
+            mcs = _step_mcs if method == "step" else _no_mcs
+            setattr(element, method, self._timed(getattr(element, method), buffer, mcs))
+
+        # filters are not imported here to avoid a circular import
+        if hasattr(element, "_evaluate"):
+            buffer = _RingBuffer(self.capacity)
+            self.records[(name, "filter")] = buffer
+            element._evaluate = self._timed(
+                element._evaluate, buffer, lambda _: _current_mcs(element)
+            )
+
+    @staticmethod
+    def _timed(
+        call: Callable, buffer: _RingBuffer, mcs: Callable[[tuple], int]
+    ) -> Callable:
+        @wraps(call)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                buffer.record(mcs(args), time.perf_counter() - start)
+
+        return wrapper
+
+    def summary(self) -> list[dict]:
+        """Return the number of calls and the total, mean and maximum time per
+        method of each steppable, sorted by total time."""
+        rows = [
+            {
+                "steppable": name,
+                "method": method,
+                "calls": buffer.calls,
+                "total_s": buffer.total,
+                "mean_s": buffer.total / buffer.calls if buffer.calls else 0.0,
+                "max_s": buffer.maximum,
+            }
+            for (name, method), buffer in self.records.items()
+        ]
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+    def write(self) -> None:
+        """Write the summary table and the time series to `filename`."""
+        summary = self.summary()
+        if self.filename.suffix in (".h5", ".hdf5"):
+            self._write_h5(summary)
+        else:
+            self._write_csv(summary)
+
+    def print_summary(self) -> None:
+        """Print the summary table."""
+        print(f"{'steppable':<32}{'method':<8}{'calls':>10}{'total [s]':>12}", end="")
+        print(f"{'mean [ms]':>12}{'max [ms]':>12}")
+        for row in self.summary():
+            print(
+                f"{row['steppable']:<32}{row['method']:<8}{row['calls']:>10}"
+                f"{row['total_s']:>12.3f}{row['mean_s'] * 1e3:>12.3f}"
+                f"{row['max_s'] * 1e3:>12.3f}"
+            )
+
+    def _write_h5(self, summary: list[dict]) -> None:
+        with h5py.File(self.filename, "w") as file:
+            table = file.create_group("summary")
+            for key in summary[0] if summary else []:
+                values = [row[key] for row in summary]
+                if isinstance(values[0], str):
+                    table.create_dataset(key, data=values, dtype=h5py.string_dtype())
+                else:
+                    table.create_dataset(key, data=np.array(values))
+
+            for (name, method), buffer in self.records.items():
+                mcs, seconds = buffer.series()
+                group = file.require_group(f"series/{name}/{method}")
+                group.create_dataset("mcs", data=mcs)
+                group.create_dataset("seconds", data=seconds)
+
+    def _write_csv(self, summary: list[dict]) -> None:
+        summary_file = self.filename.with_name(self.filename.stem + "_summary.csv")
+        with open(summary_file, "w", newline="") as file:
+            writer = csv.DictWriter(
+                file,
+                fieldnames=[
+                    "steppable",
+                    "method",
+                    "calls",
+                    "total_s",
+                    "mean_s",
+                    "max_s",
+                ],
+            )
+            writer.writeheader()
+            writer.writerows(summary)
+
+        with open(self.filename, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["steppable", "method", "mcs", "seconds"])
+            for (name, method), buffer in self.records.items():
+                mcs, seconds = buffer.series()
+                writer.writerows(
+                    (name, method, m, s) for m, s in zip(mcs.tolist(), seconds.tolist())
+                )
+
+
+def _step_mcs(args: tuple) -> int:
+    return args[0] if args else -1
+
+
+def _no_mcs(args: tuple) -> int:
+    return -1
+
+
+def _current_mcs(element: SteppableBasePy) -> int:
+    simulator = getattr(element, "simulator", None)
+    return simulator.getStep() if simulator is not None else -1
+
+
+class ProfileReport(SteppableBasePy):
+    """Steppable writing the results of a `StepProfiler` when the simulation ends.
+
+    `ConfigBuilder` registers it after all other steppables, such that their
+    `finish` calls are included in the report.
+    """
+
+    def __init__(self, profiler: StepProfiler):
+        super().__init__(frequency=float("inf"))
+        self.profiler = profiler
+        self._written = False
+
+    def finish(self):
+        if self._written:
+            return
+
+        self._written = True
+        self.profiler.write()
+        self.profiler.print_summary()
+
+    def on_stop(self):
+        self.finish()
+
+    def build(self) -> list[ElementCC3D]:
+        return []
@@ -0,0 +1,313 @@
+"""Run a simulation for every point of a parameter grid in a process pool.
+
+Usage::
+
+    python -m cc3dslib.simulation.sweep my_simulation:build \\
+        --param d_theta=0.05,0.1,0.2 --param force_magnitude=0.5,1.0 \\
+        --replicates 4 --workers 16 --output runs
+
+`my_simulation:build` names a function `build(seed, **params)` returning a
+configured (but not yet set up) `ConfigBuilder`. Each run is executed in a fresh
+process with the run's directory as working directory, such that relative output
+filenames of the steppables end up in the directory of the run.
+"""
+
+import argparse
+import contextlib
+import importlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+import numpy as np
+
+from .config_builder import ConfigBuilder
+
+Factory = Callable[..., ConfigBuilder]
+"""Create the `ConfigBuilder` of one run from its seed and parameters."""
+
+PARAMS_FILE = "params.json"
+DONE_FILE = "done.json"
+ERROR_FILE = "error.txt"
+LOG_FILE = "log.txt"
+
+
+@dataclass
+class Run:
+    """A single simulation of a sweep.
+
+    Attributes:
+        - index (int): Position of the run in the sweep
+        - params (dict[str, Any]): Parameters passed to the factory
+        - replicate (int): Index of the replicate of these parameters
+        - seed (int): Seed of the random number generators of the run
+        - directory (Path): Output directory of the run
+    """
+
+    index: int
+    params: dict[str, Any]
+    replicate: int
+    seed: int
+    directory: Path
+
+    @property
+    def done(self) -> bool:
+        return (self.directory / DONE_FILE).exists()
+
+    def description(self) -> dict[str, Any]:
+        return {
+            "index": self.index,
+            "params": self.params,
+            "replicate": self.replicate,
+            "seed": self.seed,
+        }
+
+
+def expand_grid(
+    grid: dict[str, Sequence[Any]],
+    output_dir: Path | str,
+    replicates: int = 1,
+    seed: int = 0,
+) -> list[Run]:
+    """
+    Expand a parameter grid into the runs of a sweep.
+
+    Parameters
+    ----------
+    grid : dict[str, Sequence[Any]]
+        The values of each parameter. All combinations are run.
+    output_dir : Path | str
+        The directory in which a subdirectory is created for each run.
+    replicates : int
+        The number of runs with different seeds for each combination.
+    seed : int
+        The seed from which the seeds of the runs are derived.
+
+    Returns
+    -------
+    list[Run]
+        The runs, in the order of the grid with the replicates innermost.
+    """
+    output_dir = Path(output_dir)
+    names = list(grid)
+    combinations = itertools.product(*(grid[name] for name in names))
+
+    runs = []
+    for params in combinations:
+        for replicate in range(replicates):
+            index = len(runs)
+            # independent streams per run, stable if the grid is extended at the end
+            run_seed = np.random.SeedSequence(seed, spawn_key=(index,))
+            runs.append(
+                Run(
+                    index=index,
+                    params=dict(zip(names, params)),
+                    replicate=replicate,
+                    seed=int(run_seed.generate_state(1)[0]),
+                    directory=output_dir / f"run_{index:05d}",
+                )
+            )
+    return runs
+
+
+class Sweep:
+    """Run a simulation for every combination of parameters in a process pool.
+
+    The factory is called in the worker process as `factory(seed=seed, **params)`
+    and must return a `ConfigBuilder` with all steppables added. It is passed
+    either as a module level function or as a `"module:function"` string; both
+    must be importable by the worker processes. Each run gets its own process
+    (CompuCell3D keeps global state per process), its own output directory with a
+    `params.json` and a log file, and the global NumPy random number generator is
+    seeded with the seed of the run.
+
+    Runs whose directory contains a `done.json` are skipped, so an interrupted
+    sweep is resumed by running it again. Failed runs record the traceback in
+    `error.txt` and are retried on the next invocation.
+    """
+
+    def __init__(
+        self,
+        factory: Factory | str,
+        grid: dict[str, Sequence[Any]],
+        output_dir: Path | str,
+        replicates: int = 1,
+        seed: int = 0,
+        workers: int | None = None,
+    ):
+        self.factory = factory
+        self.output_dir = Path(output_dir)
+        self.runs = expand_grid(grid, self.output_dir, replicates, seed)
+        self.workers = workers or os.cpu_count() or 1
+
+    def pending(self) -> list[Run]:
+        """Return the runs that have not completed yet."""
+        return [run for run in self.runs if not run.done]
+
+    def run(self) -> dict[int, bool]:
+        """
+        Execute all pending runs.
+
+        Returns
+        -------
+        dict[int, bool]
+            Whether each executed run, by index, completed successfully.
+        """
+        pending = self.pending()
+        for run in pending:
+            _prepare(run)
+
+        results: dict[int, bool] = {}
+        if not pending:
+            return results
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(min(self.workers, len(pending)), maxtasksperchild=1) as pool:
+            jobs = [(self.factory, run) for run in pending]
+            for index, success in pool.imap_unordered(_execute, jobs):
+                results[index] = success
+                status = "done" if success else "failed"
+                print(f"run {index:05d} {status}", file=sys.stderr)
+
+        return results
+
+
+def _prepare(run: Run) -> None:
+    """Create the directory of a run, refusing to reuse it for other parameters."""
+    run.directory.mkdir(parents=True, exist_ok=True)
+    params_file = run.directory / PARAMS_FILE
+    description = run.description()
+    if params_file.exists():
+        if json.loads(params_file.read_text()) != json.loads(json.dumps(description)):
+            raise ValueError(
+                f"{run.directory} belongs to a run with different parameters"
+            )
+        return
+
+    params_file.write_text(json.dumps(description, indent=2))
+
+
+def _resolve(factory: Factory | str) -> Factory:
+    if not isinstance(factory, str):
+        return factory
+
+    module_name, _, name = factory.partition(":")
+    if not name:
+        raise ValueError(f"Expected 'module:function', got {factory!r}")
+    return getattr(importlib.import_module(module_name), name)
+
+
+def _execute(job: tuple[Factory | str, Run]) -> tuple[int, bool]:
+    """Run a single simulation in the current (worker) process."""
+    factory, run = job
+    directory = run.directory.resolve()
+    (directory / ERROR_FILE).unlink(missing_ok=True)
+    start = time.perf_counter()
+
+    with open(directory / LOG_FILE, "a") as log, _redirect_output(log):
+        try:
+            os.chdir(directory)
+            np.random.seed(run.seed)
+            _resolve(factory)(seed=run.seed, **run.params).setup().run()
+        except Exception:
+            (directory / ERROR_FILE).write_text(traceback.format_exc())
+            return run.index, False
+
+    (directory / DONE_FILE).write_text(
+        json.dumps({"seconds": time.perf_counter() - start})
+    )
+    return run.index, True
+
+
+@contextlib.contextmanager
+def _redirect_output(log):
+    """Redirect stdout and stderr, including output of CompuCell3D's C++ code."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(saved[0])
+        os.close(saved[1])
+
+
+def _parse_param(argument: str) -> tuple[str, list[Any]]:
+    """Parse `name=value,value,...`, reading each value as JSON if possible."""
+    name, separator, values = argument.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"Expected name=values, got {argument!r}")
+
+    parsed = []
+    for value in values.split(","):
+        try:
+            parsed.append(json.loads(value))
+        except json.JSONDecodeError:
+            parsed.append(value)
+    return name, parsed
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("factory", help="function creating the ConfigBuilder")
+    parser.add_argument(
+        "--param",
+        type=_parse_param,
+        action="append",
+        default=[],
+        help="parameter values as name=value,value,...",
+    )
+    parser.add_argument("--replicates", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", type=Path, default=Path("runs"))
+    parser.add_argument(
+        "--list", action="store_true", help="only list the pending runs"
+    )
+    args = parser.parse_args(argv)
+
+    # make factories next to the calling script importable by the workers
+    sys.path.insert(0, os.getcwd())
+    os.environ["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])
+    )
+
+    sweep = Sweep(
+        args.factory,
+        dict(args.param),
+        args.output,
+        replicates=args.replicates,
+        seed=args.seed,
+        workers=args.workers,
+    )
+    if args.list:
+        for run in sweep.pending():
+            print(run.directory, json.dumps(run.params))
+        return
+
+    results = sweep.run()
+    failed = [index for index, success in results.items() if not success]
+    print(
+        f"{len(results) - len(failed)} of {len(results)} runs completed,"
+        f" {len(sweep.runs) - len(results)} skipped",
+        file=sys.stderr,
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
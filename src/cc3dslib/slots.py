@@ -0,0 +1,139 @@
+"""Stable array slots for a population of cells or compartments that changes."""
+
+from typing import Iterable
+
+import numpy as np
+
+
+class SlotAllocator:
+    """Assign each ID (e.g. a cell or cluster ID) a fixed row of per-ID arrays.
+
+    An ID keeps its slot for as long as it is alive, so state indexed by slot, such
+    as unwrapped positions or swimming directions, stays aligned when other IDs
+    appear or disappear. Slots freed by removed IDs are reused by new ones. If no
+    slot is free, the capacity is doubled, such that adding and removing an ID is
+    O(1) amortized. Arrays indexed by slot are grown with `resize`.
+
+    `ids` holds the ID in each slot, or -1 for free slots.
+    """
+
+    def __init__(self, capacity: int = 0):
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self._slots: dict[int, int] = {}
+        # free slots are taken from the end, lowest index first
+        self._free: list[int] = list(range(capacity - 1, -1, -1))
+
+    @property
+    def capacity(self) -> int:
+        return len(self.ids)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._slots
+
+    def slot(self, key: int) -> int:
+        """Return the slot of an ID."""
+        return self._slots[key]
+
+    def add(self, key: int) -> int:
+        """
+        Assign a slot to a new ID.
+
+        Raises
+        ------
+        ValueError
+            If the ID already has a slot.
+        """
+        if key in self._slots:
+            raise ValueError(f"ID {key} already has a slot.")
+        if not self._free:
+            self._grow()
+
+        slot = self._free.pop()
+        self._slots[key] = slot
+        self.ids[slot] = key
+        return slot
+
+    def remove(self, key: int) -> int:
+        """Free the slot of an ID and return it."""
+        slot = self._slots.pop(key)
+        self.ids[slot] = -1
+        self._free.append(slot)
+        return slot
+
+    def sync(self, ids: Iterable[int]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Update the allocation to the IDs that are currently alive.
+
+        IDs that are no longer present are removed before new IDs are added, such
+        that new IDs can reuse their slots.
+
+        Parameters
+        ----------
+        ids : Iterable[int]
+            The unique IDs currently alive.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray, np.ndarray]
+            The slot of each of the given IDs, the slots of the added IDs and the
+            slots of the removed IDs.
+        """
+        ids = [int(key) for key in ids]
+        alive = set(ids)
+        if len(alive) != len(ids):
+            raise ValueError("IDs must be unique.")
+
+        removed = [self.remove(key) for key in list(self._slots) if key not in alive]
+        added = [self.add(key) for key in ids if key not in self._slots]
+        slots = np.fromiter(
+            (self._slots[key] for key in ids), dtype=np.int64, count=len(ids)
+        )
+        return (
+            slots,
+            np.array(added, dtype=np.int64),
+            np.array(removed, dtype=np.int64),
+        )
+
+    def resize(self, array: np.ndarray, fill: float) -> np.ndarray:
+        """
+        Grow an array indexed by slot along its first axis to the capacity.
+
+        Parameters
+        ----------
+        array : np.ndarray
+            The array of shape `(n, ...)`.
+        fill : float
+            The value of the new rows.
+
+        Returns
+        -------
+        np.ndarray
+            The array of shape `(capacity, ...)`, or `array` itself if it is large
+            enough.
+        """
+        if len(array) >= self.capacity:
+            return array
+
+        padding = np.full(
+            (self.capacity - len(array),) + array.shape[1:], fill, dtype=array.dtype
+        )
+        return np.concatenate((array, padding))
+
+    def state_dict(self) -> dict:
+        return {"ids": self.ids.copy(), "free": np.array(self._free, dtype=np.int64)}
+
+    def load_state_dict(self, state: dict) -> None:
+        self.ids = np.array(state["ids"], dtype=np.int64)
+        self._slots = {
+            int(key): slot for slot, key in enumerate(self.ids.tolist()) if key >= 0
+        }
+        self._free = [int(slot) for slot in state["free"]]
+
+    def _grow(self) -> None:
+        old = self.capacity
+        new = max(2 * old, 16)
+        self.ids = np.concatenate((self.ids, np.full(new - old, -1, dtype=np.int64)))
+        self._free.extend(range(new - 1, old - 1, -1))
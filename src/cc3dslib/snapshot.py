@@ -0,0 +1,201 @@
+"""Steppables providing snapshots of the cells and the lattice of the simulation."""
+
+import numpy as np
+
+from cc3d.core.PySteppables import SteppableBasePy
+from cc3d.core.XMLUtils import ElementCC3D
+
+from cc3dslib.simulation import Element
+
+_PIXEL = np.dtype([("id", np.int64), ("x", np.int64), ("y", np.int64), ("z", np.int64)])
+
+
+class CellSnapshot(SteppableBasePy, Element):
+    """Read the state of every cell once per MCS into structure-of-arrays buffers.
+
+    Reading cell attributes goes through SWIG one attribute at a time, so several
+    steppables reading the same attributes multiply the cost of each step. This
+    steppable reads the id, cluster id, type, volume, surface and centre of mass of
+    every cell exactly once per MCS and exposes them as NumPy arrays. Consumers
+    call `update(mcs)` before reading, which makes the snapshot independent of the
+    order in which the steppables are registered.
+
+    Rows are ordered as in `cell_list` and may change between steps; use `rows` to
+    map cell ids to the rows of the current snapshot. Surfaces are only meaningful
+    if the `Surface` plugin is loaded.
+    """
+
+    def __init__(self, dims: int = 2, frequency=1):
+        super().__init__(frequency)
+
+        self.dims = dims
+        self.mcs: int | None = None
+
+        self.ids = np.empty(0, dtype=np.int64)
+        self.cluster_ids = np.empty(0, dtype=np.int64)
+        self.types = np.empty(0, dtype=np.int32)
+        self.volumes = np.empty(0)
+        self.surfaces = np.empty(0)
+        self.coms = np.empty((0, 3))
+
+        self._order = np.empty(0, dtype=np.int64)
+
+    def start(self):
+        self.refresh()
+
+    def step(self, mcs: int):
+        self.update(mcs)
+
+    def finish(self):
+        pass
+
+    def update(self, mcs: int) -> None:
+        """Refresh the snapshot unless it has already been taken at `mcs`."""
+        if self.mcs == mcs:
+            return
+
+        self.refresh()
+        self.mcs = mcs
+
+    def refresh(self) -> None:
+        """Unconditionally read the state of all cells."""
+        assert self.cell_list is not None
+
+        values = np.array(
+            [
+                (
+                    cell.id,
+                    cell.clusterId,
+                    cell.type,
+                    cell.volume,
+                    cell.surface,
+                    cell.xCOM,
+                    cell.yCOM,
+                    0 if self.dims == 2 else cell.zCOM,
+                )
+                for cell in self.cell_list
+            ],
+            dtype=float,
+        ).reshape(-1, 8)
+
+        self.ids = values[:, 0].astype(np.int64)
+        self.cluster_ids = values[:, 1].astype(np.int64)
+        self.types = values[:, 2].astype(np.int32)
+        self.volumes = values[:, 3]
+        self.surfaces = values[:, 4]
+        self.coms = values[:, 5:]
+
+        self._order = np.argsort(self.ids, kind="stable")
+        self.mcs = None
+
+    def rows(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Map cell ids to the rows of the current snapshot.
+
+        Parameters
+        ----------
+        ids : np.ndarray
+            Cell ids to look up.
+
+        Returns
+        -------
+        np.ndarray
+            The row index of each cell id, with the same shape as `ids`.
+
+        Raises
+        ------
+        KeyError
+            If any of the ids is not part of the snapshot.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        sorted_ids = self.ids[self._order]
+        pos = np.searchsorted(sorted_ids, ids)
+        found = pos < len(sorted_ids)
+        found[found] = sorted_ids[pos[found]] == ids[found]
+        if not found.all():
+            raise KeyError(f"Cells {ids[~found].tolist()} are not in the snapshot.")
+        return self._order[pos]
+
+    def build(self) -> list[ElementCC3D]:
+        com_plugin = ElementCC3D("Plugin", {"Name": "CenterOfMass"})
+        return [com_plugin]
+
+
+def read_cell_field(steppable: SteppableBasePy, shape: tuple[int, ...]) -> np.ndarray:
+    """
+    Copy the cell ID of every pixel of the lattice into a NumPy array.
+
+    CompuCell3D does not expose the cell field as an array, so the pixels are
+    collected from the pixel lists of the `PixelTracker` plugin in one pass over
+    the cells and written to the array with a single fancy-indexing assignment.
+
+    Parameters
+    ----------
+    steppable : SteppableBasePy
+        A steppable of the running simulation.
+    shape : tuple[int, ...]
+        The shape of the lattice, `(x, y)` in 2D or `(x, y, z)` in 3D.
+
+    Returns
+    -------
+    np.ndarray
+        The cell IDs of the given shape, with 0 for the medium.
+    """
+    pixels = np.fromiter(
+        (
+            (cell.id, pixel.x, pixel.y, pixel.z)
+            for cell in steppable.cell_list
+            for pixel in (data.pixel for data in steppable.get_cell_pixel_list(cell))
+        ),
+        dtype=_PIXEL,
+    )
+
+    lattice = np.zeros(shape, dtype=np.int32)
+    coordinates = tuple(pixels[axis] for axis in ("x", "y", "z")[: len(shape)])
+    lattice[coordinates] = pixels["id"]
+    return lattice
+
+
+class LatticeSnapshot(SteppableBasePy, Element):
+    """Copy the cell ID of every pixel into a NumPy array at most once per MCS.
+
+    Copying the lattice (see `read_cell_field`) is the expensive part of the
+    steppables working on it, such as `LatticeWriter` and `COMTracker` with
+    `lattice`. Sharing a snapshot between them copies the lattice once per MCS in
+    which any of them samples. Consumers call `update(mcs)` before reading `ids`,
+    so the snapshot itself does not need to run every step.
+    """
+
+    def __init__(self, dims: int = 2, frequency=float("inf")):
+        super().__init__(frequency)
+
+        self.dims = dims
+        self.mcs: int | None = None
+        self.ids = np.zeros((0,) * dims, dtype=np.int32)
+
+    def start(self):
+        pass
+
+    def step(self, mcs: int):
+        self.update(mcs)
+
+    def finish(self):
+        pass
+
+    def update(self, mcs: int) -> np.ndarray:
+        """Copy the lattice unless it has already been copied at `mcs`."""
+        if self.mcs != mcs:
+            self.refresh()
+            self.mcs = mcs
+        return self.ids
+
+    def refresh(self) -> None:
+        """Unconditionally copy the lattice."""
+        box_coords = self.get_box_coordinates()[1]
+        shape = (box_coords.x, box_coords.y, box_coords.z)[: self.dims]
+        self.ids = read_cell_field(self, shape)
+        self.mcs = None
+
+    def build(self) -> list[ElementCC3D]:
+        pixel_tracker_plugin = ElementCC3D("Plugin", {"Name": "PixelTracker"})
+        return [pixel_tracker_plugin]
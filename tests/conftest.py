@@ -0,0 +1,11 @@
+"""Run the tests against the lightweight `cc3d` stand-in of the benchmarks."""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+from benchmarks import fake_cc3d  # noqa: E402
+
+fake_cc3d.install()
@@ -0,0 +1,35 @@
+from benchmarks.fake_cc3d import CellG, SteppableBasePy, World
+
+from cc3dslib.filter import CompartmentFilter
+
+
+def cell_ids(compartments) -> set[int]:
+    return {cell.id for cells in compartments for cell in cells}
+
+
+def test_cache_is_reused_within_an_mcs():
+    SteppableBasePy.world = World(20)
+    filter = CompartmentFilter()
+
+    assert filter() is filter()
+    assert filter.cache_stats.hits == 1
+
+
+def test_birth_and_death_in_the_same_mcs_refresh_the_cache():
+    world = World(20)
+    SteppableBasePy.world = world
+    filter = CompartmentFilter()
+    before = filter()
+
+    # one cell dies and a new one is born, leaving the number of cells unchanged
+    dead = world.cells.pop()
+    born = CellG(max(cell.id for cell in world.cells) + 2, 1, 1)
+    world.cells.append(born)
+    world._clusters = None
+
+    after = filter()
+    assert len(world.cells) == len(cell_ids(before))
+    assert dead.id in cell_ids(before)
+    assert dead.id not in cell_ids(after)
+    assert born.id in cell_ids(after)
+    assert filter.cache_stats.invalidations == 1